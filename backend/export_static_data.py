@@ -1,224 +1,214 @@
 """Export all data to static JSON files for Vercel deployment."""
-import json
-import pandas as pd
-from datetime import timedelta
+import argparse
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-DATA_PATH = "/Users/dm1223/Desktop/Barclays-compass/data/raw/v2025.12.08.1716/broadband_processed_data.parquet"
-OUTPUT_DIR = Path("/Users/dm1223/Desktop/Barclays-compass/frontend/public/data")
+import pandas as pd
 
-def process_dataset(input_path: str):
-    """Process transaction dataset and return classification and merchant summaries."""
-    data = pd.read_parquet(input_path).drop_duplicates()
-
-    columns_to_keep = [
-        'primary_merchant',
-        'transaction_classification_0',
-        'transaction_classification_1',
-        'customer_id',
-        'account_id',
-        'date',
-        'amount',
-        'transaction_direction'
-    ]
+# Shared processing code lives in the repo-level src/ directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from aggregation import aggregate, drop_multi_category
+from artifact_cache import PIPELINE_VERSION, file_digest
+from dataset_context import DatasetContext
+from income_segments import income_outputs
+from merchant_index import encode_json, graph_data, merchant_payloads
+from recommendations import RecommendationIndex
+from segmentation import compute_customer_segmentation
+from static_export import (
+    is_current,
+    load_manifest,
+    prune_stale,
+    write_export,
+    write_manifest,
+    write_shards,
+)
 
-    existing_cols = [c for c in columns_to_keep if c in data.columns]
-    cleaned = data.loc[:, existing_cols]
+DATA_PATH = "/Users/dm1223/Desktop/Barclays-compass/data/raw/v2025.12.08.1716/broadband_processed_data.parquet"
+OUTPUT_DIR = Path("/Users/dm1223/Desktop/Barclays-compass/frontend/public/data")
 
-    if 'primary_merchant' in cleaned.columns:
-        cleaned = cleaned.loc[cleaned['primary_merchant'] != '']
+# Default thresholds of the exported recommendations
+RECOMMENDATION_X = 35.0
+RECOMMENDATION_Y = 30.0
 
-    if 'transaction_classification_0' in cleaned.columns:
-        cleaned = cleaned[~cleaned['transaction_classification_0'].str.contains('|', regex=False, na=False)]
+EXPORT_FILES = ['classifications.json', 'merchants.json', 'recommendations.json', 'segmentation.json']
+INCOME_FILES = [
+    'income_segments.json',
+    'merchants_by_income.json',
+    'gap_analysis_income.json',
+    'customer_index.json'  # Dense customer ID -> customer_id, for the segment bitmaps
+]
 
-    customer_txn_counts = cleaned.groupby('customer_id').size()
-    total_cust_10plus = int((customer_txn_counts >= 10).sum())
+# Index of the per-classification merchant shards the frontend loads on demand
+SHARD_INDEX = 'merchant_shards.json'
+SHARD_DIRS = ['merchants', 'merchants_by_income']
 
-    customer_class_stats = cleaned.groupby(
-        ['transaction_classification_0', 'customer_id']
-    ).agg(
-        txn_count=('amount', 'count'),
-        total_amount=('amount', 'sum')
-    ).reset_index()
 
-    classification_summary = customer_class_stats.groupby('transaction_classification_0').agg(
-        median_txn_per_customer=('txn_count', 'median'),
-        median_amount_per_customer=('total_amount', 'median'),
-        customers_with_10plus_txn=('txn_count', lambda x: (x >= 10).sum())
-    ).reset_index()
+def get_recommendations(classification_data, merchant_data, total_customers, x=RECOMMENDATION_X, y=RECOMMENDATION_Y):
+    """Get recommendations based on thresholds."""
+    return RecommendationIndex(classification_data, merchant_data, total_customers, cache_size=0).query(x, y)
 
-    customer_merchant_stats = cleaned.groupby(
-        ['transaction_classification_0', 'primary_merchant', 'customer_id']
-    ).agg(
-        txn_count=('amount', 'count'),
-        total_amount=('amount', 'sum')
-    ).reset_index()
 
-    merchant_summary = customer_merchant_stats.groupby(
-        ['transaction_classification_0', 'primary_merchant']
-    ).agg(
-        median_txn_per_customer=('txn_count', 'median'),
-        median_amount_per_customer=('total_amount', 'median'),
-        customers_with_10plus_txn=('txn_count', lambda x: (x >= 10).sum())
-    ).reset_index()
+def export_inputs(name: str, input_digest: str) -> str:
+    """Hash of everything an exported file depends on: data, code version, parameters."""
+    params = f"{RECOMMENDATION_X}:{RECOMMENDATION_Y}" if name == 'recommendations.json' else ""
+    return hashlib.sha256(f"{input_digest}:{PIPELINE_VERSION}:{name}:{params}".encode()).hexdigest()
 
-    return classification_summary, merchant_summary, total_cust_10plus, cleaned
 
+def summary_stage(transactions: pd.DataFrame) -> tuple:
+    """Classification and merchant summaries, as DatasetContext.summaries computes them."""
+    return aggregate(transactions, multi_category=False)
 
-def compute_customer_segmentation(data: pd.DataFrame):
-    """Compute customer segmentation based on top 2/4 brands per customer."""
-    data = data.copy()
-    data['date'] = pd.to_datetime(data['date'])
 
-    customer_last_date = data.groupby('customer_id')['date'].max().reset_index()
-    customer_last_date.columns = ['customer_id', 'last_date']
+def income_stage(bands: pd.Series, cleaned: pd.DataFrame) -> dict:
+    """
+    Build the income exports in one grouped pass.
 
-    data = data.merge(customer_last_date, on='customer_id')
-    data['cutoff_date'] = data['last_date'] - timedelta(days=60)
-    data_filtered = data[data['date'] >= data['cutoff_date']]
+    Returns:
+        Dict of INCOME_FILES name -> payload
+    """
+    return dict(zip(INCOME_FILES, income_outputs(cleaned, bands)))
 
-    customer_brand_stats = data_filtered.groupby(['customer_id', 'primary_merchant']).agg(
-        txn_count=('amount', 'count'),
-        total_amount=('amount', 'sum')
-    ).reset_index()
 
-    txn_min, txn_max = customer_brand_stats['txn_count'].min(), customer_brand_stats['txn_count'].max()
-    amt_min, amt_max = customer_brand_stats['total_amount'].min(), customer_brand_stats['total_amount'].max()
+def segmentation_stage(output_dir: Path, cleaned: pd.DataFrame, inputs: str) -> dict:
+    """Compute the customer segmentation and write it; returns its manifest entry."""
+    return write_export(output_dir, 'segmentation.json', encode_json(compute_customer_segmentation(cleaned)), inputs)
 
-    customer_brand_stats['norm_txn'] = (customer_brand_stats['txn_count'] - txn_min) / (txn_max - txn_min) if txn_max > txn_min else 0.5
-    customer_brand_stats['norm_amt'] = (customer_brand_stats['total_amount'] - amt_min) / (amt_max - amt_min) if amt_max > amt_min else 0.5
 
-    customer_brand_stats['score'] = (
-        0.2 * customer_brand_stats['norm_txn'] +
-        0.8 * customer_brand_stats['norm_amt']
-    )
+def export_merchant_shards(output_dir: Path, merchants: dict, merchants_by_income: dict) -> tuple:
+    """
+    Write one merchant shard per classification and per (income band, classification).
 
-    customer_brand_stats = customer_brand_stats.sort_values(
-        ['customer_id', 'score'], ascending=[True, False]
-    )
+    Returns:
+        Tuple of (shard index payload, list of shard files written)
+    """
+    index = {"merchants": {}, "merchants_by_income": {}}
+    index["merchants"], files = write_shards(output_dir, "merchants", merchants)
+    for band, payloads in merchants_by_income.items():
+        index["merchants_by_income"][band], band_files = write_shards(
+            output_dir, f"merchants_by_income/{band}", payloads
+        )
+        files.extend(band_files)
+    return index, files
 
-    top2_per_customer = customer_brand_stats.groupby('customer_id').head(2)
-    top4_per_customer = customer_brand_stats.groupby('customer_id').head(4)
 
-    customer_brands = top2_per_customer.groupby('customer_id').agg(
-        brands=('primary_merchant', list)
-    ).reset_index()
+def export_shard_index(output_dir: Path, merchants: dict, merchants_by_income: dict, inputs: str) -> dict:
+    """Write the merchant shards and their index; returns the index's manifest entry."""
+    shard_index, shards = export_merchant_shards(output_dir, merchants, merchants_by_income)
+    entry = write_export(output_dir, SHARD_INDEX, encode_json(shard_index), inputs)
+    return {**entry, "shards": shards}
 
-    customer_brands = customer_brands[customer_brands['brands'].apply(len) >= 2]
-    sample_customers = customer_brands.head(10).to_dict('records')
 
-    all_top_brands = top4_per_customer.groupby('primary_merchant').agg(
-        customer_count=('customer_id', 'nunique')
-    ).reset_index()
-    all_top_brands = all_top_brands.sort_values('customer_count', ascending=False)
-    top10_brands = all_top_brands.head(10).to_dict('records')
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default=DATA_PATH, help="Processed transactions parquet")
+    parser.add_argument("--output", type=Path, default=OUTPUT_DIR, help="Directory to export into")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Worker processes for the export stages and file writes")
+    parser.add_argument("--force", action="store_true", help="Rebuild every file even if unchanged")
+    return parser.parse_args(argv)
 
-    return {
-        "sample_customers": sample_customers,
-        "top10_brands": top10_brands,
-        "total_customers_analyzed": len(customer_brands)
-    }
 
+def main(argv=None):
+    args = parse_args(argv)
+    args.output.mkdir(parents=True, exist_ok=True)
 
-def get_recommendations(classification_data, merchant_data, total_customers, x=35.0, y=30.0):
-    """Get recommendations based on thresholds."""
-    min_class_customers = total_customers * (x / 100)
-    top_classifications = classification_data[
-        classification_data['customers_with_10plus_txn'] >= min_class_customers
+    # Skip every file whose inputs (data content, code version, parameters) are unchanged
+    input_digest = file_digest(args.input)
+    manifest = load_manifest(args.output)
+    all_files = EXPORT_FILES + INCOME_FILES + [SHARD_INDEX]
+    inputs = {name: export_inputs(name, input_digest) for name in all_files}
+    stale = [
+        name for name in all_files
+        if args.force or not is_current(args.output, manifest["files"].get(name), inputs[name])
     ]
-
-    results = []
-    for _, class_row in top_classifications.iterrows():
-        class_name = class_row['transaction_classification_0']
-        class_customers = class_row['customers_with_10plus_txn']
-        min_merchant_customers = class_customers * (y / 100)
-
-        class_merchants = merchant_data[
-            (merchant_data['transaction_classification_0'] == class_name) &
-            (merchant_data['customers_with_10plus_txn'] >= min_merchant_customers)
-        ].copy()
-
-        for _, merch_row in class_merchants.iterrows():
-            results.append({
-                "classification": class_name,
-                "classification_customers": int(class_customers),
-                "classification_pct": round(class_customers / total_customers * 100, 1),
-                "merchant": merch_row['primary_merchant'],
-                "merchant_customers": int(merch_row['customers_with_10plus_txn']),
-                "merchant_pct_of_classification": round(merch_row['customers_with_10plus_txn'] / class_customers * 100, 1),
-                "median_txn": float(merch_row['median_txn_per_customer']),
-                "median_amount": float(merch_row['median_amount_per_customer'])
-            })
-
-    results.sort(key=lambda r: r['merchant_customers'], reverse=True)
-
-    return {
-        "total_customers": total_customers,
-        "threshold_x": x,
-        "threshold_y": y,
-        "top_classifications_count": len(top_classifications),
-        "recommendations": results
-    }
-
-
-def main():
+    for name in all_files:
+        if name not in stale:
+            print(f"  - {name} is up to date")
+    if not stale:
+        print(f"Nothing to export; {args.output} is up to date")
+        return
+
+    # The snapshot is read once, income columns included, and every stage
+    # runs over that one frame; the exports drop multi-category
+    # classifications, as the summaries do. The summaries, the income
+    # outputs and the segmentation are independent CPU-bound stages, which
+    # threads would serialize on the GIL, so they run side by side in worker
+    # processes, as do the per-file compress/write steps once their
+    # payloads are ready.
     print("Loading data...")
-    classification_data, merchant_data, total_customers, raw_data = process_dataset(DATA_PATH)
-
-    # 1. Export classification data (3D plot)
-    print("Exporting classification data...")
-    classification_json = {
-        "labels": classification_data['transaction_classification_0'].tolist(),
-        "x": classification_data['median_txn_per_customer'].tolist(),
-        "y": classification_data['median_amount_per_customer'].tolist(),
-        "z": classification_data['customers_with_10plus_txn'].tolist(),
-        "axis_labels": {
-            "x": "Median Transactions per Customer",
-            "y": "Median Amount per Customer",
-            "z": "Customers with 10+ Transactions"
-        }
-    }
-    with open(OUTPUT_DIR / "classifications.json", "w") as f:
-        json.dump(classification_json, f)
-
-    # 2. Export merchant data for each classification
-    print("Exporting merchant data...")
-    merchants_by_class = {}
-    for classification in classification_data['transaction_classification_0'].unique():
-        filtered = merchant_data[merchant_data['transaction_classification_0'] == classification]
-        if not filtered.empty:
-            merchants_by_class[classification] = {
-                "classification": classification,
-                "labels": filtered['primary_merchant'].tolist(),
-                "x": filtered['median_txn_per_customer'].tolist(),
-                "y": filtered['median_amount_per_customer'].tolist(),
-                "z": filtered['customers_with_10plus_txn'].tolist(),
-                "axis_labels": {
-                    "x": "Median Transactions per Customer",
-                    "y": "Median Amount per Customer",
-                    "z": "Customers with 10+ Transactions"
-                }
+    dataset = DatasetContext(args.input, income=True)
+    print(dataset.describe())
+    cleaned = drop_multi_category(dataset.transactions)
+
+    needs_summaries = any(name in stale for name in EXPORT_FILES + [SHARD_INDEX] if name != 'segmentation.json')
+    needs_income = any(name in stale for name in INCOME_FILES + [SHARD_INDEX])
+    if needs_income and dataset.income_bands is None:
+        # Snapshots without the income columns still export everything else
+        for name in INCOME_FILES:
+            if name in stale:
+                print(f"Skipping {name}: no income columns")
+
+    written = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        summaries = pool.submit(summary_stage, dataset.transactions) if needs_summaries else None
+        income = pool.submit(income_stage, dataset.income_bands, cleaned) \
+            if needs_income and dataset.income_bands is not None else None
+        if 'segmentation.json' in stale:
+            print("Exporting segmentation.json...")
+            written['segmentation.json'] = pool.submit(
+                segmentation_stage, args.output, cleaned, inputs['segmentation.json']
+            )
+
+        if summaries is not None:
+            summaries = summaries.result()
+            builders = {
+                'classifications.json': lambda: graph_data(summaries[0]),
+                'merchants.json': lambda: merchant_payloads(summaries[1]),
+                'recommendations.json': lambda: get_recommendations(*summaries),
             }
-    with open(OUTPUT_DIR / "merchants.json", "w") as f:
-        json.dump(merchants_by_class, f)
-
-    # 3. Export recommendations (default thresholds)
-    print("Exporting recommendations...")
-    recommendations = get_recommendations(classification_data, merchant_data, total_customers)
-    with open(OUTPUT_DIR / "recommendations.json", "w") as f:
-        json.dump(recommendations, f)
-
-    # 4. Export segmentation data
-    print("Exporting segmentation data...")
-    segmentation = compute_customer_segmentation(raw_data)
-    with open(OUTPUT_DIR / "segmentation.json", "w") as f:
-        json.dump(segmentation, f)
-
-    print(f"Done! Files exported to {OUTPUT_DIR}")
-    print(f"  - classifications.json")
-    print(f"  - merchants.json")
-    print(f"  - recommendations.json")
-    print(f"  - segmentation.json")
+            for name in EXPORT_FILES:
+                if name in stale and name in builders:
+                    print(f"Exporting {name}...")
+                    written[name] = pool.submit(
+                        write_export, args.output, name, encode_json(builders[name]()), inputs[name]
+                    )
+
+        if income is not None:
+            income = income.result()
+            for name in INCOME_FILES:
+                if name in stale:
+                    print(f"Exporting {name}...")
+                    written[name] = pool.submit(write_export, args.output, name, encode_json(income[name]), inputs[name])
+
+        if SHARD_INDEX in stale:
+            print(f"Exporting {SHARD_INDEX}...")
+            merchants_by_income = income['merchants_by_income.json'] if income is not None else {}
+            written[SHARD_INDEX] = pool.submit(
+                export_shard_index, args.output, merchant_payloads(summaries[1]), merchants_by_income,
+                inputs[SHARD_INDEX]
+            )
+
+        for name, future in written.items():
+            manifest["files"][name] = future.result()
+
+    manifest["input"] = {"path": str(args.input), "sha256": input_digest}
+    manifest["pipeline_version"] = PIPELINE_VERSION
+    write_manifest(args.output, manifest)
+    removed = prune_stale(args.output, manifest, SHARD_DIRS)
+
+    print(f"Done! Files exported to {args.output}")
+    for name in stale:
+        entry = manifest["files"].get(name)
+        if entry is None:
+            continue
+        variants = ", ".join(entry["encodings"]) or "uncompressed"
+        shards = f"; {len(entry['shards'])} shard files" if "shards" in entry else ""
+        print(f"  - {name} -> {entry['file']} ({entry['bytes']:,} bytes; {variants}{shards})")
+    if removed:
+        print(f"Removed {len(removed)} stale hashed files")
 
 
 if __name__ == "__main__":
@@ -1,9 +1,40 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response, BackgroundTasks, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import hashlib
+import hmac
+import itertools
 import tempfile
 import os
-from datetime import timedelta
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+# Shared processing code lives in the repo-level src/ directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from aggregation import CUSTOMER_COL
+from arrow_payload import (
+    ARROW_STREAM_TYPE,
+    classification_stream,
+    merchant_streams,
+    recommendation_stream,
+    wants_arrow,
+)
+from artifact_cache import ArtifactCache
+from compressed_payload import CompressedPayload, compress_payload
+from dataset_context import DatasetContext
+from income_segments import BAND_COL
+from incremental import refresh_aggregates
+from jobs import Job, JobQueue
+from merchant_index import build_merchant_index, encode_json, graph_data
+from recommendations import RecommendationIndex
+from segment_bitmaps import SegmentIndex, segment_memberships
+from session_store import SessionStore
+from snapshot_catalog import DEFAULT_RAW_DIR, SNAPSHOT_FILES, scan_catalog
+from upload_jobs import process_upload
 
 app = FastAPI()
 
@@ -16,287 +47,296 @@ app.add_middleware(
 )
 
 # Pre-processed data storage
-DATA_PATH = "/Users/dm1223/Desktop/Barclays-compass/data/raw/v2025.12.08.1716/broadband_processed_data.parquet"
-classification_data = None
-merchant_data = None
-total_customers = 0
-raw_data = None  # Store raw data for customer segmentation
-customer_segmentation = None  # Store computed segmentation
-
-
-def process_dataset(input_path: str) -> tuple:
-    """Process transaction dataset and return classification and merchant summaries."""
-    data = pd.read_parquet(input_path).drop_duplicates()
-
-    columns_to_keep = [
-        'primary_merchant',
-        'transaction_classification_0',
-        'transaction_classification_1',
-        'customer_id',
-        'account_id',
-        'date',
-        'amount',
-        'transaction_direction'
-    ]
-
-    # Only keep columns that exist
-    existing_cols = [c for c in columns_to_keep if c in data.columns]
-    cleaned = data.loc[:, existing_cols]
-
-    # Filter out empty merchants if column exists
-    if 'primary_merchant' in cleaned.columns:
-        cleaned = cleaned.loc[cleaned['primary_merchant'] != '']
-
-    # Filter out multi-category classifications
-    if 'transaction_classification_0' in cleaned.columns:
-        cleaned = cleaned[~cleaned['transaction_classification_0'].str.contains('|', regex=False, na=False)]
-
-    # Count total unique customers with 10+ transactions
-    customer_txn_counts = cleaned.groupby('customer_id').size()
-    total_cust_10plus = int((customer_txn_counts >= 10).sum())
-
-    # Build classification-level summary
-    customer_class_stats = cleaned.groupby(
-        ['transaction_classification_0', 'customer_id']
-    ).agg(
-        txn_count=('amount', 'count'),
-        total_amount=('amount', 'sum')
-    ).reset_index()
-
-    classification_summary = customer_class_stats.groupby('transaction_classification_0').agg(
-        median_txn_per_customer=('txn_count', 'median'),
-        median_amount_per_customer=('total_amount', 'median'),
-        customers_with_10plus_txn=('txn_count', lambda x: (x >= 10).sum())
-    ).reset_index()
-
-    # Build merchant-level summary grouped by classification
-    customer_merchant_stats = cleaned.groupby(
-        ['transaction_classification_0', 'primary_merchant', 'customer_id']
-    ).agg(
-        txn_count=('amount', 'count'),
-        total_amount=('amount', 'sum')
-    ).reset_index()
-
-    merchant_summary = customer_merchant_stats.groupby(
-        ['transaction_classification_0', 'primary_merchant']
-    ).agg(
-        median_txn_per_customer=('txn_count', 'median'),
-        median_amount_per_customer=('total_amount', 'median'),
-        customers_with_10plus_txn=('txn_count', lambda x: (x >= 10).sum())
-    ).reset_index()
-
-    return classification_summary, merchant_summary, total_cust_10plus
-
-
-def compute_customer_segmentation(data: pd.DataFrame) -> dict:
-    """
-    Compute customer segmentation based on top 2 brands per customer.
+DATA_PATH = os.environ.get("DATA_PATH", "/Users/dm1223/Desktop/Barclays-compass/data/raw/v2025.12.08.1716/broadband_processed_data.parquet")
+CACHE_DIR = os.environ.get("AGGREGATE_CACHE_DIR", str(Path(__file__).resolve().parent.parent / "data" / "cache"))
+RAW_DATA_DIR = os.environ.get("RAW_DATA_DIR", str(DEFAULT_RAW_DIR))
+# Token required (as X-Admin-Token) by the /api/admin routes; without one they are disabled
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+loaded = None  # LoadedData of the active snapshot; replaced atomically on swap
+snapshot_builds = {}  # version -> queued / building / ready / superseded / failed: ...
+snapshot_build_lock = threading.Lock()  # Guards snapshot_builds and the swap order, never a build
+snapshot_activations = itertools.count(1)  # Numbers activations in the order they were requested
+swapped_activation = 0  # Number of the activation whose snapshot is swapped in
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def session_bytes(session: dict) -> int:
+    """Memory held by a stored upload result: its serialized payloads."""
+    return len(session["graph"]) + sum(len(body) for body in session["merchants"].values())
+
+
+sessions = SessionStore(
+    max_bytes=int(os.environ.get("SESSION_STORE_MAX_MB", "256")) * 1024 * 1024,
+    ttl_seconds=float(os.environ.get("SESSION_TTL_SECONDS", "3600")),
+    size_of=session_bytes
+)
+
+# Uploads are processed in worker processes, so the event loop stays free
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", str(min(2, os.cpu_count() or 1))))
+upload_jobs = JobQueue(
+    lambda: ProcessPoolExecutor(max_workers=UPLOAD_WORKERS),
+    max_running=UPLOAD_WORKERS,
+    max_queued=int(os.environ.get("UPLOAD_MAX_QUEUED", "16"))
+)
+
 
-    For each customer:
-    - Look at last 2 months of transactions (relative to their most recent transaction)
-    - Score brands: 0.2 * txn_count + 0.8 * total_amount
-    - Get top 2 brands
+async def save_upload(file: UploadFile) -> tuple:
     """
-    # Ensure date column is datetime
-    data = data.copy()
-    data['date'] = pd.to_datetime(data['date'])
+    Stream an upload to a temporary file in chunks, hashing it on the way.
 
-    # Get each customer's most recent transaction date
-    customer_last_date = data.groupby('customer_id')['date'].max().reset_index()
-    customer_last_date.columns = ['customer_id', 'last_date']
+    Returns:
+        Tuple of (temporary file path, SHA-256 hex digest of the contents)
+    """
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.parquet') as tmp:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            tmp.write(chunk)
+    return tmp.name, digest.hexdigest()
 
-    # Merge to get last_date for each transaction
-    data = data.merge(customer_last_date, on='customer_id')
 
-    # Filter to last 2 months for each customer
-    data['cutoff_date'] = data['last_date'] - timedelta(days=60)
-    data_filtered = data[data['date'] >= data['cutoff_date']]
+def store_session(job: Job):
+    """Move a finished upload job's payloads into the session store."""
+    sessions.put(job.key, job.result)
+    job.result = job.key
 
-    # Calculate score per customer-brand: 0.2 * normalized_txn + 0.8 * normalized_amount
-    customer_brand_stats = data_filtered.groupby(['customer_id', 'primary_merchant']).agg(
-        txn_count=('amount', 'count'),
-        total_amount=('amount', 'sum')
-    ).reset_index()
 
-    # Normalize to 0-1 scale
-    txn_min, txn_max = customer_brand_stats['txn_count'].min(), customer_brand_stats['txn_count'].max()
-    amt_min, amt_max = customer_brand_stats['total_amount'].min(), customer_brand_stats['total_amount'].max()
+@app.post("/api/process", status_code=202)
+async def process_file(file: UploadFile = File(...)):
+    """
+    Queue an uploaded parquet file for processing.
 
-    customer_brand_stats['norm_txn'] = (customer_brand_stats['txn_count'] - txn_min) / (txn_max - txn_min) if txn_max > txn_min else 0.5
-    customer_brand_stats['norm_amt'] = (customer_brand_stats['total_amount'] - amt_min) / (amt_max - amt_min) if amt_max > amt_min else 0.5
+    Returns a job id immediately; poll /api/jobs/{job_id} and fetch the 3D
+    graph data from /api/jobs/{job_id}/result once it is done.
+    """
+    if not file.filename.endswith('.parquet'):
+        raise HTTPException(status_code=400, detail="File must be a .parquet file")
 
-    customer_brand_stats['score'] = (
-        0.2 * customer_brand_stats['norm_txn'] +
-        0.8 * customer_brand_stats['norm_amt']
-    )
+    tmp_path, content_hash = await save_upload(file)
 
-    # Sort by customer and score
-    customer_brand_stats = customer_brand_stats.sort_values(
-        ['customer_id', 'score'], ascending=[True, False]
-    )
+    # Identical uploads share one session, so re-uploading is free
+    session_id = content_hash[:32]
+    if session_id in sessions:
+        os.unlink(tmp_path)
+        print(f"Upload {file.filename} matches session {session_id}; skipping processing")
+        return upload_jobs.describe(upload_jobs.add_finished(session_id, session_id))
 
-    # Get top 2 brands per customer (for Customer Segmentation)
-    top2_per_customer = customer_brand_stats.groupby('customer_id').head(2)
+    # The same file is already being processed
+    job = upload_jobs.pending(session_id)
+    if job is not None:
+        os.unlink(tmp_path)
+        return upload_jobs.describe(job)
 
-    # Get top 4 brands per customer (for Gap Analysis)
-    top4_per_customer = customer_brand_stats.groupby('customer_id').head(4)
+    try:
+        job = upload_jobs.submit(session_id, process_upload, tmp_path, session_id, on_done=store_session)
+    except OverflowError as e:
+        os.unlink(tmp_path)
+        raise HTTPException(status_code=429, detail=f"Too many uploads in progress: {e}")
+    return upload_jobs.describe(job)
 
-    # Create customer -> top 2 brands mapping for display
-    customer_brands = top2_per_customer.groupby('customer_id').agg(
-        brands=('primary_merchant', list)
-    ).reset_index()
 
-    # Filter to customers with at least 2 brands
-    customer_brands = customer_brands[customer_brands['brands'].apply(len) >= 2]
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of an upload job: queue position while queued, elapsed time while running."""
+    job = upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return upload_jobs.describe(job)
 
-    # Get 10 sample customers (just customer_id and brands, no scores)
-    sample_customers = customer_brands.head(10).to_dict('records')
 
-    # Aggregate: count how many customers have each brand in their top 4 (for Gap Analysis)
-    all_top_brands = top4_per_customer.groupby('primary_merchant').agg(
-        customer_count=('customer_id', 'nunique')
-    ).reset_index()
-    all_top_brands = all_top_brands.sort_values('customer_count', ascending=False)
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """3D graph data of a finished upload job."""
+    job = upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
 
-    # Get top 10 brands for gap analysis
-    top10_brands = all_top_brands.head(10).to_dict('records')
+    session = sessions.get(job.result)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session expired. Please re-upload the file.")
+    return Response(content=session["graph"], media_type="application/json")
 
-    return {
-        "sample_customers": sample_customers,
-        "top10_brands": top10_brands,
-        "total_customers_analyzed": len(customer_brands)
-    }
 
+@app.get("/api/merchants/{session_id}/{classification}")
+async def get_merchants(session_id: str, classification: str):
+    """Get merchant-level data for a specific classification."""
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found. Please re-upload the file.")
 
-@app.post("/api/process")
-async def process_file(file: UploadFile = File(...)):
-    """Process uploaded parquet file and return 3D graph data."""
-    if not file.filename.endswith('.parquet'):
-        raise HTTPException(status_code=400, detail="File must be a .parquet file")
+    body = session["merchants"].get(classification)
+    if body is None:
+        raise HTTPException(status_code=404, detail=f"No merchants found for classification: {classification}")
 
-    try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.parquet') as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
+    return Response(content=body, media_type="application/json")
 
-        # Process the dataset
-        classification_summary, merchant_summary = process_dataset(tmp_path)
 
-        # Clean up temp file
-        os.unlink(tmp_path)
+def build_aggregates(data_path: str) -> dict:
+    """
+    Compute every startup artifact from a raw snapshot, re-aggregating only
+    the customers that changed since the last processed snapshot.
+    """
+    dataset = DatasetContext(data_path, income=True)
+    print(dataset.describe())
+    artifacts = refresh_aggregates(ArtifactCache(CACHE_DIR), dataset)
+    if dataset.income_bands is not None:
+        bands = dataset.income_bands.astype(str)
+        artifacts["income_bands"] = bands.rename_axis(CUSTOMER_COL).reset_index()
+    return artifacts
+
+
+@dataclass
+class LoadedData:
+    """Everything the read-only endpoints serve for one snapshot; swapped as a whole."""
+    data_path: str
+    version: str
+    classification_data: pd.DataFrame
+    merchant_data: pd.DataFrame
+    recommendation_index: RecommendationIndex
+    total_customers: int
+    customer_segmentation: dict
+    segments: SegmentIndex
+    # Serialized once per snapshot, with precompressed variants
+    data_payload: CompressedPayload
+    merchant_payloads: dict
+    segmentation_payload: CompressedPayload
+    # Arrow IPC counterparts, for clients that ask for them
+    data_arrow: CompressedPayload
+    merchant_arrow: dict
+
+
+def load_snapshot(data_path: str, version: str = None) -> LoadedData:
+    """Load (or build) a snapshot's aggregates and the indexes served from them."""
+    print(f"Loading and processing {data_path}...")
+    artifacts = ArtifactCache(CACHE_DIR).get_or_build(data_path, lambda: build_aggregates(data_path))
+
+    classification_data = artifacts["classification_summary"]
+    merchant_data = artifacts["merchant_summary"]
+    total_customers = artifacts["total_customers"]
+    customer_segmentation = artifacts["customer_segmentation"]
+    print(f"Loaded {len(classification_data)} classifications, {len(merchant_data)} merchant entries, {total_customers} total customers with 10+ txn")
+    print(f"Segmentation complete: {customer_segmentation['total_customers_analyzed']} customers analyzed")
 
-        # Store merchant data for drill-down
-        session_id = str(abs(hash(file.filename + str(len(classification_summary)))))
-        processed_data_store[session_id] = merchant_summary
-
-        # Return data for 3D visualization
-        return {
-            "session_id": session_id,
-            "labels": classification_summary['transaction_classification_0'].tolist(),
-            "x": classification_summary['median_txn_per_customer'].tolist(),
-            "y": classification_summary['median_amount_per_customer'].tolist(),
-            "z": classification_summary['customers_with_10plus_txn'].tolist(),
-            "axis_labels": {
-                "x": "Median Transactions per Customer",
-                "y": "Median Amount per Customer",
-                "z": "Customers with 10+ Transactions"
-            }
+    income_bands = artifacts.get("income_bands")
+    if income_bands is not None:
+        income_bands = income_bands.set_index(CUSTOMER_COL)[BAND_COL]
+    segments = SegmentIndex.from_memberships(segment_memberships(artifacts["top_brands"], income_bands))
+    print(f"Indexed {len(segments.segments)} customer segments over {len(segments.customers)} customers")
+
+    return LoadedData(
+        data_path=data_path,
+        version=version or Path(data_path).parent.name,
+        classification_data=classification_data,
+        merchant_data=merchant_data,
+        recommendation_index=RecommendationIndex(classification_data, merchant_data, total_customers),
+        total_customers=total_customers,
+        customer_segmentation=customer_segmentation,
+        segments=segments,
+        data_payload=compress_payload(encode_json(graph_data(classification_data))),
+        merchant_payloads={
+            classification: compress_payload(body)
+            for classification, body in build_merchant_index(merchant_data).items()
+        },
+        segmentation_payload=compress_payload(encode_json(customer_segmentation)),
+        data_arrow=compress_payload(classification_stream(classification_data)),
+        merchant_arrow={
+            classification: compress_payload(body)
+            for classification, body in merchant_streams(merchant_data).items()
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    )
 
 
-@app.get("/api/merchants/{session_id}/{classification}")
-async def get_merchants(session_id: str, classification: str):
-    """Get merchant-level data for a specific classification."""
-    if session_id not in processed_data_store:
-        raise HTTPException(status_code=404, detail="Session not found. Please re-upload the file.")
+def payload_response(payload: CompressedPayload, request: Request, media_type: str = "application/json") -> Response:
+    """
+    Serve a precompressed payload in the best encoding the client accepts,
+    answering a matching If-None-Match with 304 Not Modified.
+    """
+    body, encoding = payload.select(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": payload.etag(encoding),
+        "Vary": "Accept, Accept-Encoding",
+        # Clients may keep a copy but must revalidate, since snapshots can be swapped
+        "Cache-Control": "no-cache"
+    }
+    if payload.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
 
-    merchant_data = processed_data_store[session_id]
-    filtered = merchant_data[merchant_data['transaction_classification_0'] == classification]
 
-    if filtered.empty:
-        raise HTTPException(status_code=404, detail=f"No merchants found for classification: {classification}")
+def activate_snapshot(version: str, data_path: str, activation: int):
+    """
+    Build a snapshot's aggregates and swap them in once complete, unless a
+    later activation has been swapped in meanwhile. Builds of different
+    snapshots run side by side; only the bookkeeping is locked.
+    """
+    global loaded, swapped_activation
+    with snapshot_build_lock:
+        snapshot_builds[version] = "building"
+    try:
+        new_data = load_snapshot(data_path, version)
+    except Exception as e:
+        with snapshot_build_lock:
+            snapshot_builds[version] = f"failed: {e}"
+        return
 
-    return {
-        "classification": classification,
-        "labels": filtered['primary_merchant'].tolist(),
-        "x": filtered['median_txn_per_customer'].tolist(),
-        "y": filtered['median_amount_per_customer'].tolist(),
-        "z": filtered['customers_with_10plus_txn'].tolist(),
-        "axis_labels": {
-            "x": "Median Transactions per Customer",
-            "y": "Median Amount per Customer",
-            "z": "Customers with 10+ Transactions"
-        }
-    }
+    with snapshot_build_lock:
+        if activation < swapped_activation:
+            snapshot_builds[version] = "superseded"
+            return
+        # Single reference assignment: requests already running keep the old data
+        loaded = new_data
+        swapped_activation = activation
+        snapshot_builds[version] = "ready"
+    print(f"Switched to snapshot {version}")
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Pre-process the dataset on server startup."""
-    global classification_data, merchant_data, total_customers, raw_data, customer_segmentation
-    print(f"Loading and processing {DATA_PATH}...")
-    classification_data, merchant_data, total_customers = process_dataset(DATA_PATH)
-    print(f"Loaded {len(classification_data)} classifications, {len(merchant_data)} merchant entries, {total_customers} total customers with 10+ txn")
+    """Load pre-processed aggregates, recomputing them only if the data or code changed."""
+    global loaded
+    loaded = load_snapshot(DATA_PATH)
 
-    # Load raw data for segmentation
-    print("Computing customer segmentation...")
-    raw_data = pd.read_parquet(DATA_PATH).drop_duplicates()
-    if 'primary_merchant' in raw_data.columns:
-        raw_data = raw_data[raw_data['primary_merchant'] != '']
-    customer_segmentation = compute_customer_segmentation(raw_data)
-    print(f"Segmentation complete: {customer_segmentation['total_customers_analyzed']} customers analyzed")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    upload_jobs.executor.shutdown(cancel_futures=True)
 
 
 @app.get("/api/data")
-async def get_data():
+async def get_data(request: Request):
     """Get pre-processed classification data."""
-    if classification_data is None:
+    current = loaded
+    if current is None:
         raise HTTPException(status_code=500, detail="Data not loaded")
 
-    return {
-        "labels": classification_data['transaction_classification_0'].tolist(),
-        "x": classification_data['median_txn_per_customer'].tolist(),
-        "y": classification_data['median_amount_per_customer'].tolist(),
-        "z": classification_data['customers_with_10plus_txn'].tolist(),
-        "axis_labels": {
-            "x": "Median Transactions per Customer",
-            "y": "Median Amount per Customer",
-            "z": "Customers with 10+ Transactions"
-        }
-    }
+    if wants_arrow(request.headers.get("accept")):
+        return payload_response(current.data_arrow, request, ARROW_STREAM_TYPE)
+    return payload_response(current.data_payload, request)
 
 
 @app.get("/api/merchants/{classification}")
-async def get_merchants_simple(classification: str):
+async def get_merchants_simple(classification: str, request: Request):
     """Get merchant-level data for a specific classification."""
-    if merchant_data is None:
+    current = loaded
+    if current is None:
         raise HTTPException(status_code=500, detail="Data not loaded")
 
-    filtered = merchant_data[merchant_data['transaction_classification_0'] == classification]
-
-    if filtered.empty:
+    arrow = wants_arrow(request.headers.get("accept"))
+    payload = (current.merchant_arrow if arrow else current.merchant_payloads).get(classification)
+    if payload is None:
         raise HTTPException(status_code=404, detail=f"No merchants found for: {classification}")
 
-    return {
-        "classification": classification,
-        "labels": filtered['primary_merchant'].tolist(),
-        "x": filtered['median_txn_per_customer'].tolist(),
-        "y": filtered['median_amount_per_customer'].tolist(),
-        "z": filtered['customers_with_10plus_txn'].tolist(),
-        "axis_labels": {
-            "x": "Median Transactions per Customer",
-            "y": "Median Amount per Customer",
-            "z": "Customers with 10+ Transactions"
-        }
-    }
+    return payload_response(payload, request, ARROW_STREAM_TYPE if arrow else "application/json")
 
 
 @app.get("/api/recommendations")
-async def get_recommendations(x: float = 35.0, y: float = 50.0):
+async def get_recommendations(request: Request, x: float = 35.0, y: float = 50.0):
     """
     Get top merchant recommendations based on customer involvement thresholds.
 
@@ -304,60 +344,118 @@ async def get_recommendations(x: float = 35.0, y: float = 50.0):
         x: Minimum % of total customers for a classification to be considered (default 35%)
         y: Minimum % of classification customers for a merchant to be recommended (default 50%)
     """
-    if classification_data is None or merchant_data is None:
+    current = loaded
+    if current is None:
         raise HTTPException(status_code=500, detail="Data not loaded")
 
-    # Step 1: Filter classifications with more than x% of total customers
-    min_class_customers = total_customers * (x / 100)
-    top_classifications = classification_data[
-        classification_data['customers_with_10plus_txn'] >= min_class_customers
-    ]
-
-    results = []
-
-    # Step 2: For each top classification, find merchants with more than y% of that classification's customers
-    for _, class_row in top_classifications.iterrows():
-        class_name = class_row['transaction_classification_0']
-        class_customers = class_row['customers_with_10plus_txn']
-        min_merchant_customers = class_customers * (y / 100)
-
-        # Get merchants in this classification
-        class_merchants = merchant_data[
-            (merchant_data['transaction_classification_0'] == class_name) &
-            (merchant_data['customers_with_10plus_txn'] >= min_merchant_customers)
-        ].copy()
-
-        for _, merch_row in class_merchants.iterrows():
-            results.append({
-                "classification": class_name,
-                "classification_customers": int(class_customers),
-                "classification_pct": round(class_customers / total_customers * 100, 1),
-                "merchant": merch_row['primary_merchant'],
-                "merchant_customers": int(merch_row['customers_with_10plus_txn']),
-                "merchant_pct_of_classification": round(merch_row['customers_with_10plus_txn'] / class_customers * 100, 1),
-                "median_txn": float(merch_row['median_txn_per_customer']),
-                "median_amount": float(merch_row['median_amount_per_customer'])
-            })
-
-    # Sort by merchant_customers descending
-    results.sort(key=lambda r: r['merchant_customers'], reverse=True)
-
-    return {
-        "total_customers": total_customers,
-        "threshold_x": x,
-        "threshold_y": y,
-        "top_classifications_count": len(top_classifications),
-        "recommendations": results
-    }
+    if wants_arrow(request.headers.get("accept")):
+        return Response(
+            content=recommendation_stream(current.recommendation_index, x, y),
+            media_type=ARROW_STREAM_TYPE
+        )
+    return current.recommendation_index.query(x, y)
 
 
 @app.get("/api/segmentation")
-async def get_segmentation():
+async def get_segmentation(request: Request):
     """Get customer segmentation data - top 2 brands per customer analysis."""
-    if customer_segmentation is None:
+    current = loaded
+    if current is None:
         raise HTTPException(status_code=500, detail="Segmentation data not loaded")
 
-    return customer_segmentation
+    return payload_response(current.segmentation_payload, request)
+
+
+@app.get("/api/segments")
+async def list_segments():
+    """Customer segments (income:<band>, brand:<merchant> in top 4) and their sizes."""
+    current = loaded
+    if current is None:
+        raise HTTPException(status_code=500, detail="Data not loaded")
+
+    return {"total_customers": len(current.segments.customers), "segments": current.segments.counts()}
+
+
+@app.get("/api/segments/overlap")
+async def segment_overlap(a: str, b: str, op: str = "and", include_ids: bool = False):
+    """
+    Set algebra between two customer segments.
+
+    Args:
+        a: First segment, e.g. "income:low"
+        b: Second segment, e.g. "brand:TESCO_GENERAL"
+        op: "and" (intersection), "or" (union) or "minus" (in a but not b)
+        include_ids: Also return the matching customer IDs
+    """
+    current = loaded
+    if current is None:
+        raise HTTPException(status_code=500, detail="Data not loaded")
+    if op not in SegmentIndex.OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"op must be one of {sorted(SegmentIndex.OPERATIONS)}")
+
+    segments = current.segments
+    for name in (a, b):
+        if name not in segments.segments:
+            raise HTTPException(status_code=404, detail=f"Unknown segment: {name}")
+
+    start = time.perf_counter()
+    result = segments.combine(a, b, op)
+    count = len(result)
+    elapsed_us = (time.perf_counter() - start) * 1e6
+
+    response = {
+        "a": a,
+        "b": b,
+        "op": op,
+        "count": count,
+        "a_count": len(segments.segment(a)),
+        "b_count": len(segments.segment(b)),
+        "elapsed_us": round(elapsed_us, 1)
+    }
+    if include_ids:
+        response["customer_ids"] = segments.customer_ids(result)
+    return response
+
+
+def require_admin(x_admin_token: str = Header(default="")):
+    """Admit only requests carrying the configured admin token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin API disabled: ADMIN_TOKEN is not set")
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.get("/api/admin/snapshots", dependencies=[Depends(require_admin)])
+def list_snapshots():
+    """List every data/raw snapshot with its files, row counts, schemas and hashes."""
+    current = loaded
+    catalog = scan_catalog(RAW_DATA_DIR)
+    return {
+        "active": current.version if current else None,
+        "active_path": current.data_path if current else None,
+        "snapshots": [
+            {**snapshot.to_dict(), "build_status": snapshot_builds.get(version)}
+            for version, snapshot in catalog.items()
+        ]
+    }
+
+
+@app.post("/api/admin/snapshots/{version}/activate", status_code=202, dependencies=[Depends(require_admin)])
+async def activate_snapshot_endpoint(version: str, background_tasks: BackgroundTasks):
+    """Build a snapshot's aggregates in the background, then swap them in."""
+    data_path = Path(RAW_DATA_DIR) / version / SNAPSHOT_FILES['processed_data']
+    if not version.startswith('v') or not data_path.exists():
+        raise HTTPException(status_code=404, detail=f"No processed data for snapshot: {version}")
+    with snapshot_build_lock:
+        # A build already waiting or running covers this request too
+        status = snapshot_builds.get(version)
+        if status in ("queued", "building"):
+            return {"version": version, "status": status}
+        snapshot_builds[version] = "queued"
+        activation = next(snapshot_activations)
+
+    background_tasks.add_task(activate_snapshot, version, str(data_path), activation)
+    return {"version": version, "status": "queued"}
 
 
 @app.get("/api/health")
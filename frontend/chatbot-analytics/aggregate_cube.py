@@ -0,0 +1,139 @@
+"""
+Precomputed aggregate cube of the transactions.
+
+One row per (merchant, classification_0, classification_1, month,
+credit_debit) cell with its transaction count, total amount and distinct
+customers. Distinct customers cannot be added up across cells, so every
+cell also keeps its exact set of customers, as sorted dense customer
+codes; the sets of any cells merge into the exact distinct customers of
+the combined cells.
+
+The cube is built once, in a one-off process, and written as an Arrow IPC
+file next to the dataset; the server and every query worker then
+memory-map it like the dataset (code_runner.map_cube) and share it.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+CUBE_DIMENSIONS = [
+    'primary_merchant',
+    'transaction_classification_0',
+    'transaction_classification_1',
+    'month',
+    'credit_debit'
+]
+CUSTOMER_SET_COL = 'customer_set'
+
+# Layout of the customer sets, checked so a cube written with another layout is rebuilt
+CUSTOMER_SET_LAYOUT = 'int32-codes'
+
+
+def customer_sets(customers: pd.Series, cells: np.ndarray, n_cells: int) -> tuple:
+    """
+    Distinct customers of every cell as (offsets, codes): cell i holds
+    codes[offsets[i]:offsets[i + 1]], sorted. Codes number the distinct
+    customer IDs densely, so a set costs 4 bytes per customer.
+    """
+    codes, uniques = pd.factorize(customers, use_na_sentinel=False)
+    n_customers = max(len(uniques), 1)
+    pairs = np.unique(cells.astype(np.int64) * n_customers + codes)
+    counts = np.bincount(pairs // n_customers, minlength=n_cells)
+    offsets = np.zeros(n_cells + 1, dtype=np.int32)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, (pairs % n_customers).astype(np.int32)
+
+
+def build_cube(transactions: pd.DataFrame) -> pa.Table:
+    """Aggregate transactions into the cube, with the customer set of every cell."""
+    timestamps = transactions['timestamp']
+    months = pd.Series(
+        pd.Categorical(timestamps.dt.year * 100 + timestamps.dt.month), index=transactions.index
+    )
+    months = months.cat.rename_categories([f"{int(ym) // 100}-{int(ym) % 100:02d}" for ym in months.cat.categories])
+    keys = [transactions[col] for col in CUBE_DIMENSIONS if col != 'month']
+    keys.insert(CUBE_DIMENSIONS.index('month'), months.rename('month'))
+
+    groups = transactions.groupby(keys, dropna=False, observed=True, sort=True)
+    cube = groups.agg(
+        transactions=('amount', 'size'),
+        total_amount=('amount', 'sum')
+    ).reset_index()
+    cube['month'] = cube['month'].astype(str)
+
+    offsets, codes = customer_sets(transactions['customer_id'], groups.ngroup().to_numpy(), len(cube))
+    cube['customers'] = np.diff(offsets).astype(np.int64)
+    table = pa.Table.from_pandas(cube, preserve_index=False)
+    sets = pa.ListArray.from_arrays(pa.array(offsets), pa.array(codes))
+    return table.append_column(CUSTOMER_SET_COL, sets).replace_schema_metadata(
+        {"customer_sets": CUSTOMER_SET_LAYOUT}
+    )
+
+
+def cube_is_current(data_arrow_path: str, cube_path: str) -> bool:
+    """Whether the cube file was built from the current data with the current customer set layout."""
+    if not os.path.exists(cube_path) or os.path.getmtime(cube_path) < os.path.getmtime(data_arrow_path):
+        return False
+    with pa.memory_map(cube_path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return metadata.get(b"customer_sets") == CUSTOMER_SET_LAYOUT.encode()
+
+
+def prepare_cube(transactions: pd.DataFrame, data_arrow_path: str, cube_path: str):
+    """
+    Build the cube file unless an up-to-date one exists. The server runs
+    this in a one-off process (code_runner.build_cube_file), not in itself.
+    """
+    if cube_is_current(data_arrow_path, cube_path):
+        return
+    table = build_cube(transactions)
+    tmp_path = cube_path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, cube_path)
+    pa.default_memory_pool().release_unused()
+    print(f"Built aggregate cube: {table.num_rows:,} cells, {table.nbytes / 1e6:.1f} MB")
+
+
+class CubeCustomers:
+    """
+    Distinct customers across any cube rows, from the union of the rows'
+    customer sets.
+
+    Called by generated code as distinct_customers(rows, by=None): rows are
+    cube rows (filtered, with the cube's index), by optional dimension
+    columns to group them by.
+    """
+
+    def __init__(self, offsets: np.ndarray, codes: np.ndarray):
+        self.offsets = offsets
+        self.codes = codes
+        self.n_customers = int(codes.max()) + 1 if len(codes) else 1
+
+    @classmethod
+    def from_sets(cls, sets: pa.ListArray) -> "CubeCustomers":
+        """Offsets and codes viewed directly in the set column's buffers (no copy)."""
+        return cls(sets.offsets.to_numpy(), sets.values.to_numpy())
+
+    def members(self, cells: np.ndarray) -> tuple:
+        """(customer codes of the cells, one after another; number of codes per cell)."""
+        starts = self.offsets[cells]
+        lengths = self.offsets[cells + 1] - starts
+        ends = np.cumsum(lengths)
+        positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - (ends - lengths), lengths)
+        return self.codes[positions], lengths
+
+    def __call__(self, rows: pd.DataFrame, by=None):
+        codes, lengths = self.members(rows.index.to_numpy())
+        if by is None:
+            return len(np.unique(codes))
+        groups = rows.groupby(by, dropna=False, observed=True, sort=True)
+        group_codes = np.repeat(groups.ngroup().to_numpy(), lengths)
+        pairs = np.unique(group_codes * self.n_customers + codes)
+        return pd.Series(
+            np.bincount(pairs // self.n_customers, minlength=groups.ngroups).astype(np.int64),
+            index=groups.size().index, name='customers'
+        )
@@ -4,18 +4,43 @@ Conversational AI with true context - remembers previous results and builds on t
 """
 
 import os
-import sys
 import json
 import uuid
+import time
+import asyncio
+import hashlib
+import httpx
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from anthropic import Anthropic
-from io import StringIO
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
 from datetime import datetime, timedelta
+from dataclasses import dataclass
 from typing import Optional
 import gc
+import traceback
+from contextlib import aclosing
+
+from code_runner import (
+    CodeLimitExceeded, CodeRunner, build_cube_file, decode_frame, encode_frame, map_cube, map_dataset
+)
+from result_cache import CachedAnswer, ResultCache
+
+try:
+    import resource
+except ImportError:  # Unix only; elsewhere peak memory is not reported
+    resource = None
+
+# Copy-on-Write (always on from pandas 3): frames derived from the shared base
+# share its memory, and writing through them copies instead of mutating the base
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
 app = FastAPI(title="Chatbot Analytics API")
 
@@ -29,23 +54,234 @@ app.add_middleware(
 )
 
 # Load data once at startup
-DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "columns_selected.parquet")
+DATA_PATH = os.environ.get(
+    "CHATBOT_DATA_PATH", os.path.join(os.path.dirname(__file__), "data", "columns_selected.parquet")
+)
+# Uncompressed Arrow IPC copy of DATA_PATH, memory-mapped instead of read into RAM
+ARROW_PATH = os.path.splitext(DATA_PATH)[0] + ".arrow"
+ARROW_BATCH_ROWS = 65536
+# Repeated ID/label columns stored as dictionary codes in the Arrow copy
+CODED_COLUMNS = [
+    'customer_id',
+    'account_id',
+    'primary_merchant',
+    'transaction_classification_0',
+    'transaction_classification_1',
+    'credit_debit'
+]
 df_original = None
 
+# Precomputed merchant x category x month x credit_debit aggregates, exposed to generated code as 'cube'
+CUBE_PATH = os.path.splitext(DATA_PATH)[0] + ".cube.arrow"
+cube_rows = 0
+
+# Generated code runs in worker processes, each limited in run time and memory
+CODE_WORKERS = int(os.environ.get("CODE_WORKERS", str(max(1, min(2, os.cpu_count() or 1)))))
+CODE_TIMEOUT_SECONDS = float(os.environ.get("CODE_TIMEOUT_SECONDS", "30"))
+CODE_MEMORY_MB = int(os.environ.get("CODE_MEMORY_MB", "192"))
+code_runner = None
+
 # Session storage with results
 sessions = {}
 SESSION_TIMEOUT = timedelta(hours=2)
 
+MODEL = "claude-opus-4-5-20251101"
+
+# One async client shared by all requests, so connections and TLS sessions are reused
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "20"))
+llm_client = None
+
+# Answers to repeated questions on the same data, reused without calling the LLM
+answer_cache = ResultCache(
+    max_bytes=int(os.environ.get("ANSWER_CACHE_MAX_MB", "32")) * 1024 * 1024,
+    ttl_seconds=float(os.environ.get("ANSWER_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+)
+
 
 @app.on_event("startup")
 async def load_data():
-    global df_original
-    full_df = pd.read_parquet(DATA_PATH)
-    # Sample 200K rows to fit in 512MB memory limit
-    df_original = full_df.sample(n=200000, random_state=42)
-    del full_df
+    global df_original, cube_rows, code_runner
+    prepare_arrow(DATA_PATH, ARROW_PATH)
+    # The server maps the data for previews; workers map the same file to run queries
+    df_original = map_dataset(ARROW_PATH)
+    # Built in a one-off process held to the per-query memory limit, then mapped here
+    await asyncio.to_thread(build_cube_file, ARROW_PATH, CUBE_PATH, CODE_MEMORY_MB * 1024 * 1024)
+    cube_rows = len(map_cube(CUBE_PATH)[0])
     gc.collect()
-    print(f"Loaded {len(df_original):,} transactions (sampled)")
+    print(f"Mapped {len(df_original):,} transactions from {ARROW_PATH} "
+          f"({os.path.getsize(ARROW_PATH) / 1e6:.1f} MB on disk, {cube_rows:,} cube rows, "
+          f"peak RSS {peak_rss_mb():.0f} MB)")
+
+    code_runner = CodeRunner(
+        ARROW_PATH, CUBE_PATH, CODE_WORKERS, CODE_TIMEOUT_SECONDS, CODE_MEMORY_MB * 1024 * 1024
+    )
+    await asyncio.to_thread(code_runner.start)
+    print(f"Started {CODE_WORKERS} query workers ({CODE_TIMEOUT_SECONDS:g} s / {CODE_MEMORY_MB} MB per query)")
+
+
+def coded_dictionaries(parquet: pq.ParquetFile) -> dict:
+    """Sorted distinct labels of every coded column present in the file."""
+    columns = [col for col in CODED_COLUMNS if col in parquet.schema_arrow.names]
+    uniques = {col: [] for col in columns}
+    for batch in parquet.iter_batches(batch_size=ARROW_BATCH_ROWS, columns=columns):
+        for col in columns:
+            uniques[col].append(pc.unique(batch.column(col)))
+    dictionaries = {}
+    for col, chunks in uniques.items():
+        labels = pc.drop_null(pc.unique(pa.chunked_array(chunks, parquet.schema_arrow.field(col).type)))
+        dictionaries[col] = labels.take(pc.sort_indices(labels))
+    return dictionaries
+
+
+def code_type(n_labels: int) -> pa.DataType:
+    """Narrowest signed integer type that can index n_labels labels."""
+    for index_type in (pa.int8(), pa.int16(), pa.int32()):
+        if n_labels <= np.iinfo(index_type.to_pandas_dtype()).max:
+            return index_type
+    return pa.int64()
+
+
+def arrow_is_current(arrow_path: str, data_path: str) -> bool:
+    """Whether arrow_path is newer than data_path and written with the current coded columns."""
+    if not os.path.exists(arrow_path) or os.path.getmtime(arrow_path) < os.path.getmtime(data_path):
+        return False
+    with pa.memory_map(arrow_path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return metadata.get(b"coded_columns") == ",".join(CODED_COLUMNS).encode()
+
+
+def prepare_arrow(data_path: str, arrow_path: str):
+    """
+    Convert the parquet file to an uncompressed Arrow IPC file, one record
+    batch at a time, unless an up-to-date copy already exists.
+
+    Repeated ID/label columns (CODED_COLUMNS) are written as dictionary
+    codes over one sorted label dictionary per column, so they map as
+    categoricals (as compact_transactions in src/compact.py does for the
+    exported data) instead of one string per row.
+    """
+    if arrow_is_current(arrow_path, data_path):
+        return
+    parquet = pq.ParquetFile(data_path)
+    dictionaries = coded_dictionaries(parquet)
+    schema = pa.schema(
+        [
+            pa.field(field.name, pa.dictionary(code_type(len(dictionaries[field.name])), field.type))
+            if field.name in dictionaries else field
+            for field in parquet.schema_arrow
+        ],
+        metadata={b"coded_columns": ",".join(CODED_COLUMNS).encode()}
+    )
+    tmp_path = arrow_path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in parquet.iter_batches(batch_size=ARROW_BATCH_ROWS):
+            columns = [
+                pa.DictionaryArray.from_arrays(
+                    pc.index_in(batch.column(name), value_set=dictionaries[name]).cast(schema.field(name).type.index_type),
+                    dictionaries[name]
+                )
+                if name in dictionaries else batch.column(name)
+                for name in batch.schema.names
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+    os.replace(tmp_path, arrow_path)
+    # Hand the conversion buffers back to the OS before the server starts taking requests
+    pa.default_memory_pool().release_unused()
+    print(f"Converted {data_path} to {arrow_path}")
+
+
+@app.on_event("shutdown")
+async def close_clients():
+    if llm_client is not None:
+        await llm_client.close()
+    if code_runner is not None:
+        code_runner.close()
+
+
+def get_llm_client() -> AsyncAnthropic:
+    """The shared async LLM client, created on first use."""
+    global llm_client
+    if llm_client is None:
+        api_key = os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise HTTPException(status_code=500, detail="ANTHROPIC_API_KEY not set")
+        limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+        llm_client = AsyncAnthropic(api_key=api_key, http_client=DefaultAsyncHttpxClient(limits=limits))
+    return llm_client
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process (ru_maxrss is in KB on Linux); NaN where unavailable."""
+    if resource is None:
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@dataclass
+class DataView:
+    """
+    A session's working dataset, expressed relative to the shared base.
+
+    Row/column selections of the base are kept as row positions and column
+    names, so a session costs a few bytes per selected row instead of a copy
+    of the dataset. Anything else the generated code derives (aggregates,
+    new or changed columns) is kept as the result frame itself.
+    """
+    rows: Optional[np.ndarray] = None  # Base row positions; None = every row
+    columns: Optional[list] = None     # Base columns; None = all, in base order
+    frame: Optional[pd.DataFrame] = None
+
+    def __len__(self) -> int:
+        if self.frame is not None:
+            return len(self.frame)
+        return len(df_original) if self.rows is None else len(self.rows)
+
+    def head(self, n: int) -> pd.DataFrame:
+        """First n rows of the view, without materializing the rest."""
+        if self.frame is not None:
+            return self.frame.head(n)
+        selected = df_original.head(n) if self.rows is None else df_original.take(self.rows[:n])
+        return selected if self.columns is None else selected[self.columns]
+
+    @property
+    def is_full(self) -> bool:
+        """Whether the view is the whole, unmodified base."""
+        return self.frame is None and self.rows is None and self.columns is None
+
+    def job(self, code: str) -> dict:
+        """A code runner job running code on this view (with the cube, if on the full data)."""
+        return {
+            "code": code,
+            "rows": self.rows,
+            "columns": self.columns,
+            "frame": encode_frame(self.frame) if self.frame is not None else None,
+            "cube": self.is_full
+        }
+
+    @classmethod
+    def from_reply(cls, view: dict) -> "DataView":
+        """The view a code runner reply's DataFrame result leaves behind."""
+        if "frame" in view:
+            return cls(frame=decode_frame(view["frame"]))
+        return cls(rows=view["rows"], columns=view["columns"])
+
+    def nbytes(self) -> int:
+        if self.frame is not None:
+            return int(self.frame.memory_usage(deep=True).sum())
+        return 0 if self.rows is None else self.rows.nbytes
+
+    def digest(self) -> Optional[str]:
+        """Identifies the view's contents, or None if they cannot be hashed."""
+        h = hashlib.sha256(repr(self.columns if self.frame is None else list(self.frame.columns)).encode())
+        if self.frame is None:
+            h.update(b"base" if self.rows is None else self.rows.tobytes())
+            return h.hexdigest()
+        try:
+            h.update(pd.util.hash_pandas_object(self.frame).to_numpy().tobytes())
+        except TypeError:
+            # Unhashable cells (lists, dicts): such views are simply never cached
+            return None
+        return h.hexdigest()
 
 
 class ChatRequest(BaseModel):
@@ -57,25 +293,53 @@ class ChatResponse(BaseModel):
     response: str
     table: list | None = None
     session_id: str
+    query_ms: float | None = None
+    cached: bool = False
 
 
 # Data schema for Claude
 DATA_SCHEMA = """
 The DataFrame 'df' contains transaction data with these columns:
-- primary_merchant: string - merchant name (e.g., "AMAZON_MARKETPLACE", "TESCO_GENERAL")
-- transaction_classification_0: string - category (e.g., "Shopping", "Groceries", "Financial Services")
-- transaction_classification_1: string - subcategory
-- customer_id: string - unique customer identifier
-- account_id: string - account identifier
+- primary_merchant: category - merchant name (e.g., "AMAZON_MARKETPLACE", "TESCO_GENERAL")
+- transaction_classification_0: category - category (e.g., "Shopping", "Groceries", "Financial Services")
+- transaction_classification_1: category - subcategory
+- customer_id: category - unique customer identifier
+- account_id: category - account identifier
 - date: string - transaction date
 - amount: float - transaction amount (always positive)
-- credit_debit: string - EXACTLY "credit" or "debit" (lowercase!)
+- credit_debit: category - EXACTLY "credit" or "debit" (lowercase!)
 - timestamp: datetime - full timestamp with time
 
 IMPORTANT:
-- ~200,000 transactions (sampled from 838K)
+- The full dataset (~838K transactions), not a sample
 - credit_debit values are LOWERCASE
 - All amounts are positive numbers
+- Category columns compare with strings as usual (==, isin, .str); always pass observed=True
+  to groupby/pivot_table on them, or every unused label shows up as an empty group
+"""
+
+
+CUBE_SCHEMA = """
+A precomputed DataFrame 'cube' aggregates ALL transactions, one row per
+(primary_merchant, transaction_classification_0, transaction_classification_1, month, credit_debit):
+- primary_merchant, transaction_classification_0, transaction_classification_1, credit_debit: as in 'df'
+- month: string - "YYYY-MM"
+- transactions: int - number of transactions
+- total_amount: float - sum of amount
+- customers: int - distinct customers within that row only (NEVER sum it across rows)
+For distinct customers across rows use distinct_customers(rows, by=None): rows are rows of
+'cube' (filter cube, keep its index), by an optional column or list of columns to group by.
+It returns an exact int, or a Series per group.
+
+PREFER 'cube' whenever the question only needs transaction counts, amount totals or averages
+(total_amount / transactions) or customer counts by merchant, category, subcategory, month or
+credit/debit: it has {cube_rows} rows instead of {row_count}. Use 'df' for anything else
+(time of day, weekdays, dates, amount thresholds, individual transactions, customer or
+account level detail).
+"""
+
+NO_CUBE_NOTE = """
+'df' is a refined subset of the data, so the precomputed 'cube' does not apply: use 'df'.
 """
 
 
@@ -103,7 +367,7 @@ CURRENT DATA STATE:
 The DataFrame 'df' currently has {row_count} rows.
 Preview (first 10 rows):
 {data_preview}
-
+{cube_note}
 Previous conversation for context:
 {history}
 
@@ -163,8 +427,9 @@ def get_or_create_session(session_id: Optional[str]) -> dict:
         'id': new_id,
         'history': [],
         'last_access': now,
-        'current_df': df_original.copy(),  # Start with full data
-        'last_code': None
+        'view': DataView(),  # Start with the full (shared) data
+        'last_code': None,
+        'lock': asyncio.Lock()
     }
     return sessions[new_id]
 
@@ -190,187 +455,259 @@ def get_history_text(history: list) -> str:
     return text
 
 
-def get_data_preview(df: pd.DataFrame, rows: int = 10) -> str:
-    """Get a string preview of the dataframe."""
-    return df.head(rows).to_string()
+def get_data_preview(view: DataView, rows: int = 10) -> str:
+    """Get a string preview of a session's working data."""
+    return view.head(rows).to_string()
 
 
-def execute_code(code: str, dataframe: pd.DataFrame) -> tuple:
-    """Execute pandas code and return result."""
-    namespace = {
-        'pd': pd,
-        'df': dataframe,
-    }
-
-    old_stdout = sys.stdout
-    sys.stdout = StringIO()
-
-    try:
-        exec(code, namespace)
-        output = sys.stdout.getvalue()
-        result = namespace.get('result', None)
-        return result, output, None
-    except Exception as e:
-        return None, None, str(e)
-    finally:
-        sys.stdout = old_stdout
-
+def clean_code(text: str) -> str:
+    """Strip markdown fences from generated code."""
+    code = text.strip()
+    if code.startswith("```python"):
+        code = code[9:]
+    if code.startswith("```"):
+        code = code[3:]
+    if code.endswith("```"):
+        code = code[:-3]
+    return code.strip()
 
-def format_result_preview(result) -> str:
-    """Format result for Claude to see exact data."""
-    if isinstance(result, pd.DataFrame):
-        return f"DataFrame ({len(result)} rows):\n{result.to_string()}"
-    elif isinstance(result, pd.Series):
-        return f"Series:\n{result.to_string()}"
-    elif result is not None:
-        return str(result)
-    return "No result"
 
-
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    global df_original
-
-    if df_original is None:
-        raise HTTPException(status_code=500, detail="Data not loaded")
-
-    api_key = os.environ.get("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="ANTHROPIC_API_KEY not set")
-
-    client = Anthropic(api_key=api_key)
+async def complete(prompt: str, max_tokens: int) -> str:
+    """One non-streaming LLM call on the shared client."""
+    message = await get_llm_client().messages.create(
+        model=MODEL,
+        max_tokens=max_tokens,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    return message.content[0].text.strip()
+
+
+def cached_events(session: dict, answer: CachedAnswer):
+    """Replay a cached answer as chat events, leaving the session where the answer did."""
+    session['last_code'] = answer.code
+    session['view'] = answer.view
+    add_to_history(session, 'assistant', answer.response)
+    print(f"Answer cache hit ({answer_cache.stats()['hit_rate']} hit rate)")
+    yield 'meta', {"session_id": session['id'], "table": answer.table, "query_ms": None, "cached": True}
+    yield 'delta', answer.response
+    yield 'done', {"response": answer.response}
+
+
+async def chat_events(request: ChatRequest):
+    """
+    Answer a chat message as a sequence of (event, data) pairs: 'meta'
+    (session ID, result table, query time) once the result is known, a
+    'delta' per chunk of response text as the LLM streams it, then 'done'
+    with the full response.
+
+    The session is locked for the whole exchange, so concurrent messages on
+    one session run one after another instead of racing on its view.
+    """
     session = get_or_create_session(request.session_id)
-
-    add_to_history(session, 'user', request.message)
-    history_text = get_history_text(session['history'][:-1])
-
-    # Step 1: Determine if this is a refinement or new question
-    is_refinement = False
-    if session['last_code'] and len(session['history']) > 1:
+    async with session['lock']:
+        add_to_history(session, 'user', request.message)
+        history_text = get_history_text(session['history'][:-1])
+
+        # Answers are reused before any LLM call. A repeated follow-up is keyed by the view it
+        # was asked on and the history, since whether it refines the previous result follows
+        # from them. A question answered before as a new question is keyed by itself on the
+        # full data and shared by every session that asks it, whatever came before
+        has_context = bool(session['last_code']) and len(session['history']) > 1
+        data_digest = await asyncio.to_thread(session['view'].digest) if has_context else None
+        context_key = ResultCache.key(request.message, data_digest, history_text) if data_digest else None
+        fresh_key = ResultCache.key(request.message, DataView().digest())
+        for key in (context_key, fresh_key):
+            cached = answer_cache.get(key) if key else None
+            if cached is not None:
+                for event in cached_events(session, cached):
+                    yield event
+                return
+
+        # Step 1: Determine if this is a refinement or new question
+        is_refinement = False
+        if has_context:
+            try:
+                decision = await complete(ROUTING_PROMPT.format(
+                    history=history_text,
+                    data_preview=get_data_preview(session['view'], 5),
+                    row_count=len(session['view']),
+                    question=request.message
+                ), max_tokens=10)
+                is_refinement = "REFINE" in decision.upper()
+            except Exception:
+                is_refinement = False
+
+        # Choose which data to work with; a new question starts from the shared base.
+        # Only a new question's answer is stored under its fresh key
+        if is_refinement:
+            fresh_key = None
+        else:
+            session['view'] = DataView()
+
+        working_view = session['view']
+
+        # Step 2: Generate code with retry
+        max_retries = 2
+        reply = None
+        error = None
+        code = None
+        query_ms = None
+
+        for attempt in range(max_retries + 1):
+            cube_note = (
+                CUBE_SCHEMA.format(cube_rows=f"{cube_rows:,}", row_count=f"{len(working_view):,}")
+                if working_view.is_full else NO_CUBE_NOTE
+            )
+            prompt = CODE_PROMPT.format(
+                schema=DATA_SCHEMA,
+                row_count=len(working_view),
+                data_preview=get_data_preview(working_view),
+                cube_note=cube_note,
+                history=history_text,
+                question=request.message
+            )
+            if attempt > 0:
+                prompt += f"\n\nYour previous code failed with: {error}\nFix it and try again:"
+
+            try:
+                code = clean_code(await complete(prompt, max_tokens=1024))
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Claude API error: {str(e)}")
+
+            # Executed in a worker process, so other sessions keep being served meanwhile
+            started = time.perf_counter()
+            try:
+                reply = await code_runner.run(await asyncio.to_thread(working_view.job, code))
+                error = reply["error"]
+                query_ms = reply["query_ms"]
+            except CodeLimitExceeded as e:
+                reply, error, query_ms = None, str(e), None
+            print(f"Query attempt {attempt + 1} on {len(working_view):,} rows: "
+                  f"{(time.perf_counter() - started) * 1000:.0f} ms"
+                  + (f" ({query_ms:.0f} ms running)" if query_ms is not None else "")
+                  + (f" (error: {error})" if error else ""))
+
+            if error is None:
+                session['last_code'] = code
+                # If result is a DataFrame, it becomes the session's view for future refinements
+                if reply["view"] is not None:
+                    session['view'] = await asyncio.to_thread(DataView.from_reply, reply["view"])
+                break
+
+        table_data = reply["table"] if error is None else None
+        yield 'meta', {
+            "session_id": session['id'],
+            "table": table_data,
+            "query_ms": round(query_ms, 1) if query_ms is not None else None,
+            "cached": False
+        }
+
+        # Step 3: Stream a response based on ACTUAL results
+        result_preview = reply["preview"] if error is None else f"Error: {error}"
+        parts = []
         try:
-            routing_response = client.messages.create(
-                model="claude-opus-4-5-20251101",
-                max_tokens=10,
+            async with get_llm_client().messages.stream(
+                model=MODEL,
+                max_tokens=500,
                 messages=[{
                     "role": "user",
-                    "content": ROUTING_PROMPT.format(
-                        history=history_text,
-                        data_preview=get_data_preview(session['current_df'], 5),
-                        row_count=len(session['current_df']),
-                        question=request.message
+                    "content": RESPONSE_PROMPT.format(
+                        question=request.message,
+                        result_preview=result_preview,
+                        history=history_text
                     )
                 }]
+            ) as stream:
+                async for text in stream.text_stream:
+                    parts.append(text)
+                    yield 'delta', text
+            response_generated = True
+        except Exception:
+            response_generated = False
+            if not parts:
+                parts.append(f"Here's what I found: {result_preview}")
+                yield 'delta', parts[-1]
+
+        conversational_response = "".join(parts).strip()
+        add_to_history(session, 'assistant', conversational_response)
+
+        # Only complete answers are cached; failed code or a fallback response is retried next time.
+        # A new question is also stored under its conversation, so repeating the whole
+        # exchange skips the routing call too
+        cache_keys = [key for key in (fresh_key, context_key) if key]
+        if cache_keys and error is None and response_generated:
+            answer_view = session['view']
+            answer = CachedAnswer(
+                code=code,
+                response=conversational_response,
+                table=table_data,
+                view=answer_view,
+                nbytes=len(code) + len(conversational_response)
+                + len(json.dumps(table_data, default=str))
+                + answer_view.nbytes()
             )
-            decision = routing_response.content[0].text.strip().upper()
-            is_refinement = "REFINE" in decision
-        except:
-            is_refinement = False
-
-    # Choose which dataframe to work with
-    if is_refinement:
-        working_df = session['current_df']
-    else:
-        working_df = df_original.copy()
-        session['current_df'] = working_df
-
-    # Step 2: Generate code with retry
-    max_retries = 2
-    result = None
-    error = None
-    code = None
-
-    for attempt in range(max_retries + 1):
-        try:
-            if attempt == 0:
-                prompt = CODE_PROMPT.format(
-                    schema=DATA_SCHEMA,
-                    row_count=len(working_df),
-                    data_preview=get_data_preview(working_df),
-                    history=history_text,
-                    question=request.message
-                )
-            else:
-                prompt = f"""{CODE_PROMPT.format(
-                    schema=DATA_SCHEMA,
-                    row_count=len(working_df),
-                    data_preview=get_data_preview(working_df),
-                    history=history_text,
-                    question=request.message
-                )}
+            for key in cache_keys:
+                answer_cache.put(key, answer)
 
-Your previous code failed with: {error}
-Fix it and try again:"""
+        yield 'done', {"response": conversational_response}
 
-            code_response = client.messages.create(
-                model="claude-opus-4-5-20251101",
-                max_tokens=1024,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            code = code_response.content[0].text.strip()
 
-            # Clean markdown
-            if code.startswith("```python"):
-                code = code[9:]
-            if code.startswith("```"):
-                code = code[3:]
-            if code.endswith("```"):
-                code = code[:-3]
-            code = code.strip()
+def check_ready():
+    if df_original is None:
+        raise HTTPException(status_code=500, detail="Data not loaded")
+    get_llm_client()
+
 
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    check_ready()
+    meta = {}
+    # Closed on return, so the session lock is released now rather than at garbage collection
+    async with aclosing(chat_events(request)) as events:
+        async for event, data in events:
+            if event == 'meta':
+                meta = data
+            elif event == 'done':
+                return ChatResponse(response=data["response"], **meta)
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    The /api/chat answer as server-sent events, so the response text shows
+    as it is generated rather than once it is complete.
+    """
+    check_ready()
+
+    async def events():
+        try:
+            # Closed with the response, so a client disconnecting mid-answer releases the session lock
+            async with aclosing(chat_events(request)) as answer:
+                async for event, data in answer:
+                    yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        except HTTPException as e:
+            yield f"event: error\ndata: {json.dumps({'detail': e.detail})}\n\n"
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Claude API error: {str(e)}")
-
-        result, output, error = execute_code(code, working_df)
-
-        if error is None:
-            session['last_code'] = code
-            # If result is a DataFrame, update session's current_df for future refinements
-            if isinstance(result, pd.DataFrame):
-                session['current_df'] = result.copy()
-            break
-
-    # Step 3: Generate response based on ACTUAL results
-    result_preview = format_result_preview(result) if error is None else f"Error: {error}"
-
-    try:
-        response_msg = client.messages.create(
-            model="claude-opus-4-5-20251101",
-            max_tokens=500,
-            messages=[{
-                "role": "user",
-                "content": RESPONSE_PROMPT.format(
-                    question=request.message,
-                    result_preview=result_preview,
-                    history=history_text
-                )
-            }]
-        )
-        conversational_response = response_msg.content[0].text.strip()
-    except Exception as e:
-        conversational_response = f"Here's what I found: {result_preview}"
-
-    add_to_history(session, 'assistant', conversational_response)
-
-    # Format table
-    table_data = None
-    if error is None:
-        if isinstance(result, pd.DataFrame) and not result.empty:
-            table_data = result.head(30).to_dict(orient='records')
-        elif isinstance(result, pd.Series):
-            result_df = result.reset_index()
-            result_df.columns = ['Category', 'Value'] if len(result_df.columns) == 2 else result_df.columns
-            table_data = result_df.head(30).to_dict(orient='records')
-
-    return ChatResponse(
-        response=conversational_response,
-        table=table_data,
-        session_id=session['id']
+            # Anything else (code runner, LLM API) ends the answer with an error the client can show
+            print(f"Chat stream failed: {e!r}")
+            traceback.print_exc()
+            yield f"event: error\ndata: {json.dumps({'detail': f'Internal error: {e}'})}\n\n"
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
     )
 
 
 @app.get("/api/health")
 async def health():
-    return {"status": "ok", "rows": len(df_original) if df_original is not None else 0}
+    return {
+        "status": "ok",
+        "rows": len(df_original) if df_original is not None else 0,
+        "cube_rows": cube_rows,
+        "sessions": len(sessions),
+        "session_bytes": sum(session['view'].nbytes() for session in sessions.values()),
+        "answer_cache": answer_cache.stats()
+    }
 
 
 if __name__ == "__main__":
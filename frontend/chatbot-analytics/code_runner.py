@@ -0,0 +1,448 @@
+"""
+Isolated execution of generated pandas code.
+
+Code runs in a pool of pre-started worker processes, each with the dataset
+and the aggregate cube already memory-mapped (the mapped file's pages are shared between them, so
+extra workers cost little memory). Every job has a wall-clock limit and a
+memory limit. Memory is capped inside the worker with RLIMIT_DATA, so an
+allocation past it raises MemoryError in the query itself; the server
+kills and replaces a worker that runs past the time limit (or, as a
+backstop, the memory limit). A runaway query fails on its own instead of
+stalling or taking down the server. Results come back as previews, table
+rows and, for DataFrame results, row positions or an Arrow buffer.
+"""
+
+import asyncio
+import gc
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager, redirect_stdout
+from io import StringIO
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from aggregate_cube import CUSTOMER_SET_COL, CubeCustomers, cube_is_current, prepare_cube
+
+try:
+    import resource
+except ImportError:  # Unix only; elsewhere just the server-side memory check applies
+    resource = None
+
+# String columns stay Arrow-backed (zero-copy from the mapped file) instead of Python objects
+ARROW_STRING_TYPES = {
+    pa.string(): pd.StringDtype("pyarrow"),
+    pa.large_string(): pd.StringDtype("pyarrow")
+}
+
+# Rows of a result shown to the LLM; rendering every row of a large result
+# costs seconds and far more tokens than the response prompt can use
+PREVIEW_MAX_ROWS = 100
+
+# How often a running job's memory is checked
+WATCH_INTERVAL_SECONDS = 0.05
+
+# Allocator settings of the worker processes, read when each one starts, so
+# RLIMIT_DATA tracks what jobs really hold: Arrow allocates through malloc
+# instead of mimalloc (which reserves a 1 GB arena up front), and blocks of
+# 128 kB or more are mapped on their own and unmapped when freed, instead of
+# staying in the heap's address space after a job
+WORKER_ENV = {
+    "ARROW_DEFAULT_MEMORY_POOL": "system",
+    "MALLOC_MMAP_THRESHOLD_": str(128 * 1024)
+}
+# Serializes worker starts, which swap the server's environment for WORKER_ENV
+_environ_lock = threading.Lock()
+
+
+class CodeLimitExceeded(Exception):
+    pass
+
+
+@contextmanager
+def worker_environment():
+    """
+    Set WORKER_ENV while a worker process is started, then restore the
+    server's own values. The variables are read as the process starts, too
+    early for the worker to set them itself, and the server's allocators
+    are already set up, so it only needs them set for the spawn.
+    """
+    with _environ_lock:
+        saved = {name: os.environ.get(name) for name in WORKER_ENV}
+        os.environ.update(WORKER_ENV)
+        try:
+            yield
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def map_dataset(arrow_path: str) -> pd.DataFrame:
+    """
+    Memory-map an Arrow IPC file as a DataFrame.
+
+    Columns reference the mapped file rather than copies of it, so the OS
+    pages in only the columns and batches a query touches (and can evict
+    them again). The index is positional, so a row selection's index labels
+    are its base row positions.
+    """
+    table = pa.ipc.open_file(pa.memory_map(arrow_path)).read_all()
+    return table.to_pandas(types_mapper=ARROW_STRING_TYPES.get, split_blocks=True)
+
+
+def map_cube(cube_path: str) -> tuple:
+    """
+    Memory-map the aggregate cube file.
+
+    Returns:
+        Tuple of (cube DataFrame without the customer sets, distinct_customers
+        function over its rows)
+    """
+    table = pa.ipc.open_file(pa.memory_map(cube_path)).read_all()
+    sets = table.column(CUSTOMER_SET_COL)
+    # The cube is written as one batch, so its customer sets are read in place from the mapped file;
+    # combining chunks would copy every set into this process
+    sets = sets.chunk(0) if sets.num_chunks == 1 else sets.combine_chunks()
+    distinct_customers = CubeCustomers.from_sets(sets)
+    cube = table.drop_columns([CUSTOMER_SET_COL]).to_pandas(types_mapper=ARROW_STRING_TYPES.get, split_blocks=True)
+    return cube, distinct_customers
+
+
+def proc_status_bytes(pid: int, field: str) -> Optional[int]:
+    """A memory field (in kB) of /proc/<pid>/status in bytes; None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def anon_rss_bytes(pid: int) -> Optional[int]:
+    """
+    Anonymous resident memory of a process: what its own allocations use,
+    excluding the shared, file-backed pages of the mapped dataset. None
+    where /proc is unavailable.
+    """
+    return proc_status_bytes(pid, "RssAnon")
+
+
+def limit_data(extra_bytes: int):
+    """
+    Cap this process's data segment at its current size plus extra_bytes.
+
+    RLIMIT_DATA counts private writable memory (heap and anonymous
+    mappings) but not the read-only mapping of the dataset, so it bounds
+    what a query allocates; allocations past it fail with MemoryError.
+    """
+    current = proc_status_bytes(os.getpid(), "VmData")
+    if resource is None or current is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+    limit = current + extra_bytes if hard == resource.RLIM_INFINITY else min(current + extra_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, hard))
+
+
+def encode_frame(frame: pd.DataFrame) -> tuple:
+    """(format, bytes) of a frame: an Arrow IPC stream, or a pickle if Arrow cannot hold it."""
+    try:
+        table = pa.Table.from_pandas(frame, preserve_index=True)
+    except (pa.ArrowException, TypeError, ValueError):
+        return "pickle", pickle.dumps(frame)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return "arrow", sink.getvalue().to_pybytes()
+
+
+def decode_frame(encoded: tuple) -> pd.DataFrame:
+    kind, data = encoded
+    if kind == "pickle":
+        return pickle.loads(data)
+    return pa.ipc.open_stream(data).read_all().to_pandas(types_mapper=ARROW_STRING_TYPES.get)
+
+
+def materialize(base: pd.DataFrame, job: dict) -> pd.DataFrame:
+    """
+    The job's working data. Safe to hand to generated code: under
+    Copy-on-Write, writes to it never reach the mapped base.
+    """
+    if job["frame"] is not None:
+        return decode_frame(job["frame"])
+    selected = base.copy(deep=False) if job["rows"] is None else base.take(job["rows"])
+    return selected if job["columns"] is None else selected[job["columns"]]
+
+
+def selection_of(base: pd.DataFrame, result: pd.DataFrame) -> Optional[tuple]:
+    """
+    (row positions, columns) if a result is a row/column selection of the
+    base with the base's own values, else None. Row positions are None for
+    every row in order and columns None for all columns in base order.
+    """
+    index = result.index
+    is_selection = (
+        isinstance(index, pd.RangeIndex) or pd.api.types.is_integer_dtype(index.dtype)
+    ) and index.is_unique and result.columns.is_unique and result.columns.isin(base.columns).all()
+    if is_selection and len(index):
+        is_selection = 0 <= index.min() and index.max() < len(base)
+    if not is_selection:
+        return None
+
+    rows = index.to_numpy().astype(np.int32)
+    # Compared one column at a time, so only one column is ever duplicated
+    if not all(
+        result[col].dtype == base[col].dtype and result[col].equals(base[col].take(rows).set_axis(index))
+        for col in result.columns
+    ):
+        return None
+
+    columns = list(result.columns)
+    return (
+        None if len(rows) == len(base) and (rows == np.arange(len(rows))).all() else rows,
+        None if columns == list(base.columns) else columns
+    )
+
+
+def format_result_preview(result) -> str:
+    """Format result for Claude to see exact data (long results show their first and last rows)."""
+    if isinstance(result, pd.DataFrame):
+        return f"DataFrame ({len(result)} rows):\n{result.to_string(max_rows=PREVIEW_MAX_ROWS)}"
+    elif isinstance(result, pd.Series):
+        return f"Series:\n{result.to_string(max_rows=PREVIEW_MAX_ROWS)}"
+    elif result is not None:
+        return str(result)
+    return "No result"
+
+
+def format_table(result) -> list | None:
+    """First rows of a DataFrame or Series result, as table records."""
+    if isinstance(result, pd.DataFrame) and not result.empty:
+        return result.head(30).to_dict(orient='records')
+    elif isinstance(result, pd.Series):
+        result_df = result.reset_index()
+        result_df.columns = ['Category', 'Value'] if len(result_df.columns) == 2 else result_df.columns
+        return result_df.head(30).to_dict(orient='records')
+    return None
+
+
+def run_job(base: pd.DataFrame, cube: tuple, job: dict) -> dict:
+    """
+    Execute one job's code on its working data (in a worker process).
+    Jobs on the full dataset also get the aggregate cube and its
+    distinct_customers function.
+
+    Returns:
+        Reply with the captured stdout and either an error, or the result's
+        preview, table rows and, for DataFrame results, the view it leaves
+        behind: {"rows", "columns"} for a selection of the base, or
+        {"frame"} with the encoded result
+    """
+    started = time.perf_counter()
+    stdout = StringIO()
+    reply = {"output": "", "error": None, "preview": None, "table": None, "view": None}
+    try:
+        namespace = {'pd': pd, 'df': materialize(base, job)}
+        if job.get("cube"):
+            namespace['cube'], namespace['distinct_customers'] = cube
+        # stdout is this worker's own, so capturing it cannot clash with other jobs
+        with redirect_stdout(stdout):
+            exec(job["code"], namespace)
+        result = namespace.get('result', None)
+
+        reply["preview"] = format_result_preview(result)
+        reply["table"] = format_table(result)
+        if isinstance(result, pd.DataFrame):
+            selection = selection_of(base, result)
+            if selection is not None:
+                reply["view"] = {"rows": selection[0], "columns": selection[1]}
+            else:
+                reply["view"] = {"frame": encode_frame(result)}
+    except MemoryError as e:
+        reply["error"] = "Query ran out of memory (per-query limit reached)" + (f": {e}" if str(e) else "")
+    except Exception as e:
+        reply["error"] = str(e)
+    reply["output"] = stdout.getvalue()
+    reply["query_ms"] = (time.perf_counter() - started) * 1000
+    return reply
+
+
+def worker_main(conn, arrow_path: str, cube_path: str, memory_bytes: int):
+    """
+    Worker process: map the dataset and cube once, then run jobs until the
+    pipe closes, each limited to allocating memory_bytes.
+    """
+    base = map_dataset(arrow_path)
+    cube = map_cube(cube_path)
+    limit_data(memory_bytes)
+    conn.send(anon_rss_bytes(os.getpid()))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        reply = run_job(base, cube, job)
+        # Hand the job's freed memory back, so the next job gets the full limit
+        gc.collect()
+        pa.default_memory_pool().release_unused()
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # The pickle fails before anything is written, so the pipe is still usable
+            conn.send({**reply, "error": f"Result could not be returned: {e}", "table": None, "view": None})
+
+
+def cube_builder_main(arrow_path: str, cube_path: str, memory_bytes: int):
+    """One-off process: build the cube from the mapped dataset, allocating at most memory_bytes."""
+    base = map_dataset(arrow_path)
+    limit_data(memory_bytes)
+    prepare_cube(base, arrow_path, cube_path)
+
+
+def build_cube_file(arrow_path: str, cube_path: str, memory_bytes: int):
+    """
+    Build the aggregate cube file in a one-off process (blocking), unless
+    it is up to date, so the build's memory is returned to the OS when the
+    process exits instead of staying in the server's heap.
+
+    Raises:
+        RuntimeError: If the build failed, e.g. by running past memory_bytes
+    """
+    if cube_is_current(arrow_path, cube_path):
+        return
+    process = multiprocessing.get_context("spawn").Process(
+        target=cube_builder_main, args=(arrow_path, cube_path, memory_bytes), daemon=True
+    )
+    # Spawned with the workers' allocator settings, so RLIMIT_DATA tracks what the build holds
+    with worker_environment():
+        process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Building the aggregate cube failed (exit code {process.exitcode})")
+
+
+class Worker:
+    def __init__(self, context, arrow_path: str, cube_path: str, memory_bytes: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=worker_main, args=(child_conn, arrow_path, cube_path, memory_bytes), daemon=True
+        )
+        with worker_environment():
+            self.process.start()
+        child_conn.close()
+        # Memory in use once the dataset is mapped; jobs are limited to growth beyond it
+        self.baseline_bytes = self.conn.recv() or 0
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class CodeRunner:
+    """
+    Pool of worker processes executing generated code, one job per worker
+    at a time. Jobs wait for a free worker; throughput scales with workers.
+    """
+
+    def __init__(self, arrow_path: str, cube_path: str, workers: int, timeout_seconds: float, memory_bytes: int):
+        self.arrow_path = arrow_path
+        self.cube_path = cube_path
+        self.workers = workers
+        self.timeout_seconds = timeout_seconds
+        self.memory_bytes = memory_bytes
+        # Spawned, not forked: the server process holds threads and sockets
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = None
+        self._all = []
+
+    def start(self):
+        """Start the workers (blocking; each maps the dataset before it is ready)."""
+        self._idle = asyncio.Queue()
+        for _ in range(self.workers):
+            self._add(Worker(self._context, self.arrow_path, self.cube_path, self.memory_bytes))
+
+    def _add(self, worker: Worker):
+        self._all.append(worker)
+        self._idle.put_nowait(worker)
+
+    async def _spawn(self) -> Worker:
+        """
+        A new worker for a pool slot. If it cannot be started, the slot goes
+        back to the idle queue empty (None), so the pool never shrinks: the
+        next job to take the slot tries again.
+        """
+        try:
+            worker = await asyncio.to_thread(Worker, self._context, self.arrow_path, self.cube_path, self.memory_bytes)
+        except BaseException:
+            self._idle.put_nowait(None)
+            raise
+        self._all.append(worker)
+        return worker
+
+    async def _replace(self, worker: Worker):
+        self._all.remove(worker)
+        await asyncio.to_thread(worker.kill)
+        self._idle.put_nowait(await self._spawn())
+
+    async def run(self, job: dict) -> dict:
+        """
+        Run a job on the next free worker.
+
+        Raises:
+            CodeLimitExceeded: If the job ran past the time or memory limit;
+                its worker is replaced
+            Exception: If no worker could be started for the job, or to
+                replace the job's worker
+        """
+        worker = await self._idle.get()
+        if worker is None:
+            worker = await self._spawn()
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        try:
+            await asyncio.to_thread(worker.conn.send, job)
+            loop.add_reader(worker.conn.fileno(), ready.set)
+            deadline = time.monotonic() + self.timeout_seconds
+            while not ready.is_set():
+                try:
+                    await asyncio.wait_for(ready.wait(), WATCH_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                if ready.is_set():
+                    break
+                # Backstop for memory kept across jobs, or where RLIMIT_DATA is unavailable
+                used = (anon_rss_bytes(worker.process.pid) or 0) - worker.baseline_bytes
+                if used > self.memory_bytes:
+                    raise CodeLimitExceeded(f"Query used more than {self.memory_bytes // 2**20} MB of memory")
+                if time.monotonic() > deadline:
+                    raise CodeLimitExceeded(f"Query took longer than {self.timeout_seconds:g} s")
+            loop.remove_reader(worker.conn.fileno())
+            reply = await asyncio.to_thread(worker.conn.recv)
+        except (CodeLimitExceeded, EOFError, OSError) as e:
+            loop.remove_reader(worker.conn.fileno())
+            await self._replace(worker)
+            if isinstance(e, CodeLimitExceeded):
+                raise
+            raise CodeLimitExceeded(f"Query worker stopped unexpectedly: {e!r}") from e
+        except BaseException:
+            # Cancelled mid-job: the worker's reply would be read by the next job
+            loop.remove_reader(worker.conn.fileno())
+            await asyncio.shield(self._replace(worker))
+            raise
+        self._idle.put_nowait(worker)
+        return reply
+
+    def close(self):
+        for worker in self._all:
+            worker.kill()
+        self._all = []
@@ -0,0 +1,86 @@
+"""
+Concurrent load test for the streaming chat endpoint.
+
+Runs against a backend pointed at the stub LLM (see stub_llm.py), so it
+measures the backend itself rather than the model:
+
+    STUB_LLM_LATENCY_MS=500 STUB_LLM_TOKEN_MS=20 uvicorn stub_llm:app --port 8001
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8001 ANTHROPIC_API_KEY=stub uvicorn backend:app
+    python load_test.py --sessions 20 --messages 3
+
+Reports time to first response token and time to the full answer.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+QUESTIONS = [
+    "Top merchants by spend",
+    "Credit vs debit split",
+    "Spend by category",
+    "Transactions over 100",
+]
+
+
+async def ask(client: httpx.AsyncClient, message: str, session_id: str) -> tuple:
+    """Send one message; returns (session ID, seconds to first token, seconds to done)."""
+    started = time.perf_counter()
+    first_token = None
+    event = None
+    async with client.stream("POST", "/api/chat/stream", json={"message": message, "session_id": session_id}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = json.loads(line[6:])
+                if event == "meta":
+                    session_id = data["session_id"]
+                elif event == "delta" and first_token is None:
+                    first_token = time.perf_counter() - started
+                elif event == "error":
+                    raise RuntimeError(data["detail"])
+    return session_id, first_token, time.perf_counter() - started
+
+
+async def run_session(client: httpx.AsyncClient, index: int, messages: int, timings: list):
+    session_id = None
+    for turn in range(messages):
+        question = QUESTIONS[(index + turn) % len(QUESTIONS)]
+        session_id, first_token, total = await ask(client, question, session_id)
+        timings.append((first_token, total))
+
+
+def percentiles(values: list) -> str:
+    values = sorted(values)
+    p50 = statistics.median(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return f"p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, max {values[-1] * 1000:.0f} ms"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Backend base URL")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent chat sessions")
+    parser.add_argument("--messages", type=int, default=3, help="Messages sent per session")
+    args = parser.parse_args()
+
+    timings = []
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=args.url, timeout=300) as client:
+        await asyncio.gather(*(run_session(client, i, args.messages, timings) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+
+    print(f"{len(timings)} messages from {args.sessions} sessions in {elapsed:.1f} s "
+          f"({len(timings) / elapsed:.1f} messages/s)")
+    print(f"  First token: {percentiles([first for first, _ in timings])}")
+    print(f"  Full answer: {percentiles([total for _, total in timings])}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Result cache for chatbot answers.
+
+Answers are keyed by the normalized question and a digest of the data the
+question ran against. New questions run on the full data and are shared
+across conversations; follow-ups are also keyed by the conversation they
+were asked in, since "what about last month?" means different things in
+different chats. A repeated question reuses the generated code, its result
+and the response text without calling the LLM or re-running the code.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+# Words that do not change what a question asks for
+FILLER_WORDS = {
+    'a', 'an', 'the', 'please', 'can', 'could', 'would', 'you', 'me', 'us',
+    'show', 'give', 'tell', 'list', 'display', 'what', 'whats', 'are', 'is'
+}
+
+
+def normalize_question(question: str) -> str:
+    """'Show me the Top merchants by spend?' -> 'top merchants by spend'"""
+    words = re.sub(r"[^a-z0-9%£$.\s]+", " ", question.lower()).split()
+    words = [word.strip('.') for word in words]
+    return " ".join(word for word in words if word and word not in FILLER_WORDS)
+
+
+@dataclass
+class CachedAnswer:
+    code: str
+    response: str
+    table: Optional[list]
+    view: object  # Session view the answer leaves behind
+    nbytes: int
+
+
+class ResultCache:
+    """
+    Bounded in-memory cache of chatbot answers.
+
+    Entries are evicted least recently used first once their combined size
+    exceeds max_bytes, and expire ttl_seconds after they were stored (the
+    dataset does not change, but answers should not live forever). Safe to
+    share between threads.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (answer, stored_at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(question: str, data_digest: str, history: str = "") -> str:
+        return hashlib.sha256(
+            f"{normalize_question(question)}\0{data_digest}\0{history}".encode()
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedAnswer]:
+        """Return the cached answer and mark it recently used, or None."""
+        with self._lock:
+            self._expire()
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key: str, answer: CachedAnswer):
+        """Store an answer, evicting old entries to stay within max_bytes."""
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[0].nbytes
+            self._entries[key] = (answer, time.monotonic())
+            self.total_bytes += answer.nbytes
+            self._expire()
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def _expire(self):
+        """Drop entries stored more than ttl_seconds ago."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        for key in [key for key, (_, stored_at) in self._entries.items() if stored_at < cutoff]:
+            self.total_bytes -= self._entries.pop(key)[0].nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
@@ -0,0 +1,101 @@
+"""
+Stand-in for the Anthropic Messages API, for testing the chatbot locally.
+
+Answers the backend's routing, code and response prompts with canned text
+and counts the calls it receives, so caching and load behaviour can be
+checked without an API key or network access (streaming included):
+
+    uvicorn stub_llm:app --port 8001
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8001 ANTHROPIC_API_KEY=stub uvicorn backend:app
+
+GET /stats returns the number of calls per prompt kind.
+"""
+
+import asyncio
+import json
+import os
+import re
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="Stub LLM")
+
+# Simulated model latency per call (before the first token) and between streamed tokens
+LATENCY_SECONDS = float(os.environ.get("STUB_LLM_LATENCY_MS", "0")) / 1000
+TOKEN_SECONDS = float(os.environ.get("STUB_LLM_TOKEN_MS", "0")) / 1000
+
+# Question keyword -> pandas code returned for it; the first match wins
+CANNED_CODE = [
+    ("credit", "result = df.groupby('credit_debit', observed=True)['amount'].agg(['count', 'sum'])"),
+    ("merchant", "result = df.groupby('primary_merchant', observed=True)['amount'].sum().sort_values(ascending=False).head(20)"),
+    ("categor", "result = cube.groupby('transaction_classification_0', observed=True)['total_amount'].sum().sort_values(ascending=False).head(20)"),
+    ("customers", "result = distinct_customers(cube, by='credit_debit')"),
+    ("over", "result = df[df['amount'] > 100]"),
+]
+DEFAULT_CODE = "result = df.head(20)"
+
+calls = Counter()
+
+
+def reply(prompt: str) -> tuple:
+    """(prompt kind, canned reply text) for one of the backend's prompts."""
+    if "REFINE or NEW" in prompt:
+        question = re.search(r"User's new question: (.*)", prompt).group(1).lower()
+        refine = any(word in question for word in ("only", "remove", "filter", "take off"))
+        return "routing", "REFINE" if refine else "NEW"
+    if "Write ONLY Python code" in prompt:
+        question = re.search(r"User's question: (.*)", prompt).group(1).lower()
+        code = next((code for keyword, code in CANNED_CODE if keyword in question), DEFAULT_CODE)
+        return "code", code
+    preview = re.search(r"exact numbers\):\n(.*?)\n\n", prompt, re.S)
+    summary = preview.group(1).splitlines()[0] if preview else "the result"
+    return "response", f"Based on the data, here is {summary}."
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps({'type': event, **data})}\n\n"
+
+
+async def stream_events(message: dict, text: str):
+    """The Messages API streaming events for a reply, one word per delta."""
+    yield sse("message_start", {"message": {**message, "content": [], "stop_reason": None}})
+    yield sse("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+    for token in re.findall(r"\S+\s*", text):
+        yield sse("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": token}})
+        if TOKEN_SECONDS:
+            await asyncio.sleep(TOKEN_SECONDS)
+    yield sse("content_block_stop", {"index": 0})
+    yield sse("message_delta", {
+        "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+        "usage": {"output_tokens": message["usage"]["output_tokens"]}
+    })
+    yield sse("message_stop", {})
+
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    body = await request.json()
+    kind, text = reply(body["messages"][-1]["content"])
+    calls[kind] += 1
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+    message = {
+        "id": f"msg_stub_{sum(calls.values())}",
+        "type": "message",
+        "role": "assistant",
+        "model": body["model"],
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": len(body["messages"][-1]["content"]) // 4, "output_tokens": len(text) // 4}
+    }
+    if body.get("stream"):
+        return StreamingResponse(stream_events(message, text), media_type="text/event-stream")
+    return message
+
+
+@app.get("/stats")
+async def stats():
+    return dict(calls)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The chatbot is deployed from its own directory, so its modules import from there
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import backend
+from aggregate_cube import CUSTOMER_SET_COL
+from code_runner import build_cube_file, map_cube
+
+MEMORY_BYTES = backend.CODE_MEMORY_MB * 1024 * 1024
+
+
+def synthetic_transactions(rows: int, customers: int, seed: int = 0) -> pd.DataFrame:
+    """Transactions shaped like the bundled dataset: ~850 customers over a year of many merchants."""
+    rng = np.random.default_rng(seed)
+    categories = rng.integers(0, 20, rows)
+    timestamps = pd.Timestamp('2024-01-01', tz='UTC') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')
+    return pd.DataFrame({
+        'primary_merchant': [f"MERCHANT_{m}" for m in rng.zipf(1.3, rows) % 2000],
+        'transaction_classification_0': [f"Category {c}" for c in categories],
+        'transaction_classification_1': [f"Subcategory {c}.{s}" for c, s in zip(categories, rng.integers(0, 4, rows))],
+        'customer_id': [f"c{c}" for c in rng.integers(0, customers, rows)],
+        'account_id': [f"a{c}" for c in rng.integers(0, customers, rows)],
+        'date': timestamps.strftime('%Y-%m-%d'),
+        'amount': rng.uniform(1, 200, rows).round(2),
+        'credit_debit': rng.choice(['credit', 'debit'], rows, p=[0.1, 0.9]),
+        'timestamp': timestamps
+    })
+
+
+def test_cube_customer_counts_are_exact_and_compact(tmp_path):
+    parquet_path, arrow_path, cube_path = (
+        str(tmp_path / name) for name in ("data.parquet", "data.arrow", "data.cube.arrow")
+    )
+    transactions = synthetic_transactions(200_000, 850)
+    transactions.to_parquet(parquet_path, index=False)
+    backend.prepare_arrow(parquet_path, arrow_path)
+
+    # The build process runs under RLIMIT_DATA; going past it fails the build
+    build_cube_file(arrow_path, cube_path, MEMORY_BYTES)
+    cube, distinct_customers = map_cube(cube_path)
+
+    assert cube['transactions'].sum() == len(transactions)
+    assert distinct_customers(cube) == transactions['customer_id'].nunique()
+    transactions['month'] = transactions['timestamp'].dt.strftime('%Y-%m')
+    for by in ['credit_debit', ['transaction_classification_0', 'month']]:
+        expected = transactions.groupby(by)['customer_id'].nunique()
+        assert distinct_customers(cube, by=by).to_dict() == expected.to_dict()
+
+    # A filtered selection, as generated code passes it
+    groceries = cube[cube['transaction_classification_0'] == 'Category 3']
+    expected = transactions[transactions['transaction_classification_0'] == 'Category 3']
+    assert distinct_customers(groceries) == expected['customer_id'].nunique()
+    assert distinct_customers(groceries, by='month').to_dict() == expected.groupby('month')['customer_id'].nunique().to_dict()
+    assert distinct_customers(cube.iloc[:0]) == 0
+
+    # Sets take 4 bytes per (cell, customer) pair plus one offset per cell, never more than the rows
+    sets = pa.ipc.open_file(pa.memory_map(cube_path)).read_all().column(CUSTOMER_SET_COL)
+    assert sets.nbytes <= 4 * (cube['customers'].sum() + len(cube) + 1)
+    assert cube['customers'].sum() <= len(transactions)
+
+
+@pytest.mark.skipif(not os.path.exists(backend.DATA_PATH), reason="bundled dataset not present")
+def test_cube_builds_within_query_memory_limit_on_bundled_dataset(tmp_path):
+    arrow_path = str(tmp_path / "data.arrow")
+    cube_path = str(tmp_path / "data.cube.arrow")
+    backend.prepare_arrow(backend.DATA_PATH, arrow_path)
+
+    # The build process runs under RLIMIT_DATA; going past it fails the build
+    build_cube_file(arrow_path, cube_path, MEMORY_BYTES)
+
+    cube, distinct_customers = map_cube(cube_path)
+    assert cube['transactions'].sum() == len(backend.map_dataset(arrow_path))
+    assert distinct_customers(cube) > 0
@@ -0,0 +1,114 @@
+import asyncio
+import socket
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+import uvicorn
+
+import backend
+import stub_llm
+from code_runner import CodeRunner, build_cube_file, map_cube, map_dataset
+from result_cache import ResultCache
+
+MEMORY_BYTES = 192 * 1024 * 1024
+
+
+def transactions(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    timestamps = pd.Timestamp('2024-01-01', tz='UTC') + pd.to_timedelta(rng.integers(0, 90 * 86400, rows), unit='s')
+    customers = [f"c{i}" for i in rng.integers(0, 20, rows)]
+    return pd.DataFrame({
+        'primary_merchant': rng.choice(['TESCO_GENERAL', 'AMAZON_MARKETPLACE', 'DELIVEROO'], rows),
+        'transaction_classification_0': rng.choice(['Groceries', 'Shopping', 'Food & Dining'], rows),
+        'transaction_classification_1': rng.choice(['Supermarkets', 'Online'], rows),
+        'customer_id': customers,
+        'account_id': [f"{c}_acc" for c in customers],
+        'date': timestamps.strftime('%Y-%m-%d'),
+        'amount': rng.uniform(1, 200, rows).round(2),
+        'credit_debit': rng.choice(['credit', 'debit'], rows),
+        'timestamp': timestamps
+    })
+
+
+@pytest.fixture
+def stub_llm_url(monkeypatch):
+    """Serve the stub LLM on a local port and point the backend's client at it."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(stub_llm.app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        thread.join(0.01)
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", url)
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "stub")
+    yield url
+    server.should_exit = True
+    thread.join()
+
+
+async def ask(session_id, message: str) -> backend.ChatResponse:
+    return await backend.chat(backend.ChatRequest(message=message, session_id=session_id))
+
+
+async def conversation(data_dir, sessions: list) -> tuple:
+    """Ask each session's questions in turn; LLM calls so far after each session."""
+    parquet_path, arrow_path, cube_path = (
+        str(data_dir / name) for name in ("data.parquet", "data.arrow", "data.cube.arrow")
+    )
+    transactions(500).to_parquet(parquet_path, index=False)
+    backend.prepare_arrow(parquet_path, arrow_path)
+    build_cube_file(arrow_path, cube_path, MEMORY_BYTES)
+    backend.df_original = map_dataset(arrow_path)
+    backend.cube_rows = len(map_cube(cube_path)[0])
+    backend.code_runner = CodeRunner(arrow_path, cube_path, 1, 30, MEMORY_BYTES)
+    await asyncio.to_thread(backend.code_runner.start)
+    backend.answer_cache = ResultCache(backend.answer_cache.max_bytes, backend.answer_cache.ttl_seconds)
+    stub_llm.calls.clear()
+
+    try:
+        calls, answers = [], []
+        for questions in sessions:
+            session_id, session_answers = None, []
+            for question in questions:
+                session_answers.append(await ask(session_id, question))
+                session_id = session_answers[-1].session_id
+            answers.append(session_answers)
+            calls.append(dict(stub_llm.calls))
+        return calls, answers
+    finally:
+        backend.code_runner.close()
+        await backend.llm_client.close()
+        backend.llm_client = None
+
+
+def test_repeated_follow_up_makes_no_llm_calls(tmp_path, stub_llm_url):
+    calls, answers = asyncio.run(conversation(tmp_path, [["top merchant by spend", "credit vs debit totals"]] * 2))
+
+    # The first session routes the follow-up, writes code and words both answers
+    assert calls[0] == {"code": 2, "response": 2, "routing": 1}
+    # The second asks the same things in the same context: all answers come from the cache
+    assert calls[1] == calls[0]
+    (first, follow_up), (first_again, follow_up_again) = answers
+    assert first_again.cached and follow_up_again.cached
+    assert follow_up_again.response == follow_up.response
+    assert follow_up_again.table == follow_up.table
+
+
+def test_new_question_hits_across_sessions_after_other_turns(tmp_path, stub_llm_url):
+    calls, answers = asyncio.run(conversation(tmp_path, [
+        ["top merchant by spend", "credit vs debit totals"],
+        ["transactions over 100", "credit vs debit totals"]
+    ]))
+
+    # The second session's opening question is answered in full; its follow-up is answered
+    # from the first session's, despite the different history, without a routing call
+    assert calls[0] == {"code": 2, "response": 2, "routing": 1}
+    assert calls[1] == {"code": 3, "response": 3, "routing": 1}
+    (_, follow_up), (_, other_follow_up) = answers
+    assert other_follow_up.cached
+    assert other_follow_up.response == follow_up.response
+    assert other_follow_up.table == follow_up.table
@@ -0,0 +1,43 @@
+import asyncio
+
+import backend
+
+
+def test_chat_releases_session_lock_on_return(monkeypatch):
+    lock = asyncio.Lock()
+
+    async def chat_events(request):
+        async with lock:
+            yield 'meta', {"session_id": "s1", "table": None, "query_ms": None, "cached": False}
+            yield 'done', {"response": "answer"}
+            yield 'done', {"response": "never reached"}
+
+    monkeypatch.setattr(backend, "chat_events", chat_events)
+    monkeypatch.setattr(backend, "check_ready", lambda: None)
+
+    async def ask():
+        response = await backend.chat(backend.ChatRequest(message="hi"))
+        return response, lock.locked()
+
+    response, locked = asyncio.run(ask())
+
+    assert response.response == "answer"
+    assert not locked
+
+
+def test_chat_stream_reports_unexpected_errors_as_error_events(monkeypatch):
+    async def chat_events(request):
+        yield 'meta', {"session_id": "s1", "table": None, "query_ms": None, "cached": False}
+        raise RuntimeError("Query workers are gone")
+
+    monkeypatch.setattr(backend, "chat_events", chat_events)
+    monkeypatch.setattr(backend, "check_ready", lambda: None)
+
+    async def stream():
+        response = await backend.chat_stream(backend.ChatRequest(message="hi"))
+        return [chunk async for chunk in response.body_iterator]
+
+    chunks = asyncio.run(stream())
+
+    assert chunks[0].startswith("event: meta\n")
+    assert chunks[-1] == 'event: error\ndata: {"detail": "Internal error: Query workers are gone"}\n\n'
@@ -0,0 +1,85 @@
+import asyncio
+import os
+
+import pandas as pd
+import pytest
+
+import backend
+import code_runner
+from code_runner import WORKER_ENV, CodeRunner, build_cube_file
+
+MEMORY_BYTES = 192 * 1024 * 1024
+
+
+def prepare_data(data_dir) -> tuple:
+    """A two-row dataset and its cube; returns (arrow path, cube path)."""
+    parquet_path, arrow_path, cube_path = (
+        str(data_dir / name) for name in ("data.parquet", "data.arrow", "data.cube.arrow")
+    )
+    pd.DataFrame({
+        'primary_merchant': ['TESCO_GENERAL', 'DELIVEROO'],
+        'transaction_classification_0': ['Groceries', 'Food & Dining'],
+        'transaction_classification_1': ['Supermarkets', 'Delivery'],
+        'customer_id': ['c1', 'c2'],
+        'account_id': ['a1', 'a2'],
+        'date': ['2024-01-01', '2024-01-02'],
+        'amount': [12.5, 20.0],
+        'credit_debit': ['debit', 'debit'],
+        'timestamp': pd.to_datetime(['2024-01-01', '2024-01-02'], utc=True)
+    }).to_parquet(parquet_path, index=False)
+    backend.prepare_arrow(parquet_path, arrow_path)
+    build_cube_file(arrow_path, cube_path, MEMORY_BYTES)
+    return arrow_path, cube_path
+
+
+def job(code: str) -> dict:
+    return {"code": code, "rows": None, "columns": None, "frame": None, "cube": False}
+
+
+def test_workers_get_allocator_settings_without_changing_server_environment(tmp_path, monkeypatch):
+    for name in WORKER_ENV:
+        monkeypatch.delenv(name, raising=False)
+    arrow_path, cube_path = prepare_data(tmp_path)
+
+    runner = CodeRunner(arrow_path, cube_path, 1, 30, MEMORY_BYTES)
+    runner.start()
+    try:
+        code = f"import os\nresult = {{name: os.environ.get(name) for name in {list(WORKER_ENV)!r}}}"
+        reply = asyncio.run(runner.run(job(code)))
+    finally:
+        runner.close()
+
+    assert reply["error"] is None
+    assert reply["preview"] == str(WORKER_ENV)
+    assert all(name not in os.environ for name in WORKER_ENV)
+
+
+def test_pool_keeps_its_slot_when_a_replacement_worker_fails_to_start(tmp_path, monkeypatch):
+    arrow_path, cube_path = prepare_data(tmp_path)
+    runner = CodeRunner(arrow_path, cube_path, 1, 1, MEMORY_BYTES)
+    runner.start()
+    spawn = code_runner.Worker
+
+    def fail_to_spawn(*args):
+        raise OSError("Cannot allocate memory")
+
+    async def requests():
+        # The timed-out worker is killed and its replacement fails: the caller sees why
+        monkeypatch.setattr(code_runner, "Worker", fail_to_spawn)
+        with pytest.raises(OSError):
+            await runner.run(job("while True: pass"))
+        # The next job takes the empty slot, whose spawn fails again
+        with pytest.raises(OSError):
+            await asyncio.wait_for(runner.run(job("result = 1")), 10)
+
+        # Once workers can start again, the slot is filled instead of every job waiting forever
+        monkeypatch.setattr(code_runner, "Worker", spawn)
+        return await asyncio.wait_for(runner.run(job("result = len(df)")), 30)
+
+    try:
+        reply = asyncio.run(requests())
+    finally:
+        runner.close()
+
+    assert reply["error"] is None
+    assert reply["preview"] == "2"
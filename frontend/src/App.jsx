@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import ScatterPlot3D from './ScatterPlot3D'
 import Recommendations from './Recommendations'
 import GapAnalysis from './GapAnalysis'
@@ -23,6 +23,7 @@ function App() {
   const [incomeData, setIncomeData] = useState(null)
   const [incomeMerchantData, setIncomeMerchantData] = useState(null)
   const [selectedIncomeBracket, setSelectedIncomeBracket] = useState(null)
+  const shardIndexRef = useRef(null)
 
   const handlePasswordSubmit = (e) => {
     e.preventDefault()
@@ -67,20 +68,37 @@ function App() {
     }
   }
 
+  // Small index of the per-classification merchant shards, fetched on first drill-down
+  const fetchShardIndex = async () => {
+    if (!shardIndexRef.current) {
+      const response = await fetch('/data/merchant_shards.json')
+      if (!response.ok) {
+        throw new Error('Failed to fetch merchant index')
+      }
+      shardIndexRef.current = await response.json()
+    }
+    return shardIndexRef.current
+  }
+
+  const fetchShard = async (shard) => {
+    const response = await fetch(`/data/${shard.file}`)
+    if (!response.ok) {
+      throw new Error('Failed to fetch merchant data')
+    }
+    return response.json()
+  }
+
   const fetchMerchantData = async (classification) => {
     setMerchantLoading(true)
     setError(null)
 
     try {
-      const response = await fetch('/data/merchants.json')
-      if (!response.ok) {
-        throw new Error('Failed to fetch merchant data')
-      }
-      const allMerchants = await response.json()
-      const data = allMerchants[classification]
-      if (!data) {
+      const shardIndex = await fetchShardIndex()
+      const shard = shardIndex.merchants[classification]
+      if (!shard) {
         throw new Error(`No merchants found for: ${classification}`)
       }
+      const data = await fetchShard(shard)
       setMerchantData(data)
     } catch (err) {
       setError(err.message)
@@ -94,15 +112,12 @@ function App() {
     setError(null)
 
     try {
-      const response = await fetch('/data/merchants_by_income.json')
-      if (!response.ok) {
-        throw new Error('Failed to fetch income merchant data')
-      }
-      const allData = await response.json()
-      const data = allData[incomeBracket]?.[classification]
-      if (!data) {
+      const shardIndex = await fetchShardIndex()
+      const shard = shardIndex.merchants_by_income[incomeBracket]?.[classification]
+      if (!shard) {
         throw new Error(`No merchants found for ${classification} in this income bracket`)
       }
+      const data = await fetchShard(shard)
       setIncomeMerchantData(data)
       setSelectedIncomeBracket(incomeBracket)
     } catch (err) {
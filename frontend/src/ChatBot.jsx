@@ -109,6 +109,29 @@ const ALL_SUGGESTIONS = [
   "Which categories have most late-night activity?"
 ]
 
+// Reads a text/event-stream response, calling onEvent(event, data) with each event's JSON data
+async function readEvents(response, onEvent) {
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+  let buffer = ''
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += value
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+      let event = 'message'
+      let data = ''
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7)
+        else if (line.startsWith('data: ')) data += line.slice(6)
+      }
+      if (data) onEvent(event, JSON.parse(data))
+    }
+  }
+}
+
 export default function ChatBot() {
   const [messages, setMessages] = useState([
     {
@@ -119,6 +142,7 @@ export default function ChatBot() {
   ])
   const [input, setInput] = useState('')
   const [loading, setLoading] = useState(false)
+  const [streaming, setStreaming] = useState(false)
   const [sessionId, setSessionId] = useState(null)
   const messagesEndRef = useRef(null)
 
@@ -152,9 +176,9 @@ export default function ChatBot() {
       return
     }
 
-    // Fall back to API call for non-precomputed questions
+    // Fall back to API call for non-precomputed questions; the answer streams in as it is written
     try {
-      const response = await fetch(`${API_URL}/api/chat`, {
+      const response = await fetch(`${API_URL}/api/chat/stream`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -167,18 +191,29 @@ export default function ChatBot() {
         throw new Error('Failed to get response')
       }
 
-      const data = await response.json()
+      let answered = false
+      await readEvents(response, (event, data) => {
+        if (event === 'meta') {
+          // Save session ID for context continuity
+          if (data.session_id) {
+            setSessionId(data.session_id)
+          }
+          answered = true
+          setStreaming(true)
+          setMessages(prev => [...prev, { role: 'assistant', content: '', table: data.table }])
+        } else if (event === 'delta') {
+          setMessages(prev => {
+            const last = prev[prev.length - 1]
+            return [...prev.slice(0, -1), { ...last, content: last.content + data }]
+          })
+        } else if (event === 'error') {
+          throw new Error(data.detail)
+        }
+      })
 
-      // Save session ID for context continuity
-      if (data.session_id) {
-        setSessionId(data.session_id)
+      if (!answered) {
+        throw new Error('Incomplete response')
       }
-
-      setMessages(prev => [...prev, {
-        role: 'assistant',
-        content: data.response,
-        table: data.table
-      }])
     } catch (error) {
       setMessages(prev => [...prev, {
         role: 'assistant',
@@ -188,6 +223,7 @@ export default function ChatBot() {
       }])
     } finally {
       setLoading(false)
+      setStreaming(false)
     }
   }
 
@@ -434,8 +470,8 @@ export default function ChatBot() {
           </div>
         ))}
 
-        {/* Loading Indicator */}
-        {loading && (
+        {/* Loading Indicator (until the answer starts streaming) */}
+        {loading && !streaming && (
           <div style={{
             display: 'flex',
             alignItems: 'center',
@@ -2,7 +2,9 @@ import { useState, useEffect, useMemo } from 'react'
 
 export default function Recommendations() {
   const [classifications, setClassifications] = useState(null)
-  const [merchants, setMerchants] = useState(null)
+  const [shardIndex, setShardIndex] = useState(null)
+  // Classification -> merchant shard, fetched once its classification passes threshold X
+  const [merchants, setMerchants] = useState({})
   const [totalCustomers, setTotalCustomers] = useState(0)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
@@ -18,19 +20,19 @@ export default function Recommendations() {
     setError(null)
 
     try {
-      const [classRes, merchRes, recRes] = await Promise.all([
+      const [classRes, shardRes, recRes] = await Promise.all([
         fetch('/data/classifications.json'),
-        fetch('/data/merchants.json'),
+        fetch('/data/merchant_shards.json'),
         fetch('/data/recommendations.json')
       ])
-      if (!classRes.ok || !merchRes.ok || !recRes.ok) {
+      if (!classRes.ok || !shardRes.ok || !recRes.ok) {
         throw new Error('Failed to load data')
       }
       const classData = await classRes.json()
-      const merchData = await merchRes.json()
+      const shardData = await shardRes.json()
       const recData = await recRes.json()
       setClassifications(classData)
-      setMerchants(merchData)
+      setShardIndex(shardData)
       setTotalCustomers(recData.total_customers)
     } catch (err) {
       setError(err.message)
@@ -39,20 +41,59 @@ export default function Recommendations() {
     }
   }
 
-  const { topClassificationsCount, recommendations } = useMemo(() => {
-    if (!classifications || !merchants || !totalCustomers) {
-      return { topClassificationsCount: 0, recommendations: [] }
+  const topClassifications = useMemo(() => {
+    if (!classifications || !totalCustomers) {
+      return []
     }
 
     const minClassCustomers = totalCustomers * (thresholdX / 100)
 
-    const topClassifications = classifications.labels
+    return classifications.labels
       .map((label, idx) => ({
         name: label,
         customers: classifications.z[idx]
       }))
       .filter(c => c.customers >= minClassCustomers)
+  }, [classifications, totalCustomers, thresholdX])
 
+  // Shards the current thresholds need but that are not loaded yet
+  const missingShards = useMemo(() => {
+    if (!shardIndex) {
+      return []
+    }
+    return topClassifications
+      .map(c => c.name)
+      .filter(name => shardIndex.merchants[name] && !merchants[name])
+  }, [shardIndex, topClassifications, merchants])
+
+  useEffect(() => {
+    if (missingShards.length === 0) return
+    let cancelled = false
+
+    const fetchShards = async () => {
+      try {
+        const loaded = await Promise.all(missingShards.map(async (name) => {
+          const response = await fetch(`/data/${shardIndex.merchants[name].file}`)
+          if (!response.ok) {
+            throw new Error('Failed to fetch merchant data')
+          }
+          return [name, await response.json()]
+        }))
+        if (!cancelled) {
+          setMerchants(prev => ({ ...prev, ...Object.fromEntries(loaded) }))
+        }
+      } catch (err) {
+        if (!cancelled) {
+          setError(err.message)
+        }
+      }
+    }
+    fetchShards()
+
+    return () => { cancelled = true }
+  }, [missingShards, shardIndex])
+
+  const recommendations = useMemo(() => {
     const results = []
     for (const classInfo of topClassifications) {
       const classMerchants = merchants[classInfo.name]
@@ -78,12 +119,11 @@ export default function Recommendations() {
     }
 
     results.sort((a, b) => b.merchant_customers - a.merchant_customers)
+    return results
+  }, [topClassifications, merchants, totalCustomers, thresholdY])
 
-    return {
-      topClassificationsCount: topClassifications.length,
-      recommendations: results
-    }
-  }, [classifications, merchants, totalCustomers, thresholdX, thresholdY])
+  const topClassificationsCount = topClassifications.length
+  const merchantsLoading = missingShards.length > 0
 
   return (
     <div className="recommendations">
@@ -97,7 +137,7 @@ export default function Recommendations() {
 
         {error && <div className="error">{error}</div>}
 
-        {classifications && merchants && !loading && (
+        {classifications && shardIndex && !loading && (
           <>
             <div className="threshold-info" style={{ display: 'flex', gap: '40px', marginBottom: '30px', padding: '20px', background: '#f8fafc', borderRadius: '12px' }}>
               <div style={{ flex: 1 }}>
@@ -163,7 +203,14 @@ export default function Recommendations() {
               </table>
             </div>
 
-            {recommendations.length === 0 && (
+            {merchantsLoading && (
+              <div className="loading-container">
+                <div className="spinner"></div>
+                <p>Loading merchants...</p>
+              </div>
+            )}
+
+            {!merchantsLoading && recommendations.length === 0 && (
               <div className="no-results">
                 <p>No merchants match the current thresholds.</p>
               </div>
@@ -0,0 +1,151 @@
+import pandas as pd
+
+from compact import decode_labels
+
+CLASSIFICATION_COL = 'transaction_classification_0'
+MERCHANT_COL = 'primary_merchant'
+CUSTOMER_COL = 'customer_id'
+
+STAT_KEYS = [CLASSIFICATION_COL, MERCHANT_COL, CUSTOMER_COL]
+
+# A customer is "active" in a group once they reach this many transactions
+ACTIVE_TXN_THRESHOLD = 10
+
+
+def build_customer_merchant_stats(cleaned: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build the finest-grain (classification, merchant, customer) table.
+
+    This is the only pass over the transaction rows; every coarser summary
+    is derived from it.
+
+    Missing keys are kept as their own groups so customer totals still see
+    every row; they are dropped again before the summaries are built.
+
+    Returns:
+        DataFrame with one row per (classification, merchant, customer) and
+        columns txn_rows, txn_count, total_amount
+    """
+    return cleaned.groupby(STAT_KEYS, observed=True, dropna=False).agg(
+        txn_rows=('amount', 'size'),
+        txn_count=('amount', 'count'),
+        total_amount=('amount', 'sum')
+    ).reset_index()
+
+
+def merge_stats(partials: list) -> pd.DataFrame:
+    """Merge finest-grain partials built from separate batches of rows."""
+    return pd.concat(partials, ignore_index=True).groupby(
+        STAT_KEYS, observed=True, dropna=False
+    ).agg(
+        txn_rows=('txn_rows', 'sum'),
+        txn_count=('txn_count', 'sum'),
+        total_amount=('total_amount', 'sum')
+    ).reset_index()
+
+
+def stream_customer_merchant_stats(batches) -> pd.DataFrame:
+    """
+    Build the finest-grain table from an iterable of cleaned row batches.
+
+    Each batch is reduced to count/sum partials straight away; partials are
+    merged once they outgrow the running total, so memory is bounded by the
+    batch size plus the number of distinct (classification, merchant,
+    customer) keys.
+    """
+    merged = None
+    pending = []
+    pending_rows = 0
+    for batch in batches:
+        partial = build_customer_merchant_stats(batch)
+        pending.append(partial)
+        pending_rows += len(partial)
+        if merged is None or pending_rows >= len(merged):
+            merged = merge_stats(([] if merged is None else [merged]) + pending)
+            pending, pending_rows = [], 0
+
+    if merged is None:
+        return build_customer_merchant_stats(pd.DataFrame(columns=STAT_KEYS + ['amount']))
+    if pending:
+        merged = merge_stats([merged] + pending)
+    return merged
+
+
+def rollup(stats: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """Re-aggregate per-customer count/sum partials to a coarser set of keys."""
+    return stats.groupby(keys, observed=True, sort=False).agg(
+        txn_count=('txn_count', 'sum'),
+        total_amount=('total_amount', 'sum')
+    ).reset_index()
+
+
+def summarize(customer_stats: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """
+    Summarise per-customer stats into medians and 10+ transaction counts.
+
+    The 10+ count is a plain sum over a boolean column, so the whole
+    reduction stays vectorized (no per-group Python callbacks). Group keys
+    may be dictionary-coded; the (small) result carries plain labels.
+    """
+    active = (customer_stats['txn_count'] >= ACTIVE_TXN_THRESHOLD).astype('int64')
+    summary = customer_stats.assign(is_active=active).groupby(keys, observed=True).agg(
+        median_txn_per_customer=('txn_count', 'median'),
+        median_amount_per_customer=('total_amount', 'median'),
+        customers_with_10plus_txn=('is_active', 'sum')
+    ).reset_index()
+    return decode_labels(summary)
+
+
+def summarize_stats(merchant_customer_stats: pd.DataFrame) -> tuple:
+    """
+    Derive every summary from the finest-grain customer stats.
+
+    Returns:
+        Tuple of (classification summary, merchant summary,
+        number of customers with 10+ transactions overall)
+    """
+    stats = merchant_customer_stats
+    customer_totals = stats.groupby(CUSTOMER_COL, observed=True)['txn_rows'].sum()
+    total_cust_10plus = int((customer_totals >= ACTIVE_TXN_THRESHOLD).sum())
+
+    class_customer_stats = rollup(
+        stats.dropna(subset=[CLASSIFICATION_COL, CUSTOMER_COL]),
+        [CLASSIFICATION_COL, CUSTOMER_COL]
+    )
+    classification_summary = summarize(class_customer_stats, [CLASSIFICATION_COL])
+    merchant_summary = summarize(
+        stats.dropna(subset=[CLASSIFICATION_COL, MERCHANT_COL, CUSTOMER_COL]),
+        [CLASSIFICATION_COL, MERCHANT_COL]
+    )
+
+    return classification_summary, merchant_summary, total_cust_10plus
+
+
+def drop_multi_category(stats: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drop multi-category classifications (containing "|") from aggregated stats.
+
+    Equivalent to filtering the rows first, since the classification is a
+    group key, but touches one row per group instead of one per transaction.
+    """
+    multi = stats[CLASSIFICATION_COL].str.contains('|', regex=False, na=False)
+    return stats[~multi.to_numpy(dtype=bool)]
+
+
+def aggregate(cleaned: pd.DataFrame, multi_category: bool = True) -> tuple:
+    """
+    Build classification and merchant summaries from cleaned transactions.
+
+    Args:
+        cleaned: Cleaned transactions
+        multi_category: Whether multi-category classifications still present
+            in `cleaned` are kept; pass False to exclude them from the summaries
+
+    Returns:
+        Tuple of (classification summary, merchant summary,
+        number of customers with 10+ transactions overall)
+    """
+    stats = build_customer_merchant_stats(cleaned)
+    if not multi_category:
+        stats = drop_multi_category(stats)
+    return summarize_stats(stats)
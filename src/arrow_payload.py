@@ -0,0 +1,80 @@
+import json
+
+import pandas as pd
+import pyarrow as pa
+
+from aggregation import CLASSIFICATION_COL, MERCHANT_COL
+from compressed_payload import header_qualities
+from merchant_index import AXIS_LABELS
+
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+
+# Summary columns behind the graph payloads' x / y / z arrays
+AXIS_COLUMNS = {
+    'median_txn_per_customer': 'x',
+    'median_amount_per_customer': 'y',
+    'customers_with_10plus_txn': 'z'
+}
+
+
+def wants_arrow(accept: str) -> bool:
+    """
+    Whether an Accept header prefers an Arrow IPC stream over JSON.
+
+    JSON stays the default: Arrow is chosen only when it is listed
+    explicitly and ranked at least as high as application/json.
+    """
+    qualities = header_qualities(accept)
+    arrow_q = qualities.get(ARROW_STREAM_TYPE, 0.0)
+    return arrow_q > 0 and arrow_q >= qualities.get('application/json', 0.0)
+
+
+def ipc_stream(table: pa.Table) -> bytes:
+    """Serialize a table as an Arrow IPC stream."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def with_metadata(table: pa.Table, metadata: dict) -> pa.Table:
+    """Attach JSON-encoded scalar fields (the JSON payload's non-array keys) to the schema."""
+    return table.replace_schema_metadata({key: json.dumps(value) for key, value in metadata.items()})
+
+
+def summary_stream(summary: pd.DataFrame, label_col: str, metadata: dict) -> bytes:
+    """Arrow stream of a summary's labels / x / y / z columns, converted column-wise."""
+    columns = {label_col: 'labels', **AXIS_COLUMNS}
+    table = pa.Table.from_pandas(summary[list(columns)].rename(columns=columns), preserve_index=False)
+    return ipc_stream(with_metadata(table, metadata))
+
+
+def classification_stream(classification_summary: pd.DataFrame) -> bytes:
+    """Arrow counterpart of the /api/data payload."""
+    return summary_stream(classification_summary, CLASSIFICATION_COL, {"axis_labels": AXIS_LABELS})
+
+
+def merchant_streams(merchant_summary: pd.DataFrame) -> dict:
+    """Arrow counterpart of build_merchant_index: classification -> IPC stream."""
+    return {
+        classification: summary_stream(
+            group, MERCHANT_COL, {"classification": classification, "axis_labels": AXIS_LABELS}
+        )
+        for classification, group in merchant_summary.groupby(CLASSIFICATION_COL, sort=True)
+    }
+
+
+def recommendation_stream(index, x: float, y: float) -> bytes:
+    """Arrow counterpart of RecommendationIndex.query, built from its result arrays."""
+    n_classes, columns = index.select(x, y)
+    # Label columns are typed explicitly so an empty result keeps the schema
+    table = pa.table({
+        name: pa.array(values, type=pa.string() if values.dtype == object else None)
+        for name, values in columns.items()
+    })
+    return ipc_stream(with_metadata(table, {
+        "total_customers": int(index.total_customers),
+        "threshold_x": x,
+        "threshold_y": y,
+        "top_classifications_count": n_classes
+    }))
@@ -0,0 +1,162 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+# Bump whenever aggregation or segmentation output changes, so that cached
+# artifacts built by older code are not served
+PIPELINE_VERSION = "2"
+
+VALUES_FILE = "values.json"
+DIGESTS_FILE = "digests.json"
+ALIASES_FILE = "aliases.json"
+# Held while aliases.json or digests.json is read, updated and rewritten
+LOCK_FILE = ".lock"
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """
+    On-disk cache of computed aggregates, keyed by input content and code version.
+
+    Each entry is a directory named after the key holding one parquet file per
+    DataFrame artifact and a values.json for everything else (scalars, dicts).
+    Entries are written to a temporary directory and renamed into place, so a
+    crash never leaves a half-written entry behind.
+    """
+
+    def __init__(self, root: str, version: str = PIPELINE_VERSION):
+        self.root = Path(root)
+        self.version = version
+
+    def key(self, input_path: str) -> str:
+        """Cache key for an input file: content hash plus pipeline version."""
+        content = self._content_digest(input_path)
+        return hashlib.sha256(f"{content}:{self.version}".encode()).hexdigest()[:32]
+
+    def load(self, key: str):
+        """Return the stored artifacts for a key, or None on a miss."""
+        entry = self.root / key
+        if not entry.is_dir():
+            return None
+        with open(entry / VALUES_FILE) as f:
+            artifacts = json.load(f)
+        for path in entry.glob("*.parquet"):
+            artifacts[path.stem] = pd.read_parquet(path)
+        return artifacts
+
+    def store(self, key: str, artifacts: dict):
+        """Store DataFrames as parquet and the remaining values as JSON."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=self.root, prefix=".tmp-"))
+        try:
+            values = {}
+            for name, value in artifacts.items():
+                if isinstance(value, pd.DataFrame):
+                    value.to_parquet(staging / f"{name}.parquet", index=False)
+                else:
+                    values[name] = value
+            with open(staging / VALUES_FILE, "w") as f:
+                json.dump(values, f)
+            os.replace(staging, self.root / key)
+        except OSError:
+            # Another process stored the same key first; theirs is equivalent
+            shutil.rmtree(staging, ignore_errors=True)
+            if not (self.root / key).is_dir():
+                raise
+
+    def set_alias(self, name: str, key: str):
+        """Point a stable name (e.g. "latest incremental state") at a stored key."""
+        self._update_json(ALIASES_FILE, {name: key})
+
+    def load_alias(self, name: str):
+        """Load the artifacts an alias points to, or None."""
+        key = self._read_json(ALIASES_FILE).get(name)
+        return None if key is None else self.load(key)
+
+    def get_or_build(self, input_path: str, build, label: str = "aggregates") -> dict:
+        """Load artifacts for input_path, building and storing them on a miss."""
+        key = self.key(input_path)
+        artifacts = self.load(key)
+        if artifacts is not None:
+            print(f"Cache hit for {label} ({key}) in {self.root}")
+            return artifacts
+
+        print(f"Cache miss for {label} ({key}); recomputing...")
+        artifacts = build()
+        self.store(key, artifacts)
+        return artifacts
+
+    def _content_digest(self, input_path: str) -> str:
+        """
+        Content hash of input_path, remembered by (size, mtime) so an unchanged
+        file is not re-read on every start.
+        """
+        stat = os.stat(input_path)
+        fingerprint = f"{os.path.abspath(input_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+        digests = self._read_json(DIGESTS_FILE)
+        if fingerprint in digests:
+            return digests[fingerprint]
+
+        digest = file_digest(input_path)
+        self._update_json(DIGESTS_FILE, {fingerprint: digest})
+        return digest
+
+    def _read_json(self, name: str) -> dict:
+        path = self.root / name
+        if not path.exists():
+            return {}
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    @contextmanager
+    def _locked(self):
+        """Hold an exclusive lock on the cache's index files, across processes."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / LOCK_FILE, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _update_json(self, name: str, updates: dict):
+        """
+        Merge entries into an index file. The read-modify-write happens under
+        the lock, so concurrent exporter or upload processes keep each
+        other's entries.
+        """
+        with self._locked():
+            data = self._read_json(name)
+            data.update(updates)
+            self._write_json(name, data)
+
+    def _write_json(self, name: str, data: dict):
+        """Write via a uniquely named temporary file, so readers never see a partial file."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=f".{name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.root / name)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,91 @@
+import gzip
+import hashlib
+from dataclasses import dataclass, field
+
+try:
+    import brotli
+except ImportError:  # In requirements.txt; without it only gzip variants are kept
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 512
+
+# Preferred first when the client accepts several
+ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+@dataclass
+class CompressedPayload:
+    """
+    One serialized response body with its precompressed variants.
+
+    Each variant has its own strong ETag (identity hash plus encoding
+    suffix), since the bytes on the wire differ.
+    """
+    body: bytes
+    digest: str
+    variants: dict = field(default_factory=dict)  # encoding -> compressed bytes
+
+    def etag(self, encoding: str = None) -> str:
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def select(self, accept_encoding: str) -> tuple:
+        """
+        Pick the best variant the client accepts.
+
+        Returns:
+            Tuple of (body bytes, content encoding or None for identity)
+        """
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ENCODINGS:
+            if encoding in self.variants and encoding in accepted:
+                return self.variants[encoding], encoding
+        return self.body, None
+
+    def matches(self, if_none_match: str) -> bool:
+        """Whether an If-None-Match header names any variant of this payload."""
+        if not if_none_match:
+            return False
+        tags = {tag.strip() for tag in if_none_match.split(',')}
+        if '*' in tags:
+            return True
+        # If-None-Match uses weak comparison, so W/ prefixes are ignored
+        tags = {tag[2:] if tag.startswith('W/') else tag for tag in tags}
+        return any(self.etag(encoding) in tags for encoding in [None, *self.variants])
+
+
+def compress_payload(body: bytes) -> CompressedPayload:
+    """Hash a serialized body and build its gzip (and brotli, if installed) variants."""
+    payload = CompressedPayload(body=body, digest=hashlib.sha256(body).hexdigest()[:32])
+    if len(body) >= MIN_COMPRESS_BYTES:
+        # mtime=0 keeps the gzip bytes, and so the ETag, deterministic
+        payload.variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            payload.variants['br'] = brotli.compress(body, quality=11)
+    return payload
+
+
+def header_qualities(header: str) -> dict:
+    """Map each value of an Accept-style header to its q value (default 1)."""
+    qualities = {}
+    for part in (header or '').split(','):
+        value, *params = [piece.strip() for piece in part.split(';')]
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        qualities[value.lower()] = q
+    return qualities
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Content codings an Accept-Encoding header allows (q > 0)."""
+    accepted = {coding for coding, q in header_qualities(accept_encoding).items() if q > 0}
+    if '*' in accepted:
+        accepted.update(ENCODINGS)
+    return accepted
@@ -0,0 +1,73 @@
+import numpy as np
+
+from aggregation import aggregate
+from compact import compact_transactions, memory_bytes
+from income_segments import INCOME_COLUMNS, customer_bands
+from reader import COLUMNS_TO_KEEP, read_transactions
+from segmentation import compute_customer_segmentation
+
+
+class DatasetContext:
+    """
+    One snapshot, loaded and cleaned once, shared by every consumer.
+
+    The snapshot is read a single time in compact form, with only the
+    empty-merchant filter applied. Consumers needing stricter filters (the
+    summaries drop multi-category classifications) apply them to their own
+    aggregates, so everyone reads the same frame without copying it.
+
+    With income=True the read also covers the income columns and the rows
+    without a merchant (where most credits are), customers are banded from
+    them into `income_bands`, and only then is the merchant filter applied,
+    so income does not need a second read. Rows are then deduplicated on
+    the income columns too.
+
+    `transactions` is shared: treat it as read-only.
+    """
+
+    def __init__(self, input_path: str, income: bool = False):
+        self.input_path = input_path
+        self.income_bands = None
+        if not income:
+            self.transactions, self.read_stats = read_transactions(
+                input_path, drop_multi_category=False, compact=True
+            )
+            return
+
+        columns = COLUMNS_TO_KEEP + [c for c in INCOME_COLUMNS if c not in COLUMNS_TO_KEEP]
+        frame, self.read_stats = read_transactions(
+            input_path, columns=columns, drop_empty_merchants=False, drop_multi_category=False, compact=True
+        )
+        try:
+            self.income_bands = customer_bands(frame)
+        except KeyError as e:
+            print(f"Skipping income segments: {e}")
+
+        # The empty-merchant filter read_transactions would otherwise have pushed down
+        has_merchant = (frame['primary_merchant'] != '').to_numpy(dtype=bool) \
+            if 'primary_merchant' in frame.columns else np.ones(len(frame), dtype=bool)
+        self.read_stats.rows_filtered += int((~has_merchant).sum())
+        kept = [c for c in COLUMNS_TO_KEEP if c in frame.columns]
+        self.transactions = compact_transactions(frame.loc[has_merchant, kept].reset_index(drop=True))
+
+    def summaries(self) -> tuple:
+        """
+        Returns:
+            Tuple of (classification summary, merchant summary,
+            number of customers with 10+ transactions overall)
+        """
+        return aggregate(self.transactions, multi_category=False)
+
+    def segmentation(self) -> dict:
+        """Top-brand customer segmentation over the shared transactions."""
+        return compute_customer_segmentation(self.transactions)
+
+    def memory_bytes(self) -> int:
+        """Resident size of the shared transactions."""
+        return memory_bytes(self.transactions)
+
+    def describe(self) -> str:
+        return f"{self.read_stats.summary()}; holding {self.memory_bytes():,} bytes in memory"
+
+    def __len__(self) -> int:
+        return len(self.transactions)
@@ -0,0 +1,189 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from aggregation import (
+    CLASSIFICATION_COL,
+    CUSTOMER_COL,
+    MERCHANT_COL,
+    build_customer_merchant_stats,
+    rollup,
+    summarize,
+)
+from merchant_index import graph_data, merchant_payloads
+from segment_bitmaps import SegmentBitmap
+from segmentation import (
+    GAP_BRANDS,
+    SEGMENT_BRANDS,
+    customer_brand_stats,
+    recent_transactions,
+    score_brands,
+    top_brands,
+)
+
+BAND_COL = 'income_band'
+
+# Columns needed to estimate income; credits are not filtered by merchant
+INCOME_COLUMNS = [CUSTOMER_COL, 'date', 'amount', 'credit_debit', 'is_internal_transfer']
+
+AVG_DAYS_PER_MONTH = 365.25 / 12
+
+
+@dataclass
+class IncomeBand:
+    key: str
+    name: str
+    range: str
+    min_monthly: float
+
+
+# Ordered low to high; a customer belongs to the last band whose minimum they reach
+INCOME_BANDS = [
+    IncomeBand('low', 'Low Income', '< £1,000/mo', 0),
+    IncomeBand('lower_middle', 'Lower-Middle', '£1,000 - £2,000/mo', 1000),
+    IncomeBand('upper_middle', 'Upper-Middle', '£2,000 - £6,000/mo', 2000),
+    IncomeBand('high', 'High Income', '> £6,000/mo', 6000),
+]
+
+
+def monthly_income(transactions: pd.DataFrame) -> pd.Series:
+    """
+    Estimate each customer's monthly income.
+
+    Income is the sum of incoming (CREDIT) payments, excluding transfers
+    between the customer's own accounts, divided by the number of months
+    the customer's transactions span (at least one).
+
+    Returns:
+        Series of customer_id -> monthly income; customers without credits get 0
+    """
+    dates = pd.to_datetime(transactions['date'])
+    customers = transactions[CUSTOMER_COL]
+    span = dates.groupby(customers, observed=True).agg(['min', 'max'])
+    months = ((span['max'] - span['min']).dt.days / AVG_DAYS_PER_MONTH).clip(lower=1)
+
+    is_credit = transactions['credit_debit'] == 'CREDIT'
+    if 'is_internal_transfer' in transactions.columns:
+        is_credit &= ~transactions['is_internal_transfer'].fillna(False).astype(bool)
+    credits = transactions['amount'].where(is_credit, 0.0)
+    income = credits.groupby(customers, observed=True).sum()
+
+    return (income / months).rename('monthly_income')
+
+
+def assign_bands(income: pd.Series, bands: list = INCOME_BANDS) -> pd.Series:
+    """Map monthly incomes to band keys (an ordered categorical)."""
+    edges = [band.min_monthly for band in bands[1:]]
+    codes = np.searchsorted(edges, income.to_numpy(), side='right')
+    keys = pd.Categorical.from_codes(codes, categories=[band.key for band in bands], ordered=True)
+    return pd.Series(keys, index=income.index, name=BAND_COL)
+
+
+def customer_bands(transactions: pd.DataFrame, bands: list = INCOME_BANDS) -> pd.Series:
+    """
+    Band every customer by estimated monthly income.
+
+    Monthly income is the sum of the customer's CREDIT amounts, excluding
+    internal transfers (is_internal_transfer, when present), divided by the
+    months between their first and last transaction (at least one; see
+    monthly_income). Most credits have no merchant, so `transactions` must
+    not have had empty-merchant rows removed.
+
+    Raises:
+        KeyError: If the credit_debit, amount or date column is missing
+    """
+    missing = {'credit_debit', 'amount', 'date'} - set(transactions.columns)
+    if missing:
+        raise KeyError(f"Cannot estimate income without columns: {sorted(missing)}")
+    return assign_bands(monthly_income(transactions), bands)
+
+
+def with_bands(frame: pd.DataFrame, bands: pd.Series) -> pd.DataFrame:
+    """Attach each row's customer band as a column (customers may be dictionary-coded)."""
+    band_keys = frame[CUSTOMER_COL].map(bands.astype(str))
+    return frame.assign(**{BAND_COL: pd.Categorical(
+        band_keys, categories=bands.cat.categories, ordered=True
+    )})
+
+
+def income_outputs(cleaned: pd.DataFrame, bands: pd.Series, band_defs: list = INCOME_BANDS) -> tuple:
+    """
+    Build every income-segmented export from one grouped pass per output.
+
+    Each customer's band is attached as an extra leading group key, so all
+    bands are summarized by the same groupby instead of re-running the
+    merchant and segmentation pipelines once per band; more bands only add
+    groups. Brand scores are min-max scaled within each band, as running
+    segmentation on the band alone would.
+
+    Returns:
+        Tuple of (income_segments, merchants_by_income, gap_analysis_income)
+        payloads, each keyed by band, plus the customer ID list whose
+        positions are the dense IDs used by the band bitmaps
+    """
+    # Merchant summaries, exactly as aggregate() computes them per band
+    stats = with_bands(build_customer_merchant_stats(cleaned), bands)
+    class_customer_stats = rollup(
+        stats.dropna(subset=[CLASSIFICATION_COL, CUSTOMER_COL, BAND_COL]),
+        [BAND_COL, CLASSIFICATION_COL, CUSTOMER_COL]
+    )
+    classification_summary = summarize(class_customer_stats, [BAND_COL, CLASSIFICATION_COL])
+    merchant_summary = summarize(
+        stats.dropna(subset=[CLASSIFICATION_COL, MERCHANT_COL, CUSTOMER_COL, BAND_COL]),
+        [BAND_COL, CLASSIFICATION_COL, MERCHANT_COL]
+    )
+
+    # Top brands, scored within each band
+    brand_stats = with_bands(customer_brand_stats(recent_transactions(cleaned)), bands)
+    top = top_brands(score_brands(brand_stats, by=BAND_COL), GAP_BRANDS)
+    segmented = top.loc[top['brand_rank'] == SEGMENT_BRANDS].groupby(BAND_COL, observed=True).size()
+    brand_counts = top.groupby([BAND_COL, MERCHANT_COL], observed=True).size().rename('customer_count')
+    brand_counts = brand_counts.reset_index().sort_values(
+        [BAND_COL, 'customer_count'], ascending=[True, False], kind='stable'
+    )
+    brand_counts = brand_counts.groupby(BAND_COL, observed=True).head(10)
+
+    # Customers get dense IDs in sorted order; band membership is a bitmap over them
+    customers = pd.Index(pd.Series(cleaned[CUSTOMER_COL].unique()).astype(str)).sort_values()
+    customer_band = pd.Series(customers).map(bands.astype(str))
+    ids_by_band = pd.Series(np.arange(len(customers))).groupby(customer_band.to_numpy()).agg(list)
+
+    classes_by_band = dict(list(classification_summary.groupby(BAND_COL, observed=True)))
+    merchants_by_band = dict(list(merchant_summary.groupby(BAND_COL, observed=True)))
+    brands_by_band = dict(list(brand_counts.groupby(BAND_COL, observed=True)))
+
+    income_segments, merchants_by_income, gap_analysis_income = {}, {}, {}
+    # Every band is listed, even if empty, since the frontend renders all of them
+    for band in band_defs:
+        customer_ids = ids_by_band.get(band.key, [])
+        income_segments[band.key] = {
+            "name": band.name,
+            "range": band.range,
+            "customer_count": len(customer_ids),
+            "customer_bitmap": SegmentBitmap.from_ids(customer_ids, len(customers)).encode(),
+            **graph_data(classes_by_band.get(band.key, classification_summary.iloc[:0]))
+        }
+        merchants_by_income[band.key] = merchant_payloads(
+            merchants_by_band.get(band.key, merchant_summary.iloc[:0])
+        )
+
+        analyzed = int(segmented.get(band.key, 0))
+        band_brands = brands_by_band.get(band.key, brand_counts.iloc[:0])
+        gap_analysis_income[band.key] = {
+            "name": band.name,
+            "range": band.range,
+            "total_customers_analyzed": analyzed,
+            "top10_brands": [
+                {
+                    MERCHANT_COL: merchant,
+                    "customer_count": int(count),
+                    "customer_pct": round(float(count) / analyzed * 100, 1) if analyzed else 0.0
+                }
+                for merchant, count in zip(
+                    band_brands[MERCHANT_COL].astype(str), band_brands['customer_count']
+                )
+            ]
+        }
+
+    return income_segments, merchants_by_income, gap_analysis_income, customers.tolist()
@@ -0,0 +1,194 @@
+from dataclasses import dataclass
+
+import pandas as pd
+
+from aggregation import (
+    CUSTOMER_COL,
+    STAT_KEYS,
+    build_customer_merchant_stats,
+    drop_multi_category,
+    summarize_stats,
+)
+from compact import decode_labels
+from segmentation import (
+    GAP_BRANDS,
+    MERCHANT_COL,
+    customer_brand_stats,
+    recent_transactions,
+    score_brands,
+    summarize_top_brands,
+    top_brands,
+)
+
+FINGERPRINT_COLS = ['txn_rows', 'hash_lo', 'hash_hi']
+
+# Cache alias of the most recently processed snapshot's partials
+STATE_ALIAS = "incremental-state"
+
+
+@dataclass
+class IncrementalState:
+    """
+    Per-customer partial aggregates of one snapshot.
+
+    - fingerprints: one row per customer; a row count plus two order-independent
+      sums over 32-bit halves of the customer's row hashes, so two snapshots can
+      be diffed customer by customer without keeping the rows
+    - merchant_stats: (classification, merchant, customer) count/sum partials
+    - brand_stats: (customer, brand) count/sum over the customer's 60-day window
+
+    Key columns hold plain labels, since dictionary codes differ between
+    snapshots. Every final output is re-derived from these partials.
+    """
+    fingerprints: pd.DataFrame
+    merchant_stats: pd.DataFrame
+    brand_stats: pd.DataFrame
+
+    def to_artifacts(self, version: str) -> dict:
+        return {
+            "pipeline_version": version,
+            "fingerprints": self.fingerprints.reset_index(),
+            "merchant_stats": self.merchant_stats,
+            "brand_stats": self.brand_stats
+        }
+
+    @classmethod
+    def from_artifacts(cls, artifacts: dict) -> "IncrementalState":
+        return cls(
+            fingerprints=artifacts["fingerprints"].set_index(CUSTOMER_COL),
+            merchant_stats=artifacts["merchant_stats"],
+            brand_stats=artifacts["brand_stats"]
+        )
+
+
+def customer_fingerprints(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Fingerprint each customer's set of (deduplicated) transactions."""
+    row_hash = pd.util.hash_pandas_object(transactions, index=False).to_numpy()
+    parts = pd.DataFrame({
+        CUSTOMER_COL: transactions[CUSTOMER_COL].to_numpy(),
+        'hash_lo': (row_hash & 0xFFFFFFFF).astype('int64'),
+        'hash_hi': (row_hash >> 32).astype('int64')
+    })
+    fingerprints = parts.groupby(CUSTOMER_COL, observed=True).agg(
+        txn_rows=('hash_lo', 'size'),
+        hash_lo=('hash_lo', 'sum'),
+        hash_hi=('hash_hi', 'sum')
+    )
+    return decode_labels(fingerprints.reset_index()).set_index(CUSTOMER_COL)
+
+
+def customer_partials(transactions: pd.DataFrame) -> tuple:
+    """Merchant and windowed brand partials for the given customers' rows."""
+    merchant_stats = decode_labels(build_customer_merchant_stats(transactions))
+    brand_stats = decode_labels(customer_brand_stats(recent_transactions(transactions)))
+    return merchant_stats, brand_stats
+
+
+def build_state(transactions: pd.DataFrame) -> IncrementalState:
+    """Build the partials of a snapshot from scratch."""
+    merchant_stats, brand_stats = customer_partials(transactions)
+    return IncrementalState(customer_fingerprints(transactions), merchant_stats, brand_stats)
+
+
+def changed_customers(previous: pd.DataFrame, current: pd.DataFrame) -> tuple:
+    """
+    Returns:
+        Tuple of (customers that are new or whose transactions changed,
+        customers no longer present)
+    """
+    joined = current.join(previous, rsuffix='_prev', how='left')
+    prev_cols = [f"{c}_prev" for c in FINGERPRINT_COLS]
+    differs = (joined[FINGERPRINT_COLS].to_numpy() != joined[prev_cols].to_numpy()).any(axis=1)
+    return current.index[differs], previous.index.difference(current.index)
+
+
+def update_state(state: IncrementalState, transactions: pd.DataFrame) -> tuple:
+    """
+    Bring a snapshot's partials up to date with a newer snapshot.
+
+    Only customers whose transactions changed are re-aggregated (including
+    their 60-day window); everyone else's partials are carried over.
+
+    Returns:
+        Tuple of (new IncrementalState, number of customers recomputed)
+    """
+    fingerprints = customer_fingerprints(transactions)
+    changed, removed = changed_customers(state.fingerprints, fingerprints)
+    stale = changed.union(removed)
+
+    changed_rows = transactions[transactions[CUSTOMER_COL].isin(changed).to_numpy()]
+    merchant_partials, brand_partials = customer_partials(changed_rows)
+
+    merchant_stats = pd.concat([
+        state.merchant_stats[~state.merchant_stats[CUSTOMER_COL].isin(stale)],
+        merchant_partials
+    ], ignore_index=True).sort_values(STAT_KEYS, ignore_index=True)
+    brand_stats = pd.concat([
+        state.brand_stats[~state.brand_stats[CUSTOMER_COL].isin(stale)],
+        brand_partials
+    ], ignore_index=True).sort_values([CUSTOMER_COL, MERCHANT_COL], ignore_index=True)
+
+    return IncrementalState(fingerprints, merchant_stats, brand_stats), len(changed)
+
+
+def state_outputs(state: IncrementalState) -> tuple:
+    """
+    Re-derive the published aggregates from the partials.
+
+    Returns:
+        Tuple of (classification summary, merchant summary,
+        number of customers with 10+ transactions overall, segmentation,
+        each customer's ranked top brands)
+    """
+    classification_summary, merchant_summary, total_cust_10plus = summarize_stats(
+        drop_multi_category(state.merchant_stats)
+    )
+    top = top_brands(score_brands(state.brand_stats), GAP_BRANDS)
+    segmentation = summarize_top_brands(top)
+    top = top[[CUSTOMER_COL, MERCHANT_COL, 'brand_rank']].reset_index(drop=True)
+    return classification_summary, merchant_summary, total_cust_10plus, segmentation, top
+
+
+def refresh_aggregates(cache, dataset, alias: str = STATE_ALIAS) -> dict:
+    """
+    Compute a snapshot's startup artifacts, reusing the last stored partials.
+
+    The partials of the most recently processed snapshot (found through a
+    cache alias) are updated with the customers that changed; without them
+    the state is built from scratch, as it is when they were stored by a
+    different pipeline version (their aggregates are stale). The new
+    partials are stored and the alias moved, so the next snapshot refreshes
+    from this one.
+
+    Args:
+        cache: ArtifactCache holding incremental states
+        dataset: DatasetContext of the new snapshot
+        alias: Cache alias naming the latest state
+
+    Returns:
+        Dict of classification_summary, merchant_summary, total_customers,
+        customer_segmentation, top_brands
+    """
+    previous = cache.load_alias(alias)
+    if previous is None:
+        print("No previous incremental state; aggregating every customer...")
+        state = build_state(dataset.transactions)
+    elif previous.get("pipeline_version") != cache.version:
+        print("Previous incremental state is from another pipeline version; aggregating every customer...")
+        state = build_state(dataset.transactions)
+    else:
+        state, recomputed = update_state(IncrementalState.from_artifacts(previous), dataset.transactions)
+        print(f"Incremental refresh: recomputed {recomputed:,} of {len(state.fingerprints):,} customers")
+
+    state_key = f"{cache.key(dataset.input_path)}-state"
+    cache.store(state_key, state.to_artifacts(cache.version))
+    cache.set_alias(alias, state_key)
+
+    classification_summary, merchant_summary, total_cust_10plus, segmentation, top = state_outputs(state)
+    return {
+        "classification_summary": classification_summary,
+        "merchant_summary": merchant_summary,
+        "total_customers": total_cust_10plus,
+        "customer_segmentation": segmentation,
+        "top_brands": top
+    }
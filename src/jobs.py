@@ -0,0 +1,144 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Job:
+    """Status of one background job."""
+    job_id: str
+    key: str
+    status: str = "queued"  # queued / running / done / failed
+    error: str = None
+    result: object = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+
+class JobQueue:
+    """
+    Runs CPU-heavy functions in an executor without blocking the event loop.
+
+    At most `max_running` jobs execute at once; further jobs wait in FIFO
+    order, and submissions beyond `max_queued` waiting jobs are refused.
+    Jobs are deduplicated by key: submitting a key that is still queued or
+    running returns the existing job. Only the latest `max_history`
+    finished jobs are remembered.
+
+    The executor comes from `make_executor`, and is replaced by a new one
+    if a worker process dies (e.g. runs out of memory), so one crashed job
+    fails on its own instead of every later job.
+    """
+
+    def __init__(self, make_executor, max_running: int, max_queued: int, max_history: int = 1000):
+        self.make_executor = make_executor
+        self.executor = make_executor()
+        self.max_queued = max_queued
+        self.max_history = max_history
+        self.jobs = OrderedDict()  # job_id -> Job, in submission order
+        self._slots = asyncio.Semaphore(max_running)
+        self._active = {}  # key -> Job still queued or running
+        self._tasks = set()
+
+    def submit(self, key: str, fn, *args, on_done=None) -> Job:
+        """
+        Queue fn(*args) for execution.
+
+        Args:
+            key: Deduplication key (e.g. a content hash)
+            fn: Picklable function to run in the executor
+            on_done: Optional callback given the job once it succeeds
+
+        Returns:
+            The new Job, or the pending Job with the same key
+
+        Raises:
+            OverflowError: If max_queued jobs are already waiting
+        """
+        if key in self._active:
+            return self._active[key]
+        if len(self.queued()) >= self.max_queued:
+            raise OverflowError(f"{self.max_queued} jobs already queued")
+
+        job = Job(job_id=uuid.uuid4().hex, key=key)
+        self.jobs[job.job_id] = job
+        self._active[key] = job
+        task = asyncio.get_running_loop().create_task(self._run(job, fn, args, on_done))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def add_finished(self, key: str, result) -> Job:
+        """Record a job whose result was already available (e.g. a repeat upload)."""
+        job = Job(job_id=uuid.uuid4().hex, key=key, status="done", result=result)
+        job.started_at = job.finished_at = job.submitted_at
+        self.jobs[job.job_id] = job
+        self._prune()
+        return job
+
+    def pending(self, key: str):
+        """The queued or running job for key, or None."""
+        return self._active.get(key)
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def queued(self) -> list:
+        return [job for job in self._active.values() if job.status == "queued"]
+
+    def describe(self, job: Job) -> dict:
+        """JSON-ready status, including queue position or elapsed time."""
+        status = {"job_id": job.job_id, "status": job.status}
+        if job.status == "queued":
+            status["queue_position"] = self.queued().index(job) + 1
+        elif job.status == "running":
+            status["elapsed_seconds"] = round(time.time() - job.started_at, 1)
+        else:
+            status["duration_seconds"] = round(job.finished_at - job.submitted_at, 1)
+        if job.error:
+            status["error"] = job.error
+        return status
+
+    async def _run(self, job: Job, fn, args, on_done):
+        try:
+            async with self._slots:
+                job.status = "running"
+                job.started_at = time.time()
+                executor = self.executor
+                try:
+                    job.result = await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+                except BrokenProcessPool:
+                    self._replace_executor(executor)
+                    raise
+            if on_done is not None:
+                on_done(job)
+            job.status = "done"
+        except BrokenProcessPool:
+            job.status = "failed"
+            job.error = "Worker process stopped unexpectedly (possibly out of memory)"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            del self._active[job.key]
+            self._prune()
+
+    def _replace_executor(self, broken):
+        """Swap in a new executor, once per broken one (its other jobs fail too)."""
+        if self.executor is broken:
+            self.executor = self.make_executor()
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self.jobs[job_id]
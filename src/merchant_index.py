@@ -0,0 +1,57 @@
+import json
+
+import pandas as pd
+
+from aggregation import CLASSIFICATION_COL, MERCHANT_COL
+
+AXIS_LABELS = {
+    "x": "Median Transactions per Customer",
+    "y": "Median Amount per Customer",
+    "z": "Customers with 10+ Transactions"
+}
+
+
+def encode_json(payload) -> bytes:
+    """Serialize a payload exactly as FastAPI's JSONResponse would."""
+    return json.dumps(
+        payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def graph_data(classification_summary: pd.DataFrame) -> dict:
+    """3D graph payload of a classification summary."""
+    return {
+        "labels": classification_summary[CLASSIFICATION_COL].tolist(),
+        "x": classification_summary['median_txn_per_customer'].tolist(),
+        "y": classification_summary['median_amount_per_customer'].tolist(),
+        "z": classification_summary['customers_with_10plus_txn'].tolist(),
+        "axis_labels": AXIS_LABELS
+    }
+
+
+def merchant_payloads(merchant_summary: pd.DataFrame) -> dict:
+    """
+    Partition the merchant summary into one drill-down payload per classification.
+
+    Uses a single grouped pass, so building the index costs the same as one
+    request used to.
+    """
+    payloads = {}
+    for classification, group in merchant_summary.groupby(CLASSIFICATION_COL, sort=True):
+        payloads[classification] = {
+            "classification": classification,
+            "labels": group[MERCHANT_COL].tolist(),
+            "x": group['median_txn_per_customer'].tolist(),
+            "y": group['median_amount_per_customer'].tolist(),
+            "z": group['customers_with_10plus_txn'].tolist(),
+            "axis_labels": AXIS_LABELS
+        }
+    return payloads
+
+
+def build_merchant_index(merchant_summary: pd.DataFrame) -> dict:
+    """Map each classification to its pre-serialized drill-down JSON body."""
+    return {
+        classification: encode_json(payload)
+        for classification, payload in merchant_payloads(merchant_summary).items()
+    }
@@ -1,8 +1,44 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 
+from aggregation import (
+    CLASSIFICATION_COL,
+    build_customer_merchant_stats,
+    stream_customer_merchant_stats,
+    summarize_stats,
+)
+from reader import ReadStats, iter_transactions, projected_schema, read_transactions
 
-def process_dataset(input_path: str, output_path: str = None, table_output_path: str = None) -> pd.DataFrame:
+
+def write_batches(batches, output_path: str, schema: pa.Schema):
+    """
+    Write cleaned batches to a single parquet file as they pass through.
+
+    Every batch is converted to `schema`: inferring it from the first batch
+    would type a column that batch only holds nulls for as null, and the
+    next batch with values would not fit.
+    """
+    writer = None
+    try:
+        for batch in batches:
+            table = pa.Table.from_pandas(batch, schema=schema, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, schema)
+            writer.write_table(table)
+            yield batch
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def process_dataset(
+    input_path: str,
+    output_path: str = None,
+    table_output_path: str = None,
+    batch_size: int = None
+) -> pd.DataFrame:
     """
     Clean and process transaction dataset.
 
@@ -10,59 +46,47 @@ def process_dataset(input_path: str, output_path: str = None, table_output_path:
         input_path: Path to input parquet file
         output_path: Path to save cleaned parquet (optional)
         table_output_path: Path to save summary table (optional)
+        batch_size: Stream the file in batches of this many rows instead of
+            loading it whole (optional). Peak memory is then bounded by the
+            batch size plus the per-customer partials, and the cleaned
+            DataFrame is not returned (None), only written to output_path.
 
     Returns:
         Tuple of (cleaned DataFrame, summary table by classification)
     """
-    # Load data
-    data = pd.read_parquet(input_path).drop_duplicates()
-
-    # Select relevant columns
-    columns_to_keep = [
-        'primary_merchant',
-        'transaction_classification_0',
-        'transaction_classification_1',
-        'customer_id',
-        'account_id',
-        'date',
-        'amount',
-        'transaction_direction'
-    ]
-
-    cleaned = data.loc[:, columns_to_keep]
-
-    # Filter out empty merchants
-    cleaned = cleaned.loc[cleaned['primary_merchant'] != '']
+    if output_path:
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
 
-    # Filter out multi-category classifications (containing "|")
-    cleaned = cleaned[~cleaned['transaction_classification_0'].str.contains('|', regex=False, na=False)]
+    if batch_size:
+        # Walk the row groups batch by batch, keeping only count/sum partials
+        read_stats = ReadStats()
+        batches = iter_transactions(input_path, batch_size=batch_size, stats=read_stats)
+        if output_path:
+            batches = write_batches(batches, output_path, projected_schema(input_path))
+        stats = stream_customer_merchant_stats(batches)
+        cleaned = None
+    else:
+        # Load only the needed columns; merchant/classification filters are pushed
+        # down to the parquet scanner and duplicates dropped on the projected rows
+        cleaned, read_stats = read_transactions(input_path)
+        stats = build_customer_merchant_stats(cleaned)
+        if output_path:
+            cleaned.to_parquet(output_path, index=False)
+    print(read_stats.summary())
 
-    # Build summary table by transaction_classification_0
-    customer_class_stats = cleaned.groupby(
-        ['transaction_classification_0', 'customer_id']
-    ).agg(
-        txn_count=('amount', 'count'),
-        total_amount=('amount', 'sum')
-    ).reset_index()
-
-    summary_table = customer_class_stats.groupby('transaction_classification_0').agg(
-        median_txn_per_customer=('txn_count', 'median'),
-        median_amount_per_customer=('total_amount', 'median'),
-        customers_with_10plus_txn=('txn_count', lambda x: (x >= 10).sum())
-    )
-
-    # Save if output path provided
     if output_path:
-        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-        cleaned.to_parquet(output_path, index=False)
         print(f"Saved cleaned data to {output_path}")
 
+    # Build summary table by transaction_classification_0
+    classification_summary, _, _ = summarize_stats(stats)
+    summary_table = classification_summary.set_index(CLASSIFICATION_COL)
+
     if table_output_path:
         Path(table_output_path).parent.mkdir(parents=True, exist_ok=True)
         summary_table.to_parquet(table_output_path)
         print(f"Saved summary table to {table_output_path}")
 
-    print(f"Processed: {len(data):,} -> {len(cleaned):,} rows")
+    print(f"Processed: {read_stats.rows_total:,} -> {read_stats.rows_kept:,} rows")
     return cleaned, summary_table
 
 
@@ -0,0 +1,255 @@
+import os
+import tempfile
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from compact import compact_transactions
+
+COLUMNS_TO_KEEP = [
+    'primary_merchant',
+    'transaction_classification_0',
+    'transaction_classification_1',
+    'customer_id',
+    'account_id',
+    'date',
+    'amount',
+    'transaction_direction'
+]
+
+# Identity columns added to the dedupe key when present, so that two genuine
+# transactions which only look alike after projection are not collapsed
+DEDUP_KEY_EXTRA = ['transaction_id']
+
+# Row hashes deduplicated at a time when streaming (16 bytes each with its position)
+DEDUPE_PARTITION_ROWS = 1_000_000
+
+
+@dataclass
+class ReadStats:
+    """What a projected, filtered read skipped compared to a full read."""
+    rows_total: int = 0
+    rows_filtered: int = 0
+    rows_duplicate: int = 0
+    bytes_total: int = 0
+    bytes_read: int = 0
+
+    @property
+    def rows_kept(self) -> int:
+        return self.rows_total - self.rows_filtered - self.rows_duplicate
+
+    @property
+    def rows_skipped(self) -> int:
+        return self.rows_filtered + self.rows_duplicate
+
+    @property
+    def bytes_skipped(self) -> int:
+        return self.bytes_total - self.bytes_read
+
+    def summary(self) -> str:
+        return (
+            f"Read {self.rows_total:,} -> {self.rows_kept:,} rows "
+            f"({self.rows_filtered:,} filtered, {self.rows_duplicate:,} duplicates); "
+            f"skipped {self.bytes_skipped:,} of {self.bytes_total:,} bytes"
+        )
+
+
+def column_bytes(metadata: pq.FileMetaData, columns: list = None) -> int:
+    """Compressed on-disk size of the given top-level columns (all if None)."""
+    total = 0
+    for rg in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg)
+        for i in range(row_group.num_columns):
+            chunk = row_group.column(i)
+            if columns is None or chunk.path_in_schema.split('.')[0] in columns:
+                total += chunk.total_compressed_size
+    return total
+
+
+def transaction_filter(schema, drop_empty_merchants: bool = True, drop_multi_category: bool = True):
+    """
+    Build the scanner predicate for the standard cleaning rules.
+
+    Nulls are kept, matching the pandas filters this replaces
+    (``!= ''`` and ``str.contains(..., na=False)``).
+    """
+    expr = None
+    if drop_empty_merchants and 'primary_merchant' in schema.names:
+        merchant = ds.field('primary_merchant')
+        expr = merchant.is_null() | (merchant != '')
+    if drop_multi_category and 'transaction_classification_0' in schema.names:
+        classification = ds.field('transaction_classification_0')
+        single = classification.is_null() | ~pc.match_substring(classification, '|')
+        expr = single if expr is None else expr & single
+    return expr
+
+
+def read_transactions(
+    input_path: str,
+    columns: list = None,
+    drop_empty_merchants: bool = True,
+    drop_multi_category: bool = True,
+    compact: bool = False
+) -> tuple:
+    """
+    Read and clean a transaction parquet file, touching only what is needed.
+
+    Only the requested columns (plus dedupe identity columns) are read, the
+    merchant/classification filters are pushed down to the pyarrow scanner,
+    and duplicates are dropped on a hashed key of the projected columns.
+
+    Args:
+        input_path: Path to input parquet file
+        columns: Columns to return (defaults to COLUMNS_TO_KEEP); missing ones are skipped
+        drop_empty_merchants: Filter out rows with an empty primary_merchant
+        drop_multi_category: Filter out classifications containing "|"
+        compact: Return the code-based representation from compact_transactions.
+            Strings are dictionary-decoded by Arrow, so per-row Python
+            string objects are never created.
+
+    Returns:
+        Tuple of (cleaned DataFrame, ReadStats)
+    """
+    metadata, dataset, existing, projected = open_projected(input_path, columns)
+
+    table = dataset.to_table(
+        columns=projected,
+        filter=transaction_filter(dataset.schema, drop_empty_merchants, drop_multi_category)
+    )
+    frame = table.to_pandas(strings_to_categorical=compact)
+
+    row_keys = pd.util.hash_pandas_object(frame, index=False)
+    duplicated = row_keys.duplicated().to_numpy()
+    cleaned = frame.loc[~duplicated, existing].reset_index(drop=True)
+    if compact:
+        cleaned = compact_transactions(cleaned)
+
+    stats = ReadStats(
+        rows_total=metadata.num_rows,
+        rows_filtered=metadata.num_rows - table.num_rows,
+        rows_duplicate=int(duplicated.sum()),
+        bytes_total=column_bytes(metadata),
+        bytes_read=column_bytes(metadata, projected)
+    )
+    return cleaned, stats
+
+
+def iter_transactions(
+    input_path: str,
+    columns: list = None,
+    batch_size: int = 100_000,
+    drop_empty_merchants: bool = True,
+    drop_multi_category: bool = True,
+    stats: ReadStats = None
+):
+    """
+    Stream cleaned transactions from a parquet file in bounded batches.
+
+    Applies the same projection, filters and dedupe as read_transactions, but
+    only ever holds one scanner batch of rows. Duplicates are found before
+    any row is yielded (see duplicate_positions), so the file's projected
+    columns are scanned twice.
+
+    Args:
+        input_path: Path to input parquet file
+        columns: Columns to yield (defaults to COLUMNS_TO_KEEP); missing ones are skipped
+        batch_size: Maximum number of rows read per batch
+        drop_empty_merchants: Filter out rows with an empty primary_merchant
+        drop_multi_category: Filter out classifications containing "|"
+        stats: Optional ReadStats, updated in place as batches are read
+
+    Yields:
+        Cleaned DataFrame batches
+    """
+    metadata, dataset, existing, projected = open_projected(input_path, columns)
+    row_filter = transaction_filter(dataset.schema, drop_empty_merchants, drop_multi_category)
+
+    def scan():
+        for batch in dataset.to_batches(columns=projected, filter=row_filter, batch_size=batch_size):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+    partitions = max(1, -(-metadata.num_rows // DEDUPE_PARTITION_ROWS))
+    duplicates, rows_kept_before_dedupe = duplicate_positions(scan(), partitions)
+    if stats is not None:
+        stats.rows_total = metadata.num_rows
+        stats.rows_filtered = metadata.num_rows - rows_kept_before_dedupe
+        stats.rows_duplicate = len(duplicates)
+        stats.bytes_total = column_bytes(metadata)
+        stats.bytes_read = column_bytes(metadata, projected)
+
+    offset = 0
+    for frame in scan():
+        keep = np.ones(len(frame), dtype=bool)
+        lo, hi = np.searchsorted(duplicates, [offset, offset + len(frame)])
+        keep[duplicates[lo:hi] - offset] = False
+        offset += len(frame)
+
+        cleaned = frame.loc[keep, existing].reset_index(drop=True)
+        if len(cleaned):
+            yield cleaned
+
+
+def duplicate_positions(frames, partitions: int) -> tuple:
+    """
+    Positions of the rows that repeat an earlier row, across a stream of frames.
+
+    Each row's 64-bit hash is spilled, with its position, to one of
+    `partitions` temporary files chosen by the hash. Identical rows land in
+    the same file, so each file is deduplicated on its own, and memory is
+    bounded by one file's keys plus the duplicates found (not every row).
+
+    Returns:
+        Tuple of (sorted int64 array of duplicate positions, rows seen)
+    """
+    rows = 0
+    with tempfile.TemporaryDirectory(prefix="dedupe-") as spill_dir:
+        paths = [os.path.join(spill_dir, f"{part}.keys") for part in range(partitions)]
+        for frame in frames:
+            row_keys = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+            pairs = np.column_stack([row_keys, np.arange(rows, rows + len(frame), dtype=np.uint64)])
+            part = row_keys % np.uint64(partitions)
+            order = np.argsort(part, kind='stable')
+            bounds = np.searchsorted(part[order], np.arange(partitions + 1))
+            for p in np.flatnonzero(np.diff(bounds)):
+                with open(paths[p], "ab") as f:
+                    pairs[order[bounds[p]:bounds[p + 1]]].tofile(f)
+            rows += len(frame)
+
+        duplicates = []
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            pairs = np.fromfile(path, dtype=np.uint64).reshape(-1, 2)
+            # Sorted by key, then position: every repeat after the first occurrence is a duplicate
+            pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+            repeat = np.zeros(len(pairs), dtype=bool)
+            repeat[1:] = pairs[1:, 0] == pairs[:-1, 0]
+            duplicates.append(pairs[repeat, 1].astype(np.int64))
+    duplicates = np.sort(np.concatenate(duplicates)) if duplicates else np.empty(0, dtype=np.int64)
+    return duplicates, rows
+
+
+def projected_schema(input_path: str, columns: list = None) -> pa.Schema:
+    """
+    Arrow schema of the columns iter_transactions yields, taken from the
+    file itself (so it does not depend on which values one batch holds).
+    """
+    _, dataset, existing, _ = open_projected(input_path, columns)
+    return pa.schema([dataset.schema.field(c) for c in existing])
+
+
+def open_projected(input_path: str, columns: list = None) -> tuple:
+    """Open a parquet dataset and work out which columns to read."""
+    columns = COLUMNS_TO_KEEP if columns is None else columns
+    metadata = pq.ParquetFile(input_path).metadata
+    dataset = ds.dataset(input_path, format='parquet')
+
+    existing = [c for c in columns if c in dataset.schema.names]
+    key_extra = [c for c in DEDUP_KEY_EXTRA if c in dataset.schema.names and c not in existing]
+    return metadata, dataset, existing, existing + key_extra
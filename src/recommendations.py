@@ -0,0 +1,147 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from aggregation import CLASSIFICATION_COL, MERCHANT_COL
+
+
+class RecommendationIndex:
+    """
+    Pre-sorted structure answering recommendation threshold queries.
+
+    Classifications are sorted by customers_with_10plus_txn (descending), and
+    merchants are laid out in one flat array, grouped by classification and
+    sorted within each classification by their customer count, which orders
+    them by share of classification customers. A query for (x, y) is then a
+    binary search for the qualifying classifications, one binary search per
+    qualifying classification for its merchants, and vectorized slices.
+
+    Results are identical to filtering the summaries row by row, including
+    the order: by merchant customers descending, ties kept in
+    (classification, merchant) order.
+    """
+
+    def __init__(
+        self,
+        classification_summary: pd.DataFrame,
+        merchant_summary: pd.DataFrame,
+        total_customers: int,
+        cache_size: int = 256
+    ):
+        self.total_customers = total_customers
+
+        classes = classification_summary.sort_values(
+            'customers_with_10plus_txn', ascending=False, kind='stable'
+        )
+        self.class_names = classes[CLASSIFICATION_COL].tolist()
+        self.class_customers = classes['customers_with_10plus_txn'].to_numpy()
+        self._class_name_array = np.array(self.class_names, dtype=object)
+
+        # Flat merchant arrays; `position` is the row's place in the summary,
+        # which is (classification, merchant) order and breaks ties in output
+        merchants = merchant_summary.assign(position=np.arange(len(merchant_summary)))
+        rank = {name: i for i, name in enumerate(self.class_names)}
+        merchants = merchants[merchants[CLASSIFICATION_COL].isin(rank)]
+        merchants = merchants.assign(class_rank=merchants[CLASSIFICATION_COL].map(rank).astype('int64'))
+        merchants = merchants.sort_values(
+            ['class_rank', 'customers_with_10plus_txn'], ascending=[True, False], kind='stable'
+        )
+
+        self.merchant_names = merchants[MERCHANT_COL].to_numpy()
+        self.merchant_customers = merchants['customers_with_10plus_txn'].to_numpy()
+        self.median_txn = merchants['median_txn_per_customer'].to_numpy(dtype='float64')
+        self.median_amount = merchants['median_amount_per_customer'].to_numpy(dtype='float64')
+        self.position = merchants['position'].to_numpy()
+
+        counts = np.bincount(merchants['class_rank'].to_numpy(), minlength=len(self.class_names))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        # Negated so that np.searchsorted works on ascending arrays
+        self._neg_class_customers = -self.class_customers
+        self._neg_merchant_customers = -self.merchant_customers
+
+        self._cached_query = lru_cache(maxsize=cache_size)(self._query) if cache_size else self._query
+
+    def select(self, x: float, y: float) -> tuple:
+        """
+        Rows recommended for classification threshold x% and merchant threshold y%.
+
+        Returns:
+            Tuple of (number of qualifying classifications, dict of result
+            column name -> numpy array, in output order)
+        """
+        min_class_customers = self.total_customers * (x / 100)
+        n_classes = int(np.searchsorted(self._neg_class_customers, -min_class_customers, side='right'))
+        # No customers (e.g. an empty snapshot): nothing qualifies, and shares would divide by zero
+        if self.total_customers == 0:
+            n_classes = 0
+
+        rows = []
+        row_class = []
+        for i in range(n_classes):
+            start, end = self.offsets[i], self.offsets[i + 1]
+            min_merchant_customers = self.class_customers[i] * (y / 100)
+            n = np.searchsorted(
+                self._neg_merchant_customers[start:end], -min_merchant_customers, side='right'
+            )
+            rows.append(np.arange(start, start + n))
+            row_class.append(np.full(n, i))
+
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype='int64')
+        row_class = np.concatenate(row_class) if row_class else np.empty(0, dtype='int64')
+        order = np.lexsort((self.position[rows], self._neg_merchant_customers[rows]))
+        rows, row_class = rows[order], row_class[order]
+
+        class_customers = self.class_customers[row_class]
+        merchant_customers = self.merchant_customers[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            class_pct = np.round(class_customers / self.total_customers * 100, 1)
+            merchant_pct = np.round(merchant_customers / class_customers * 100, 1)
+
+        columns = {
+            "classification": self._class_name_array[row_class],
+            "classification_customers": class_customers,
+            "classification_pct": class_pct,
+            "merchant": self.merchant_names[rows],
+            "merchant_customers": merchant_customers,
+            "merchant_pct_of_classification": merchant_pct,
+            "median_txn": self.median_txn[rows],
+            "median_amount": self.median_amount[rows]
+        }
+        return n_classes, columns
+
+    def query(self, x: float, y: float) -> dict:
+        """
+        Recommendations for classification threshold x% and merchant threshold y%.
+
+        Cached results are shared, so every caller gets its own copy of the
+        payload and its rows (their values are immutable) and may modify it.
+        """
+        result = self._cached_query(x, y)
+        return {**result, "recommendations": [dict(row) for row in result["recommendations"]]}
+
+    def _query(self, x: float, y: float) -> dict:
+        n_classes, columns = self.select(x, y)
+
+        recommendations = [
+            {
+                "classification": classification,
+                "classification_customers": int(cc),
+                "classification_pct": float(cp),
+                "merchant": merchant,
+                "merchant_customers": int(mc),
+                "merchant_pct_of_classification": float(mp),
+                "median_txn": float(mt),
+                "median_amount": float(ma)
+            }
+            for classification, cc, cp, merchant, mc, mp, mt, ma in zip(*columns.values())
+        ]
+
+        return {
+            "total_customers": self.total_customers,
+            "threshold_x": x,
+            "threshold_y": y,
+            "top_classifications_count": n_classes,
+            "recommendations": recommendations
+        }
@@ -0,0 +1,304 @@
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+
+from aggregation import CUSTOMER_COL, MERCHANT_COL
+
+SEGMENT_COL = 'segment'
+
+# Number of set bits in every byte value, for numpy < 2 (no np.bitwise_count)
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# IDs per container: the high bits of an ID pick its container, the low 16 its slot
+CONTAINER_BITS = 16
+CONTAINER_SIZE = 1 << CONTAINER_BITS
+BITMAP_BYTES = CONTAINER_SIZE // 8
+
+# Container kinds, each sized to what it holds:
+# - array: sorted uint16 slots, 2 bytes per member (sparse segments)
+# - runs: (start, length - 1) uint16 pairs, 4 bytes per run of consecutive members
+# - bitmap: packed bits, a fixed 8 kB (dense segments)
+ARRAY, RUNS, BITMAP = 'array', 'runs', 'bitmap'
+
+
+def popcount(bits: np.ndarray) -> int:
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(bits).sum(dtype=np.int64))
+    return int(POPCOUNT[bits].sum(dtype=np.int64))
+
+
+def run_bounds(slots: np.ndarray) -> tuple:
+    """Start and length of each run of consecutive values in a sorted array."""
+    breaks = np.flatnonzero(np.diff(slots) != 1) + 1
+    starts = slots[np.r_[0, breaks]]
+    lengths = np.diff(np.r_[0, breaks, len(slots)])
+    return starts, lengths
+
+
+def make_container(slots: np.ndarray):
+    """
+    The smallest container holding the given sorted, distinct slots, or
+    None if there are none. Like roaring, each container picks its own form.
+    """
+    if not len(slots):
+        return None
+    slots = slots.astype(np.uint16)
+    starts, lengths = run_bounds(slots.astype(np.int64))
+    sizes = {ARRAY: 2 * len(slots), RUNS: 4 * len(starts), BITMAP: BITMAP_BYTES}
+    kind = min(sizes, key=sizes.get)
+    if kind == ARRAY:
+        return ARRAY, slots
+    if kind == RUNS:
+        return RUNS, np.column_stack([starts, lengths - 1]).astype(np.uint16)
+    return BITMAP, container_bits((ARRAY, slots))
+
+
+def container_slots(container) -> np.ndarray:
+    """Members of a container as sorted int64 slots."""
+    kind, data = container
+    if kind == ARRAY:
+        return data.astype(np.int64)
+    if kind == RUNS:
+        starts, lengths = data[:, 0].astype(np.int64), data[:, 1].astype(np.int64) + 1
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.repeat(starts, lengths) + offsets
+    return np.flatnonzero(np.unpackbits(data))
+
+
+def container_bits(container) -> np.ndarray:
+    """Members of a container as packed bits."""
+    if container[0] == BITMAP:
+        return container[1]
+    mask = np.zeros(CONTAINER_SIZE, dtype=bool)
+    mask[container_slots(container)] = True
+    return np.packbits(mask)
+
+
+def container_count(container) -> int:
+    kind, data = container
+    if kind == ARRAY:
+        return len(data)
+    if kind == RUNS:
+        return int(data[:, 1].sum(dtype=np.int64)) + len(data)
+    return popcount(data)
+
+
+def combine_containers(a, b, op: str):
+    """
+    Set operation ('and', 'or', 'minus') between two containers. Two arrays
+    are merged as sorted arrays, an array is probed against the other side's
+    bits, and anything else goes through packed bits.
+    """
+    if a[0] == ARRAY and b[0] == ARRAY:
+        if op == 'and':
+            return make_container(np.intersect1d(a[1], b[1], assume_unique=True))
+        if op == 'or':
+            return make_container(np.union1d(a[1], b[1]))
+        return make_container(np.setdiff1d(a[1], b[1], assume_unique=True))
+    if op == 'and' and b[0] == ARRAY:
+        a, b = b, a
+    if a[0] == ARRAY and op != 'or':
+        # Probe a sparse side's slots in the other side's bits
+        slots = a[1].astype(np.int64)
+        found = np.unpackbits(container_bits(b))[slots].astype(bool)
+        return make_container(slots[found] if op == 'and' else slots[~found])
+    bits_a, bits_b = container_bits(a), container_bits(b)
+    if op == 'and':
+        bits = bits_a & bits_b
+    elif op == 'or':
+        bits = bits_a | bits_b
+    else:
+        bits = bits_a & ~bits_b
+    # Like roaring, a result too full for an array stays a bitmap without
+    # unpacking it to look for runs
+    if popcount(bits) * 2 > BITMAP_BYTES:
+        return BITMAP, bits
+    return make_container(np.flatnonzero(np.unpackbits(bits)))
+
+
+class SegmentBitmap:
+    """
+    Set of dense customer IDs, stored roaring-style.
+
+    IDs are split into containers of CONTAINER_SIZE consecutive IDs. Each
+    holds its members as a sorted array, as runs or as a packed bitmap,
+    whichever is smallest, so a sparse segment (most brand segments) costs
+    2 bytes per member instead of a bit per customer, and a dense one a bit
+    per customer. Empty containers are not stored.
+
+    Set algebra works container by container with vectorized array merges
+    or byte-wise operations, and counting is a popcount, so combining two
+    segments costs microseconds regardless of how many members they have.
+    """
+
+    __slots__ = ('containers', 'size')
+
+    def __init__(self, containers: dict, size: int):
+        self.containers = containers  # Container key (id >> CONTAINER_BITS) -> (kind, data)
+        self.size = size
+
+    @classmethod
+    def from_ids(cls, ids, size: int) -> "SegmentBitmap":
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        keys = ids >> CONTAINER_BITS
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        containers = {
+            int(chunk[0] >> CONTAINER_BITS): make_container(chunk & (CONTAINER_SIZE - 1))
+            for chunk in np.split(ids, bounds) if len(chunk)
+        }
+        return cls(containers, size)
+
+    def _combine(self, other: "SegmentBitmap", op: str) -> "SegmentBitmap":
+        if op == 'and':
+            keys = self.containers.keys() & other.containers.keys()
+        elif op == 'or':
+            keys = self.containers.keys() | other.containers.keys()
+        else:
+            keys = self.containers.keys()
+        containers = {}
+        for key in sorted(keys):
+            mine, theirs = self.containers.get(key), other.containers.get(key)
+            if mine is None or theirs is None:
+                container = theirs if op == 'or' and mine is None else mine
+            else:
+                container = combine_containers(mine, theirs, op)
+            if container is not None:
+                containers[key] = container
+        return SegmentBitmap(containers, self.size)
+
+    def __and__(self, other: "SegmentBitmap") -> "SegmentBitmap":
+        return self._combine(other, 'and')
+
+    def __or__(self, other: "SegmentBitmap") -> "SegmentBitmap":
+        return self._combine(other, 'or')
+
+    def __sub__(self, other: "SegmentBitmap") -> "SegmentBitmap":
+        return self._combine(other, 'minus')
+
+    def __len__(self) -> int:
+        return sum(container_count(container) for container in self.containers.values())
+
+    def __contains__(self, customer: int) -> bool:
+        container = self.containers.get(customer >> CONTAINER_BITS) if 0 <= customer < self.size else None
+        if container is None:
+            return False
+        slot = customer & (CONTAINER_SIZE - 1)
+        kind, data = container
+        if kind == ARRAY:
+            i = np.searchsorted(data, slot)
+            return i < len(data) and data[i] == slot
+        if kind == RUNS:
+            i = np.searchsorted(data[:, 0], slot, side='right') - 1
+            return i >= 0 and slot - int(data[i, 0]) <= int(data[i, 1])
+        return bool(data[slot >> 3] & (0x80 >> (slot & 7)))
+
+    def nbytes(self) -> int:
+        """Memory held by the containers' member data."""
+        return sum(data.nbytes for _, data in self.containers.values())
+
+    def ids(self) -> np.ndarray:
+        """Member IDs in ascending order."""
+        if not self.containers:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([
+            (key << CONTAINER_BITS) + container_slots(container)
+            for key, container in sorted(self.containers.items())
+        ])
+
+    def encode(self) -> dict:
+        """
+        JSON-ready form: run-length ([start, length, ...]) or base64 bitmap,
+        whichever is smaller, like roaring's per-container choice.
+        """
+        ids = self.ids()
+        starts, lengths = run_bounds(ids) if len(ids) else (ids, ids)
+        runs = np.column_stack([starts, lengths]).ravel().tolist()
+        mask = np.zeros(self.size, dtype=bool)
+        mask[ids] = True
+        bitmap = base64.b64encode(np.packbits(mask).tobytes()).decode('ascii')
+
+        encoded = {"size": self.size, "count": len(ids)}
+        if len(json.dumps(runs)) <= len(bitmap):
+            encoded["runs"] = runs
+        else:
+            encoded["bitmap"] = bitmap
+        return encoded
+
+    @classmethod
+    def decode(cls, encoded: dict) -> "SegmentBitmap":
+        size = encoded["size"]
+        if "bitmap" in encoded:
+            bits = np.frombuffer(base64.b64decode(encoded["bitmap"]), dtype=np.uint8)
+            return cls.from_ids(np.flatnonzero(np.unpackbits(bits, count=size)), size)
+        runs = np.asarray(encoded["runs"], dtype=np.int64).reshape(-1, 2)
+        mask = np.zeros(size, dtype=bool)
+        for start, length in runs:
+            mask[start:start + length] = True
+        return cls.from_ids(np.flatnonzero(mask), size)
+
+
+class SegmentIndex:
+    """
+    Dense customer IDs plus one bitmap per named segment.
+
+    Customers are numbered in sorted order of their IDs, so the numbering is
+    reproducible from the customer list alone.
+    """
+
+    OPERATIONS = {
+        'and': SegmentBitmap.__and__,
+        'or': SegmentBitmap.__or__,
+        'minus': SegmentBitmap.__sub__
+    }
+
+    def __init__(self, customers: pd.Index, segments: dict):
+        self.customers = customers
+        self.segments = segments
+
+    @classmethod
+    def from_memberships(cls, memberships: pd.DataFrame) -> "SegmentIndex":
+        """Build from a long (customer_id, segment) table."""
+        customers = pd.Index(memberships[CUSTOMER_COL].astype(str).unique()).sort_values()
+        codes = customers.get_indexer(memberships[CUSTOMER_COL].astype(str))
+        groups = pd.Series(codes).groupby(memberships[SEGMENT_COL].astype(str).to_numpy())
+        segments = {
+            name: SegmentBitmap.from_ids(ids.to_numpy(), len(customers))
+            for name, ids in groups
+        }
+        return cls(customers, segments)
+
+    def segment(self, name: str) -> SegmentBitmap:
+        return self.segments[name]
+
+    def combine(self, a: str, b: str, op: str = 'and') -> SegmentBitmap:
+        """Set algebra between two named segments ('and', 'or' or 'minus')."""
+        return self.OPERATIONS[op](self.segments[a], self.segments[b])
+
+    def customer_ids(self, bitmap: SegmentBitmap) -> list:
+        """Decode a bitmap back to customer ID strings."""
+        return self.customers[bitmap.ids()].tolist()
+
+    def counts(self) -> dict:
+        return {name: len(bitmap) for name, bitmap in self.segments.items()}
+
+
+def segment_memberships(top_brands: pd.DataFrame, income_bands: pd.Series = None) -> pd.DataFrame:
+    """
+    Long (customer_id, segment) table of the segments the backend serves.
+
+    - brand:<merchant>: customers with the brand among their top brands
+    - income:<band>: customers in the income band (income_bands maps
+      customer_id -> band)
+    """
+    parts = [pd.DataFrame({
+        CUSTOMER_COL: top_brands[CUSTOMER_COL].astype(str).to_numpy(),
+        SEGMENT_COL: ('brand:' + top_brands[MERCHANT_COL].astype(str)).to_numpy()
+    })]
+    if income_bands is not None and len(income_bands):
+        parts.append(pd.DataFrame({
+            CUSTOMER_COL: income_bands.index.astype(str),
+            SEGMENT_COL: ('income:' + income_bands.astype(str)).to_numpy()
+        }))
+    return pd.concat(parts, ignore_index=True)
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+from compact import decode_labels
+
+CUSTOMER_COL = 'customer_id'
+MERCHANT_COL = 'primary_merchant'
+
+# Each customer's window ends at their most recent transaction
+WINDOW_DAYS = 60
+
+# Brands kept per customer for Customer Segmentation and Gap Analysis
+SEGMENT_BRANDS = 2
+GAP_BRANDS = 4
+
+
+def recent_transactions(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keep each customer's transactions from the last WINDOW_DAYS before their
+    most recent one.
+
+    The per-customer last date is a group transform aligned with the rows, so
+    neither a merge nor a copy of the full input is needed.
+    """
+    dates = pd.to_datetime(data['date'])
+    last_date = dates.groupby(data[CUSTOMER_COL], observed=True).transform('max')
+    in_window = dates >= last_date - pd.Timedelta(days=WINDOW_DAYS)
+    return data.loc[in_window, [CUSTOMER_COL, MERCHANT_COL, 'amount']]
+
+
+def customer_brand_stats(recent: pd.DataFrame) -> pd.DataFrame:
+    """Transaction count and amount per (customer, brand), ordered by customer then brand."""
+    return recent.groupby([CUSTOMER_COL, MERCHANT_COL], observed=True).agg(
+        txn_count=('amount', 'count'),
+        total_amount=('amount', 'sum')
+    ).reset_index()
+
+
+def score_brands(stats: pd.DataFrame, by: str = None) -> pd.DataFrame:
+    """
+    Score every (customer, brand) pair: 0.2 * normalized txn count +
+    0.8 * normalized amount, both min-max scaled over all pairs.
+
+    If `by` names a column (e.g. an income band), the scaling is done within
+    each of its groups instead, exactly as if every group were scored on its
+    own.
+    """
+    if by is None:
+        txn_min, txn_max = stats['txn_count'].min(), stats['txn_count'].max()
+        amt_min, amt_max = stats['total_amount'].min(), stats['total_amount'].max()
+
+        norm_txn = (stats['txn_count'] - txn_min) / (txn_max - txn_min) if txn_max > txn_min else 0.5
+        norm_amt = (stats['total_amount'] - amt_min) / (amt_max - amt_min) if amt_max > amt_min else 0.5
+    else:
+        groups = stats.groupby(by, observed=True)
+        norm_txn = min_max_within(stats['txn_count'], groups['txn_count'])
+        norm_amt = min_max_within(stats['total_amount'], groups['total_amount'])
+
+    return stats.assign(score=0.2 * norm_txn + 0.8 * norm_amt)
+
+
+def min_max_within(values: pd.Series, grouped) -> pd.Series:
+    """Min-max scale values within their groups; constant groups get 0.5."""
+    low, high = grouped.transform('min'), grouped.transform('max')
+    return ((values - low) / (high - low)).where(high > low, 0.5)
+
+
+def top_brands(stats: pd.DataFrame, k: int = GAP_BRANDS) -> pd.DataFrame:
+    """
+    Select each customer's k best-scoring brands without sorting their groups.
+
+    Each of k rounds takes every customer's best remaining brand with a
+    grouped idxmax and drops it from the remaining row positions, so the
+    cost is k linear passes over an integer array rather than a sort of
+    every customer's brands. For the k <= GAP_BRANDS used here that is
+    faster than one sort_values + groupby().head(k). idxmax returns the
+    first of tied scores, so ties go to the brand listed first, i.e.
+    alphabetical order, as the stable sort would. Only the selected rows
+    are sorted for output.
+
+    Returns:
+        Rows with brand_rank <= k, ordered by customer then brand_rank
+    """
+    scores = stats['score'].to_numpy(dtype='float64')
+    customers = pd.factorize(stats[CUSTOMER_COL])[0]
+    ranks = np.zeros(len(stats), dtype='int64')
+    remaining = np.flatnonzero(~np.isnan(scores))
+    for brand_rank in range(1, k + 1):
+        if not len(remaining):
+            break
+        # Positions within `remaining` of every customer's best score
+        best = pd.Series(scores[remaining]).groupby(customers[remaining], sort=False).idxmax().to_numpy()
+        ranks[remaining[best]] = brand_rank
+        remaining = np.delete(remaining, best)
+
+    selected = np.flatnonzero(ranks)
+    top = stats.iloc[selected].assign(brand_rank=ranks[selected])
+    return top.sort_values([CUSTOMER_COL, 'brand_rank'])
+
+
+def summarize_top_brands(top: pd.DataFrame) -> dict:
+    """Build the segmentation payload from each customer's ranked top brands."""
+    top = decode_labels(top)
+
+    # Customers with at least SEGMENT_BRANDS brands, with their top brands in order
+    segment = top[top['brand_rank'] <= SEGMENT_BRANDS]
+    segmented = segment.loc[segment['brand_rank'] == SEGMENT_BRANDS, CUSTOMER_COL]
+    sample_ids = segmented.head(10).tolist()
+    sample_rows = segment[segment[CUSTOMER_COL].isin(sample_ids)]
+    brands = sample_rows.groupby(CUSTOMER_COL, sort=False)[MERCHANT_COL].agg(list)
+    sample_customers = [
+        {"customer_id": customer_id, "brands": brands[customer_id]}
+        for customer_id in sample_ids
+    ]
+
+    # How many customers have each brand in their top GAP_BRANDS
+    all_top_brands = top.groupby(MERCHANT_COL).size().rename('customer_count').reset_index()
+    all_top_brands = all_top_brands.sort_values('customer_count', ascending=False)
+    top10_brands = all_top_brands.head(10).to_dict('records')
+
+    return {
+        "sample_customers": sample_customers,
+        "top10_brands": top10_brands,
+        "total_customers_analyzed": len(segmented)
+    }
+
+
+def compute_customer_segmentation(data: pd.DataFrame) -> dict:
+    """
+    Compute customer segmentation based on top 2 brands per customer.
+
+    For each customer:
+    - Look at last 2 months of transactions (relative to their most recent transaction)
+    - Score brands: 0.2 * txn_count + 0.8 * total_amount
+    - Get top 2 brands (Customer Segmentation) and top 4 brands (Gap Analysis)
+    """
+    return segment_brand_stats(customer_brand_stats(recent_transactions(data)))
+
+
+def segment_brand_stats(stats: pd.DataFrame) -> dict:
+    """
+    Segmentation payload from windowed (customer, brand) count/sum stats.
+
+    `stats` must be ordered by customer then brand, as customer_brand_stats
+    returns it, so that score ties resolve alphabetically.
+    """
+    return summarize_top_brands(top_brands(score_brands(stats), GAP_BRANDS))
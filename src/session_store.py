@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionStore:
+    """
+    Bounded in-memory store of per-upload results.
+
+    Entries are evicted least recently used first once their combined size
+    exceeds max_bytes, and expire ttl_seconds after they were last used.
+    Sizes come from `size_of`, which measures an entry's actual payload
+    bytes rather than counting entries. Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, size_of):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size_of = size_of
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size, last_used)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """Return the value for key and mark it recently used, or None."""
+        with self._lock:
+            self._expire()
+            if key not in self._entries:
+                return None
+            value, size, _ = self._entries.pop(key)
+            self._entries[key] = (value, size, time.monotonic())
+            return value
+
+    def put(self, key: str, value):
+        """Store value under key, evicting old entries to stay within max_bytes."""
+        size = self.size_of(value)
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size, time.monotonic())
+            self.total_bytes += size
+            self._expire()
+            # The newest entry is always kept, even if it alone exceeds the budget
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                evicted, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                print(f"Evicted session {evicted} ({evicted_size:,} bytes)")
+
+    def _expire(self):
+        """Drop entries unused for longer than ttl_seconds (oldest are first)."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._entries:
+            key, (_, size, last_used) = next(iter(self._entries.items()))
+            if last_used >= cutoff:
+                break
+            del self._entries[key]
+            self.total_bytes -= size
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire()
+            return len(self._entries)
@@ -0,0 +1,103 @@
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+from artifact_cache import file_digest
+
+# Files a snapshot directory may contain, by logical name
+SNAPSHOT_FILES = {
+    'processed_data': 'broadband_processed_data.parquet',
+    'features': 'broadband_features.parquet',
+    'deals': 'broadband_deals.parquet',
+    'customer_deals': 'broadband_customer_deals.csv'
+}
+
+DEFAULT_RAW_DIR = Path(__file__).resolve().parent.parent / "data" / "raw"
+
+
+@dataclass
+class SnapshotFile:
+    path: str
+    size_bytes: int
+    sha256: str
+    rows: int
+    columns: list
+
+
+@dataclass
+class Snapshot:
+    """One versioned data/raw/v* directory and the files it holds."""
+    version: str
+    path: str
+    files: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "files": {name: asdict(entry) for name, entry in self.files.items()},
+            "missing": [name for name in SNAPSHOT_FILES if name not in self.files]
+        }
+
+
+def describe_file(path: Path) -> SnapshotFile:
+    """
+    Row count, columns and content hash of a snapshot file.
+
+    Remembered by (path, size, mtime), so listing the catalog again only
+    reads files that were added or changed since.
+    """
+    stat = path.stat()
+    return _describe_file(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=1024)
+def _describe_file(path_str: str, size_bytes: int, mtime_ns: int) -> SnapshotFile:
+    path = Path(path_str)
+    if path.suffix == '.parquet':
+        parquet = pq.ParquetFile(path)
+        rows = parquet.metadata.num_rows
+        columns = [f"{f.name}: {f.type}" for f in parquet.schema_arrow]
+    else:
+        with open(path, 'rb') as f:
+            header = f.readline().decode('utf-8').rstrip('\r\n')
+            rows = sum(1 for _ in f)
+        columns = header.split(',') if header else []
+
+    return SnapshotFile(
+        path=path_str,
+        size_bytes=size_bytes,
+        sha256=file_digest(str(path)),
+        rows=rows,
+        columns=columns
+    )
+
+
+def scan_catalog(raw_dir: str = DEFAULT_RAW_DIR) -> dict:
+    """
+    Index every v* snapshot directory under raw_dir.
+
+    Returns:
+        Dict of version -> Snapshot, oldest version first
+    """
+    catalog = {}
+    for directory in sorted(Path(raw_dir).glob('v*')):
+        if not directory.is_dir():
+            continue
+        snapshot = Snapshot(version=directory.name, path=str(directory))
+        for name, filename in SNAPSHOT_FILES.items():
+            path = directory / filename
+            if path.exists():
+                snapshot.files[name] = describe_file(path)
+        catalog[snapshot.version] = snapshot
+    return catalog
+
+
+if __name__ == "__main__":
+    for snapshot in scan_catalog().values():
+        present = ", ".join(
+            f"{name} ({entry.rows:,} rows)" for name, entry in snapshot.files.items()
+        )
+        print(f"{snapshot.version}: {present or 'no known files'}")
@@ -0,0 +1,159 @@
+import json
+import os
+import re
+from pathlib import Path
+
+from compressed_payload import compress_payload
+from merchant_index import encode_json
+
+MANIFEST_FILE = "manifest.json"
+
+# File suffix of each precompressed variant
+ENCODING_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+
+def hashed_name(name: str, digest: str) -> str:
+    """classifications.json -> classifications.<hash>.json"""
+    stem, suffix = os.path.splitext(name)
+    return f"{stem}.{digest[:12]}{suffix}"
+
+
+def atomic_write(path: Path, data: bytes):
+    """Write bytes via a temporary file, so readers never see a partial file."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(output_dir: Path) -> dict:
+    """The manifest of the previous export, or an empty one."""
+    path = output_dir / MANIFEST_FILE
+    if not path.exists():
+        return {"files": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(output_dir: Path, manifest: dict):
+    atomic_write(output_dir / MANIFEST_FILE, json.dumps(manifest, indent=2).encode("utf-8"))
+
+
+def entry_files(entry: dict) -> list:
+    """Every file a manifest entry owns: hashed copy, variants and any shards."""
+    return [entry["file"], *entry["encodings"].values(), *entry.get("shards", [])]
+
+
+def is_current(output_dir: Path, entry: dict, inputs: str) -> bool:
+    """Whether a manifest entry was built from the same inputs and its files still exist."""
+    if not entry or entry.get("inputs") != inputs:
+        return False
+    return all((output_dir / file).exists() for file in entry_files(entry))
+
+
+def write_export(output_dir: Path, name: str, body: bytes, inputs: str) -> dict:
+    """
+    Write one exported file in all its forms.
+
+    - `name`: stable path the frontend fetches today
+    - `<stem>.<hash><suffix>`: content-hashed copy, safe to cache forever
+    - `.gz` / `.br` siblings of the hashed copy (brotli only if installed)
+
+    Returns:
+        Manifest entry describing the written files
+    """
+    payload = compress_payload(body)
+    file = hashed_name(name, payload.digest)
+    atomic_write(output_dir / file, body)
+    atomic_write(output_dir / name, body)
+
+    encodings = {}
+    for encoding, data in payload.variants.items():
+        encodings[encoding] = file + ENCODING_SUFFIXES[encoding]
+        atomic_write(output_dir / encodings[encoding], data)
+
+    return {
+        "file": file,
+        "digest": payload.digest,
+        "bytes": len(body),
+        "inputs": inputs,
+        "encodings": encodings
+    }
+
+
+def shard_slug(key: str, taken: set) -> str:
+    """
+    Food & Dining -> food-dining, unique among the slugs in `taken` (which
+    it is added to): keys that differ only in case or punctuation, like
+    "Pension and Insurances" and "Pension and insurances", get -2, -3, ...
+
+    Keys with no letters or digits, such as the empty classification the
+    production data has, are named `unclassified`.
+    """
+    base = re.sub(r'[^a-z0-9]+', '-', key.lower()).strip('-') or 'unclassified'
+    slug, n = base, 2
+    while slug in taken:
+        slug, n = f"{base}-{n}", n + 1
+    taken.add(slug)
+    return slug
+
+
+def shard_name(slug: str, digest: str) -> str:
+    """food-dining -> food-dining.<hash>.json"""
+    return f"{slug}.{digest[:12]}.json"
+
+
+def write_shards(output_dir: Path, subdir: str, payloads: dict) -> tuple:
+    """
+    Write one content-hashed JSON file (plus compressed variants) per payload.
+
+    Args:
+        output_dir: Export directory
+        subdir: Directory for the shards, relative to output_dir
+        payloads: Key -> JSON-serializable payload
+
+    Returns:
+        Tuple of (key -> {file, bytes, digest} index, list of every written
+        file relative to output_dir)
+    """
+    (output_dir / subdir).mkdir(parents=True, exist_ok=True)
+    index, files, slugs = {}, [], set()
+    for key, value in payloads.items():
+        payload = compress_payload(encode_json(value))
+        file = f"{subdir}/{shard_name(shard_slug(key, slugs), payload.digest)}"
+        atomic_write(output_dir / file, payload.body)
+        files.append(file)
+        for encoding, data in payload.variants.items():
+            files.append(file + ENCODING_SUFFIXES[encoding])
+            atomic_write(output_dir / files[-1], data)
+        index[key] = {"file": file, "bytes": len(payload.body), "digest": payload.digest}
+    return index, files
+
+
+def prune_stale(output_dir: Path, manifest: dict, shard_dirs: list = ()) -> list:
+    """
+    Delete hashed copies (and their siblings) no longer named by the
+    manifest, and any unreferenced file under the shard directories.
+    """
+    referenced = set()
+    for entry in manifest["files"].values():
+        referenced.update(entry_files(entry))
+
+    removed = []
+    for name in manifest["files"]:
+        stem, suffix = os.path.splitext(name)
+        pattern = re.compile(rf"{re.escape(stem)}\.[0-9a-f]{{12}}{re.escape(suffix)}(\.gz|\.br)?")
+        for path in output_dir.iterdir():
+            if pattern.fullmatch(path.name) and path.name not in referenced:
+                path.unlink()
+                removed.append(path.name)
+
+    for shard_dir in shard_dirs:
+        if not (output_dir / shard_dir).is_dir():
+            continue
+        for path in (output_dir / shard_dir).rglob('*'):
+            relative = path.relative_to(output_dir).as_posix()
+            if path.is_file() and relative not in referenced:
+                path.unlink()
+                removed.append(relative)
+    return removed
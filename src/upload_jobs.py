@@ -0,0 +1,25 @@
+import os
+
+from dataset_context import DatasetContext
+from merchant_index import build_merchant_index, encode_json, graph_data
+
+
+def process_upload(input_path: str, session_id: str) -> dict:
+    """
+    Process an uploaded parquet file into its serialized session payloads.
+
+    Runs in a worker process; the input file is removed once read.
+
+    Returns:
+        Dict with "graph" (3D graph JSON bytes) and "merchants"
+        (classification -> drill-down JSON bytes)
+    """
+    try:
+        dataset = DatasetContext(input_path)
+        print(dataset.describe())
+        classification_summary, merchant_summary, _ = dataset.summaries()
+    finally:
+        os.unlink(input_path)
+
+    graph = encode_json({"session_id": session_id, **graph_data(classification_summary)})
+    return {"graph": graph, "merchants": build_merchant_index(merchant_summary)}
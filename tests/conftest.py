@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# Shared processing code lives in the repo-level src/ directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# The static exporter is a script in backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
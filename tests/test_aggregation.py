@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from aggregation import aggregate
+from compact import compact_transactions
+
+
+def transactions(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    classifications = rng.choice(['Shopping', 'Groceries', 'Shopping|Groceries', None], rows, p=[0.4, 0.4, 0.1, 0.1])
+    return pd.DataFrame({
+        'primary_merchant': rng.choice(['AMAZON', 'TESCO', 'BOOTS', None], rows, p=[0.3, 0.3, 0.3, 0.1]),
+        'transaction_classification_0': classifications,
+        'customer_id': [f"c{i}" for i in rng.integers(0, 6, rows)],
+        'date': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 90, rows), unit='D'),
+        'amount': rng.uniform(1, 100, rows).round(2)
+    })
+
+
+def sort_based_summaries(cleaned: pd.DataFrame) -> tuple:
+    """The per-level groupbys the original process_dataset copies ran."""
+    total_cust_10plus = int((cleaned.groupby('customer_id').size() >= 10).sum())
+    summaries = []
+    for keys in (['transaction_classification_0'], ['transaction_classification_0', 'primary_merchant']):
+        customer_stats = cleaned.groupby(keys + ['customer_id']).agg(
+            txn_count=('amount', 'count'),
+            total_amount=('amount', 'sum')
+        ).reset_index()
+        summaries.append(customer_stats.groupby(keys).agg(
+            median_txn_per_customer=('txn_count', 'median'),
+            median_amount_per_customer=('total_amount', 'median'),
+            customers_with_10plus_txn=('txn_count', lambda x: (x >= 10).sum())
+        ).reset_index())
+    return summaries[0], summaries[1], total_cust_10plus
+
+
+def single_category(frame: pd.DataFrame) -> pd.DataFrame:
+    multi = frame['transaction_classification_0'].str.contains('|', regex=False, na=False)
+    return frame[~multi].reset_index(drop=True)
+
+
+def assert_summaries_equal(actual: tuple, expected: tuple):
+    assert_frame_equal(actual[0], expected[0])
+    assert_frame_equal(actual[1], expected[1])
+    assert actual[2] == expected[2]
+
+
+def test_aggregate_matches_per_level_groupbys():
+    cleaned = single_category(transactions(400))
+
+    assert_summaries_equal(aggregate(cleaned), sort_based_summaries(cleaned))
+
+
+def test_aggregate_drops_multi_category_after_aggregating():
+    frame = transactions(400)
+
+    assert_summaries_equal(aggregate(frame, multi_category=False), sort_based_summaries(single_category(frame)))
+
+
+def test_aggregate_of_compact_transactions_matches():
+    cleaned = single_category(transactions(400))
+
+    assert_summaries_equal(aggregate(compact_transactions(cleaned)), sort_based_summaries(cleaned))
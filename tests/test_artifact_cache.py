@@ -0,0 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from artifact_cache import ALIASES_FILE, ArtifactCache
+
+
+def test_concurrent_alias_updates_keep_every_entry(tmp_path):
+    # Separate instances, as separate exporter or upload processes would have
+    caches = [ArtifactCache(tmp_path) for _ in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: caches[i % 8].set_alias(f"alias-{i}", f"key-{i}"), range(200)))
+
+    aliases = ArtifactCache(tmp_path)._read_json(ALIASES_FILE)
+    assert aliases == {f"alias-{i}": f"key-{i}" for i in range(200)}
+    assert [path.name for path in tmp_path.glob("*.tmp")] == []
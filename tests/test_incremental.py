@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from artifact_cache import ArtifactCache
+from dataset_context import DatasetContext
+from incremental import refresh_aggregates
+
+
+def transactions(customers: list, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = 40 * len(customers)
+    return pd.DataFrame({
+        'primary_merchant': rng.choice(['AMAZON', 'TESCO', 'BOOTS', 'COSTA'], rows),
+        'transaction_classification_0': rng.choice(['Shopping', 'Groceries', 'Shopping|Groceries'], rows),
+        'transaction_classification_1': ['Other'] * rows,
+        'customer_id': np.repeat(customers, 40),
+        'account_id': [f"a_{c}" for c in np.repeat(customers, 40)],
+        'date': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 120, rows), unit='D'),
+        'amount': rng.uniform(1, 100, rows).round(2),
+        'transaction_direction': ['debit'] * rows
+    })
+
+
+def test_incremental_refresh_matches_full_recompute(tmp_path, capsys):
+    previous = transactions(['c0', 'c1', 'c2', 'c3'], seed=0)
+    # c1 changes, c3 is removed and c4 is new; c0 and c2 are carried over
+    current = pd.concat([
+        previous[previous['customer_id'].isin(['c0', 'c2'])],
+        transactions(['c1', 'c4'], seed=1)
+    ], ignore_index=True)
+    previous_path, current_path = tmp_path / "previous.parquet", tmp_path / "current.parquet"
+    previous.to_parquet(previous_path, index=False)
+    current.to_parquet(current_path, index=False)
+
+    cache = ArtifactCache(tmp_path / "cache")
+    refresh_aggregates(cache, DatasetContext(str(previous_path)))
+    incremental = refresh_aggregates(cache, DatasetContext(str(current_path)))
+    assert "recomputed 2 of 4 customers" in capsys.readouterr().out
+
+    full = refresh_aggregates(ArtifactCache(tmp_path / "fresh-cache"), DatasetContext(str(current_path)))
+
+    for name in ['classification_summary', 'merchant_summary', 'top_brands']:
+        assert_frame_equal(incremental[name], full[name])
+    assert incremental['total_customers'] == full['total_customers']
+    assert incremental['customer_segmentation'] == full['customer_segmentation']
+    assert 'c3' not in set(incremental['top_brands']['customer_id'])
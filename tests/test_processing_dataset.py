@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pandas.testing import assert_frame_equal
+
+import reader
+from processing_dataset import process_dataset, write_batches
+from reader import COLUMNS_TO_KEEP, duplicate_positions, iter_transactions, projected_schema
+
+
+def transactions(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        'primary_merchant': [f"merchant {i}" for i in range(rows)],
+        'merchant_name': [None] * (rows // 2) + [f"Merchant {i}" for i in range(rows // 2, rows)],
+        'transaction_classification_0': ['Shopping'] * rows,
+        'transaction_classification_1': ['Clothing'] * rows,
+        'customer_id': [f"c{i % 3}" for i in range(rows)],
+        'account_id': [f"a{i % 3}" for i in range(rows)],
+        'date': pd.date_range('2025-01-01', periods=rows, freq='D').date,
+        'amount': [float(i) for i in range(rows)],
+        'transaction_direction': ['debit'] * rows
+    })
+
+
+def test_write_batches_keeps_file_schema_when_first_batch_is_all_null(tmp_path):
+    input_path = tmp_path / "input.parquet"
+    output_path = tmp_path / "output.parquet"
+    transactions(6).to_parquet(input_path, index=False)
+    columns = COLUMNS_TO_KEEP + ['merchant_name']
+
+    # String columns as pandas 2 reads them: object dtype, so an all-None batch infers as null
+    batches = [
+        batch.astype({'merchant_name': object})
+        for batch in iter_transactions(str(input_path), columns=columns, batch_size=3)
+    ]
+    assert batches[0]['merchant_name'].isna().all()
+
+    schema = projected_schema(str(input_path), columns)
+    for _ in write_batches(iter(batches), str(output_path), schema):
+        pass
+
+    written = pq.read_table(output_path)
+    assert written.schema.field('merchant_name').type == schema.field('merchant_name').type
+    assert written.column('merchant_name').to_pylist() == [None] * 3 + ["Merchant 3", "Merchant 4", "Merchant 5"]
+
+
+def transactions_with_duplicates(rows: int) -> pd.DataFrame:
+    """Transactions with repeated rows, empty merchants and multi-category classifications."""
+    frame = transactions(rows)
+    rng = np.random.default_rng(0)
+    frame['primary_merchant'] = rng.choice(['AMAZON', 'TESCO', 'BOOTS', ''], rows)
+    frame['transaction_classification_0'] = rng.choice(['Shopping', 'Groceries', 'Shopping|Groceries'], rows)
+    frame['customer_id'] = [f"c{i}" for i in rng.integers(0, 5, rows)]
+    frame['amount'] = rng.integers(1, 5, rows).astype(float)
+    repeats = frame.sample(rows // 3, random_state=0)
+    return pd.concat([frame, repeats], ignore_index=True).sample(frac=1, random_state=1).reset_index(drop=True)
+
+
+def in_memory_cleaned(frame: pd.DataFrame) -> pd.DataFrame:
+    """The original cleaning: drop_duplicates, then the merchant and classification filters."""
+    cleaned = frame.drop_duplicates()[COLUMNS_TO_KEEP]
+    cleaned = cleaned[cleaned['primary_merchant'] != '']
+    multi = cleaned['transaction_classification_0'].str.contains('|', regex=False, na=False)
+    return cleaned[~multi].reset_index(drop=True)
+
+
+def test_duplicate_positions_match_drop_duplicates():
+    frame = transactions_with_duplicates(300)
+    batches = [frame.iloc[start:start + 37] for start in range(0, len(frame), 37)]
+
+    duplicates, rows = duplicate_positions(iter(batches), partitions=4)
+
+    assert rows == len(frame)
+    assert duplicates.tolist() == np.flatnonzero(frame.duplicated()).tolist()
+
+
+def test_streamed_batches_match_in_memory_cleaning(tmp_path, monkeypatch):
+    # Spill the row hashes to several partition files
+    monkeypatch.setattr(reader, 'DEDUPE_PARTITION_ROWS', 50)
+    input_path = tmp_path / "input.parquet"
+    frame = transactions_with_duplicates(300)
+    frame.to_parquet(input_path, index=False, row_group_size=64)
+
+    streamed = pd.concat(list(iter_transactions(str(input_path), batch_size=29)), ignore_index=True)
+
+    expected = in_memory_cleaned(pd.read_parquet(input_path))
+    assert_frame_equal(streamed, expected)
+
+
+def test_batched_process_dataset_matches_in_memory(tmp_path):
+    input_path = tmp_path / "input.parquet"
+    transactions_with_duplicates(300).to_parquet(input_path, index=False, row_group_size=64)
+
+    _, in_memory = process_dataset(str(input_path))
+    cleaned, streamed = process_dataset(str(input_path), batch_size=17)
+
+    assert cleaned is None
+    assert_frame_equal(streamed, in_memory)
@@ -0,0 +1,61 @@
+import pandas as pd
+
+from recommendations import RecommendationIndex
+
+
+def summaries(class_customers: int, merchant_customers: int) -> tuple:
+    classification_summary = pd.DataFrame({
+        'transaction_classification_0': ['Shopping'],
+        'median_txn_per_customer': [12.0],
+        'median_amount_per_customer': [250.0],
+        'customers_with_10plus_txn': [class_customers]
+    })
+    merchant_summary = pd.DataFrame({
+        'transaction_classification_0': ['Shopping'],
+        'primary_merchant': ['AMAZON'],
+        'median_txn_per_customer': [11.0],
+        'median_amount_per_customer': [120.0],
+        'customers_with_10plus_txn': [merchant_customers]
+    })
+    return classification_summary, merchant_summary
+
+
+def test_query_recommends_merchants_above_both_thresholds():
+    index = RecommendationIndex(*summaries(class_customers=4, merchant_customers=2), total_customers=8)
+
+    result = index.query(50, 50)
+
+    assert result["top_classifications_count"] == 1
+    assert result["recommendations"] == [{
+        "classification": 'Shopping',
+        "classification_customers": 4,
+        "classification_pct": 50.0,
+        "merchant": 'AMAZON',
+        "merchant_customers": 2,
+        "merchant_pct_of_classification": 50.0,
+        "median_txn": 11.0,
+        "median_amount": 120.0
+    }]
+
+
+def test_query_without_customers_returns_no_recommendations():
+    index = RecommendationIndex(*summaries(class_customers=0, merchant_customers=0), total_customers=0)
+
+    result = index.query(0, 0)
+
+    assert result["total_customers"] == 0
+    assert result["top_classifications_count"] == 0
+    assert result["recommendations"] == []
+
+
+def test_cached_query_is_not_changed_by_callers():
+    index = RecommendationIndex(*summaries(class_customers=4, merchant_customers=2), total_customers=8)
+
+    first = index.query(50, 50)
+    first["recommendations"][0]["merchant"] = 'CHANGED'
+    first["recommendations"].clear()
+    first["total_customers"] = -1
+
+    second = index.query(50, 50)
+    assert second["total_customers"] == 8
+    assert [row["merchant"] for row in second["recommendations"]] == ['AMAZON']
@@ -0,0 +1,50 @@
+import numpy as np
+
+from segment_bitmaps import CONTAINER_SIZE, SegmentBitmap
+
+SIZE = 3 * CONTAINER_SIZE + 1000
+
+
+def segments() -> dict:
+    rng = np.random.default_rng(0)
+    return {
+        'sparse': rng.choice(SIZE, 300, replace=False),
+        'dense': rng.choice(SIZE, SIZE // 2, replace=False),
+        'runs': np.concatenate([np.arange(start, start + 5000) for start in (10, 70000, 140000)]),
+        'empty': np.empty(0, dtype=np.int64),
+    }
+
+
+def test_container_kinds_follow_density():
+    bitmaps = {name: SegmentBitmap.from_ids(ids, SIZE) for name, ids in segments().items()}
+    assert {kind for kind, _ in bitmaps['sparse'].containers.values()} == {'array'}
+    assert [bitmaps['dense'].containers[key][0] for key in range(3)] == ['bitmap'] * 3
+    assert {kind for kind, _ in bitmaps['runs'].containers.values()} == {'runs'}
+    assert bitmaps['sparse'].nbytes() == 2 * 300
+    assert not bitmaps['empty'].containers
+
+
+def test_set_algebra_matches_python_sets():
+    members = segments()
+    bitmaps = {name: SegmentBitmap.from_ids(ids, SIZE) for name, ids in members.items()}
+    sets = {name: set(ids.tolist()) for name, ids in members.items()}
+
+    for a in members:
+        assert len(bitmaps[a]) == len(sets[a])
+        assert bitmaps[a].ids().tolist() == sorted(sets[a])
+        for b in members:
+            assert (bitmaps[a] & bitmaps[b]).ids().tolist() == sorted(sets[a] & sets[b])
+            assert (bitmaps[a] | bitmaps[b]).ids().tolist() == sorted(sets[a] | sets[b])
+            assert (bitmaps[a] - bitmaps[b]).ids().tolist() == sorted(sets[a] - sets[b])
+
+    for customer in [0, 10, 5009, 5010, 70000, SIZE - 1, SIZE, -1, *members['sparse'][:20].tolist()]:
+        for name in members:
+            assert (customer in bitmaps[name]) == (customer in sets[name])
+
+
+def test_encode_round_trip():
+    for ids in segments().values():
+        bitmap = SegmentBitmap.from_ids(ids, SIZE)
+        encoded = bitmap.encode()
+        assert encoded['count'] == len(np.unique(ids))
+        assert SegmentBitmap.decode(encoded).ids().tolist() == bitmap.ids().tolist()
@@ -0,0 +1,29 @@
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from segmentation import top_brands
+
+
+def sort_top_brands(stats: pd.DataFrame, k: int) -> pd.DataFrame:
+    """The sort-based top-K the original compute_customer_segmentation used."""
+    ranked = stats.sort_values(['customer_id', 'score'], ascending=[True, False])
+    return ranked.groupby('customer_id').head(k)
+
+
+def test_top_brands_matches_sort_based_top_k_with_ties():
+    # Ordered by customer then brand, as customer_brand_stats returns it
+    stats = pd.DataFrame({
+        'customer_id': ['c1'] * 5 + ['c2'] * 2 + ['c3'] * 4,
+        'primary_merchant': ['AMAZON', 'BOOTS', 'COSTA', 'DELIVEROO', 'EE',
+                             'AMAZON', 'TESCO',
+                             'BOOTS', 'COSTA', 'SKY', 'TESCO'],
+        'score': [0.5, 0.9, 0.5, 0.5, 0.1,
+                  0.3, 0.3,
+                  0.2, 0.7, 0.7, 0.2]
+    })
+
+    top = top_brands(stats, k=3)
+
+    expected = sort_top_brands(stats, k=3)
+    assert_frame_equal(top.drop(columns='brand_rank'), expected)
+    assert top['brand_rank'].tolist() == [1, 2, 3, 1, 2, 1, 2, 3]
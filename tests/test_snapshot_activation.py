@@ -0,0 +1,47 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+import main
+
+HEADERS = {"X-Admin-Token": "secret"}
+
+
+def test_concurrent_activations_build_once_per_snapshot_and_keep_the_latest(monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(main, "loaded", None)
+    monkeypatch.setattr(main, "snapshot_builds", {})
+    started = {version: threading.Event() for version in ("v2025.12.08.1534", "v2025.12.17.1038")}
+    release = {version: threading.Event() for version in started}
+    builds = []
+
+    def load_snapshot(data_path, version):
+        builds.append(version)
+        started[version].set()
+        assert release[version].wait(10)
+        return version
+
+    monkeypatch.setattr(main, "load_snapshot", load_snapshot)
+    client = TestClient(main.app)
+    # The test client runs background tasks before returning, so each build gets its own thread
+    activate = lambda version: client.post(f"/api/admin/snapshots/{version}/activate", headers=HEADERS)
+    older, newer = started
+    threads = [threading.Thread(target=activate, args=(version,)) for version in (older, newer)]
+    threads[0].start()
+    assert started[older].wait(10)
+    threads[1].start()
+    # The newer build starts while the older one is still running
+    assert started[newer].wait(10)
+
+    # A second activation of a snapshot being built does not queue another build
+    assert activate(older).json() == {"version": older, "status": "building"}
+
+    release[newer].set()
+    threads[1].join(10)
+    release[older].set()
+    threads[0].join(10)
+
+    assert sorted(builds) == sorted(started)
+    # The older activation finished last but does not replace the newer one
+    assert main.loaded == newer
+    assert main.snapshot_builds == {older: "superseded", newer: "ready"}
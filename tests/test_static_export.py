@@ -0,0 +1,61 @@
+import json
+from pathlib import Path
+
+import export_static_data
+from aggregation import drop_multi_category
+from dataset_context import DatasetContext
+from income_segments import income_outputs
+from merchant_index import encode_json, graph_data
+from segmentation import compute_customer_segmentation
+from static_export import load_manifest, shard_slug, write_shards
+
+DEV_SNAPSHOT = Path(__file__).resolve().parent.parent / "data/raw/v2025.12.17.1038/broadband_processed_data.parquet"
+
+
+def test_shard_slug_suffixes_keys_that_collide():
+    taken = set()
+
+    assert shard_slug('Pension and Insurances', taken) == 'pension-and-insurances'
+    assert shard_slug('Pension and insurances', taken) == 'pension-and-insurances-2'
+    assert shard_slug('Food & Dining', taken) == 'food-dining'
+
+
+def test_shard_slug_names_keys_without_letters_or_digits():
+    taken = set()
+
+    assert shard_slug('', taken) == 'unclassified'
+    assert shard_slug(' & ', taken) == 'unclassified-2'
+
+
+def test_write_shards_gives_colliding_keys_separate_files(tmp_path):
+    payloads = {'Pension and Insurances': [1], 'Pension and insurances': [1]}
+
+    index, _ = write_shards(tmp_path, 'merchants', payloads)
+
+    files = {key: entry["file"] for key, entry in index.items()}
+    assert len(set(files.values())) == 2
+    for key, file in files.items():
+        assert json.loads((tmp_path / file).read_text()) == payloads[key]
+
+
+def test_parallel_export_matches_stages_run_in_process(tmp_path, capsys):
+    export_static_data.main(["--input", str(DEV_SNAPSHOT), "--output", str(tmp_path), "--workers", "2"])
+
+    dataset = DatasetContext(str(DEV_SNAPSHOT), income=True)
+    cleaned = drop_multi_category(dataset.transactions)
+    income = dict(zip(export_static_data.INCOME_FILES, income_outputs(cleaned, dataset.income_bands)))
+    expected = {
+        'classifications.json': graph_data(dataset.summaries()[0]),
+        'segmentation.json': compute_customer_segmentation(cleaned),
+        **income
+    }
+    for name, payload in expected.items():
+        assert (tmp_path / name).read_bytes() == encode_json(payload)
+
+    manifest = load_manifest(tmp_path)
+    assert set(manifest["files"]) == set(
+        export_static_data.EXPORT_FILES + export_static_data.INCOME_FILES + [export_static_data.SHARD_INDEX]
+    )
+    capsys.readouterr()
+    export_static_data.main(["--input", str(DEV_SNAPSHOT), "--output", str(tmp_path), "--workers", "2"])
+    assert "Nothing to export" in capsys.readouterr().out